@@ -0,0 +1,221 @@
+"""Benchmark da importação de planilhas da Câmara e do Senado.
+
+Gera planilhas sintéticas com o layout real (colunas de test_deputados.csv)
+e mede, em um processo novo por rodada, cada etapa da importação: leitura,
+detecção de colunas, mapeamento, gravação no banco e serialização da resposta.
+
+    python benchmarks/bench_import.py --sizes 1000,10000,100000 --formats csv,xlsx --output import.json
+    python benchmarks/bench_import.py --layouts senado --sizes 1000000 --formats csv
+
+Arquivos .xls exigem o pacote opcional xlwt e têm no máximo 65.535 linhas.
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import ROOT_DIR, add_root_to_path, emit_result, peak_rss_mb, run_isolated, write_results
+
+try:
+    import xlwt
+except ImportError:
+    xlwt = None
+
+DEFAULT_SIZES = '1000,10000,100000,1000000'
+DEFAULT_FORMATS = 'csv,xlsx,xls'
+LAYOUTS = ('camara', 'senado')
+XLS_MAX_ROWS = 65535
+
+SENADO_COLUMNS = ['Nome', 'Nome Completo', 'Partido', 'UF', 'Período', 'Telefones', 'Correio Eletrônico']
+
+PARTIDOS = ('PT', 'PL', 'UNIÃO', 'PP', 'MDB', 'PSD', 'REPUBLICANOS', 'PDT', 'PSB', 'PSOL')
+UFS = ('SP', 'RJ', 'MG', 'BA', 'RS', 'PR', 'PE', 'CE', 'PA', 'DF', 'AP', 'AM')
+
+
+def camara_layout():
+    """Cabeçalho e primeira linha de test_deputados.csv, usados como modelo"""
+    with open(os.path.join(ROOT_DIR, 'test_deputados.csv'), encoding='utf-8', newline='') as sample:
+        reader = csv.reader(sample)
+        return next(reader), next(reader)
+
+def iter_rows(layout, size):
+    if layout == 'camara':
+        columns, template = camara_layout()
+        index = {column: position for position, column in enumerate(columns)}
+        yield columns
+        for i in range(size):
+            row = list(template)
+            row[index['Nome Parlamentar']] = f'Deputado Ação {i}'
+            row[index['Nome sem Acento']] = f'Deputado Acao {i}'
+            row[index['Nome Civil']] = f'DEPUTADO CIVIL JOSÉ {i}'
+            row[index['Partido']] = PARTIDOS[i % len(PARTIDOS)]
+            row[index['UF']] = UFS[i % len(UFS)]
+            row[index['Gabinete']] = str(100 + i % 900)
+            row[index['Telefone']] = f'3215-{i % 10000:04d}'
+            row[index['Correio Eletrônico']] = f'dep.{i}@camara.leg.br'
+            yield row
+    else:
+        yield SENADO_COLUMNS
+        for i in range(size):
+            yield [
+                f'Senador {i}', f'SENADOR CIVIL JOÃO {i}', PARTIDOS[i % len(PARTIDOS)], UFS[i % len(UFS)],
+                '2023-2031', f'(61) 3303-{i % 10000:04d}', f'sen.{i}@senado.leg.br',
+            ]
+
+def generate_file(directory, layout, file_format, size):
+    """Gera (ou reaproveita) a planilha sintética; retorna o caminho"""
+    path = os.path.join(directory, f'{layout}_{size}.{file_format}')
+    if os.path.exists(path):
+        return path
+    partial = path + '.partial'
+    rows = iter_rows(layout, size)
+
+    if file_format == 'csv':
+        with open(partial, 'w', encoding='utf-8', newline='') as output:
+            csv.writer(output).writerows(rows)
+    elif file_format == 'xlsx':
+        import openpyxl
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        for row in rows:
+            sheet.append(row)
+        workbook.save(partial)
+    else:
+        workbook = xlwt.Workbook(encoding='utf-8')
+        sheet = workbook.add_sheet('Planilha1')
+        for row_index, row in enumerate(rows):
+            for column_index, value in enumerate(row):
+                sheet.write(row_index, column_index, value)
+        with open(partial, 'wb') as output:
+            workbook.save(output)
+
+    os.replace(partial, path)
+    return path
+
+def skip_reason(file_format, size):
+    if file_format == 'xls' and xlwt is None:
+        return 'xlwt não instalado'
+    if file_format == 'xls' and size > XLS_MAX_ROWS:
+        return f'.xls suporta até {XLS_MAX_ROWS} linhas'
+    return None
+
+
+def run_single(args):
+    """Importa a planilha em um banco temporário cronometrando cada etapa"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+    add_root_to_path()
+    from src.main import app
+    from src.routes.parlamentar import json_object
+    from src.services.importer import ImportSession, detect_mapper
+    from src.services.roster import refresh_roster
+    from src.services.spreadsheet_reader import iter_spreadsheet_chunks
+
+    stages = dict.fromkeys(('parse', 'detect', 'map', 'db_write', 'serialize'), 0.0)
+    started = time.perf_counter()
+
+    with app.app_context():
+        session = ImportSession(args.mode)
+        chunks = iter_spreadsheet_chunks(args.file, args.format, app.config['IMPORT_CHUNK_SIZE'])
+        mapper = None
+        while True:
+            mark = time.perf_counter()
+            chunk = next(chunks, None)
+            stages['parse'] += time.perf_counter() - mark
+            if chunk is None:
+                break
+
+            if mapper is None:
+                mark = time.perf_counter()
+                mapper = detect_mapper(chunk.columns)
+                stages['detect'] += time.perf_counter() - mark
+                if mapper is None:
+                    raise RuntimeError('Planilha não reconhecida')
+
+            mark = time.perf_counter()
+            parlamentares = mapper(chunk)
+            stages['map'] += time.perf_counter() - mark
+
+            mark = time.perf_counter()
+            session.add_parlamentares(parlamentares)
+            stages['db_write'] += time.perf_counter() - mark
+
+        mark = time.perf_counter()
+        diff = session.finish(refresh=False)
+        stages['db_write'] += time.perf_counter() - mark
+
+        # Mesma resposta da rota /api/upload-spreadsheet; a lista já serializada é montada
+        # ao recarregar o roster, então essa etapa conta como serialização e não como gravação
+        mark = time.perf_counter()
+        body = json_object({'message': '', 'diff': diff}, data=refresh_roster().body)
+        stages['serialize'] += time.perf_counter() - mark
+
+    total = time.perf_counter() - started
+    emit_result({
+        'layout': args.layout,
+        'format': args.format,
+        'size': args.size,
+        'mode': args.mode,
+        'file_mb': round(os.path.getsize(args.file) / (1024 * 1024), 2),
+        'stages_s': {stage: round(seconds, 3) for stage, seconds in stages.items()},
+        'total_s': round(total, 3),
+        'rows_per_sec': round(args.size / total, 1) if total else None,
+        'response_mb': round(len(body) / (1024 * 1024), 2),
+        'diff': diff,
+        'peak_rss_mb': peak_rss_mb(),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da importação de planilhas')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='linhas por planilha, separadas por vírgula')
+    parser.add_argument('--formats', default=DEFAULT_FORMATS, help='csv, xlsx e/ou xls')
+    parser.add_argument('--layouts', default=','.join(LAYOUTS), help='camara e/ou senado')
+    parser.add_argument('--mode', choices=('incremental', 'replace'), default='incremental')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'mandaemail-benchmark'),
+                        help='onde guardar as planilhas geradas (reaproveitadas entre execuções)')
+    parser.add_argument('--timeout', type=float, default=3600, help='tempo máximo de cada rodada (s)')
+    parser.add_argument('--output', default='-', help="arquivo JSON de saída ('-' para a saída padrão)")
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--file', help=argparse.SUPPRESS)
+    parser.add_argument('--layout', help=argparse.SUPPRESS)
+    parser.add_argument('--format', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single(args)
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    runs = []
+    for layout in [layout for layout in args.layouts.split(',') if layout]:
+        for file_format in [file_format for file_format in args.formats.split(',') if file_format]:
+            for size in [int(size) for size in args.sizes.split(',') if size]:
+                reason = skip_reason(file_format, size)
+                if reason:
+                    runs.append({'layout': layout, 'format': file_format, 'size': size, 'skipped': reason})
+                    print(f'{layout} {file_format} {size}: ignorado ({reason})', file=sys.stderr)
+                    continue
+
+                path = generate_file(args.data_dir, layout, file_format, size)
+                result = run_isolated(os.path.abspath(__file__), [
+                    '--single', '--file', path, '--layout', layout, '--format', file_format,
+                    '--size', str(size), '--mode', args.mode,
+                ], timeout=args.timeout)
+                runs.append(result)
+                stages = ', '.join(f'{stage} {seconds}s' for stage, seconds in result['stages_s'].items())
+                print(
+                    f"{layout} {file_format} {size}: {result['total_s']}s ({stages}), "
+                    f"pico {result['peak_rss_mb']} MB",
+                    file=sys.stderr
+                )
+
+    write_results(args.output, 'import', runs)
+
+
+if __name__ == '__main__':
+    main()
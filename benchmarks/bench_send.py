@@ -0,0 +1,195 @@
+"""Benchmark do envio de e-mails contra o servidor SMTP falso.
+
+Cada tamanho de lista roda em um processo novo, pela API (/api/send-emails)
+ou pela função send_emails do Streamlit, e o resultado sai em JSON:
+
+    python benchmarks/bench_send.py --target api --mode async --sizes 100,1000,10000 --output send.json
+    python benchmarks/bench_send.py --target streamlit --sizes 100,1000 --temp-fail-rate 0.01
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import add_root_to_path, emit_result, peak_rss_mb, percentile, run_isolated, write_results
+from fake_smtp import FakeSMTPOptions, FakeSMTPProcess
+
+DEFAULT_SIZES = '100,1000,10000,100000'
+SENDER_EMAIL = 'benchmark@example.com'
+SENDER_DOMAIN = 'example.com'
+POLL_INTERVAL = 0.1
+
+PARTIDOS = ('PT', 'PL', 'UNIÃO', 'PP', 'MDB', 'PSD', 'REPUBLICANOS', 'PDT', 'PSB', 'PSOL')
+UFS = ('SP', 'RJ', 'MG', 'BA', 'RS', 'PR', 'PE', 'CE', 'PA', 'DF')
+
+
+def synthetic_recipients(size):
+    return [
+        {
+            'id': i + 1,
+            'nome': f'Parlamentar {i}',
+            'partido': PARTIDOS[i % len(PARTIDOS)],
+            'uf': UFS[i % len(UFS)],
+            'cargo': 'Deputado' if i % 6 else 'Senador',
+            'email': f'dep{i}@camara.leg.br' if i % 6 else f'sen{i}@senado.leg.br',
+        }
+        for i in range(size)
+    ]
+
+
+def run_api(args, recipients):
+    """Envia pela API Flask com um banco temporário e acompanha o job até o fim"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+    add_root_to_path()
+    from sqlalchemy import func
+    from src.main import app
+    from src.models.parlamentar import db, SendDelivery
+
+    app.config.update(
+        SEND_DELIVERY_MODE=args.mode,
+        SMTP_POOL_SIZE=args.connections,
+        SMTP_PROVIDER_MAX_CONNECTIONS={args.smtp_host: args.connections},
+        SMTP_RATE_LIMITS={SENDER_DOMAIN: {}},
+        SEND_BATCH_SIZE=args.batch_size,
+        SEND_RETRY_BASE_DELAY=args.retry_delay,
+    )
+    client = app.test_client()
+
+    started = time.perf_counter()
+    response = client.post('/api/send-emails', json={
+        'subject': 'Benchmark {uf}',
+        'message': args.message,
+        'sender_name': 'Benchmark',
+        'sender_email': SENDER_EMAIL,
+        'sender_password': 'benchmark',
+        'recipients': recipients,
+        'batch': args.batch_size > 1,
+    })
+    if response.status_code != 202:
+        raise RuntimeError(f'Envio recusado: {response.get_json()}')
+    job_id = response.get_json()['job_id']
+
+    while True:
+        progress = client.get(f'/api/send-jobs/{job_id}/progress').get_json()
+        if progress['status'] in ('completed', 'failed'):
+            break
+        if progress['status'] == 'interrupted':
+            # Não muda mais sozinho (reinício ou desligamento do servidor)
+            error = client.get(f'/api/send-jobs/{job_id}').get_json().get('error')
+            raise RuntimeError(f'Envio interrompido: {error}')
+        time.sleep(POLL_INTERVAL)
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        rows = db.session.query(SendDelivery.status, SendDelivery.smtp_code, func.count()).filter(
+            SendDelivery.job_id == job_id, SendDelivery.status != 'sent'
+        ).group_by(SendDelivery.status, SendDelivery.smtp_code).all()
+    failures = {f'{status}:{code or "-"}': count for status, code, count in rows}
+
+    return elapsed, progress['sent'], progress['failed'], failures
+
+
+def run_streamlit(args, recipients):
+    """Chama send_emails do Streamlit (sem servidor Streamlit, em modo bare)"""
+    os.chdir(tempfile.mkdtemp())  # email_history.db é criado no diretório atual
+    add_root_to_path()
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+    from src.services.rate_limit import get_rate_limiter
+
+    # O limitador é criado uma vez por remetente; sem limites para o domínio do benchmark
+    get_rate_limiter(SENDER_EMAIL, {SENDER_DOMAIN: {}})
+    import streamlit_app
+
+    started = time.perf_counter()
+    sent, failed = streamlit_app.send_emails(
+        recipients, 'Benchmark {uf}', args.message, 'Benchmark', SENDER_EMAIL, 'benchmark'
+    )
+    elapsed = time.perf_counter() - started
+    return elapsed, sent, failed, {'failed': failed} if failed else {}
+
+
+def run_single(args):
+    recipients = synthetic_recipients(args.size)
+    runner = run_api if args.target == 'api' else run_streamlit
+    elapsed, sent, failed, failures = runner(args, recipients)
+    emit_result({
+        'target': args.target,
+        'mode': args.mode if args.target == 'api' else 'threads',
+        'size': args.size,
+        'batch_size': args.batch_size,
+        'connections': args.connections,
+        'elapsed_s': round(elapsed, 3),
+        'msgs_per_sec': round(sent / elapsed, 1) if elapsed else None,
+        'sent': sent,
+        'failed': failed,
+        'failures': failures,
+        'peak_rss_mb': peak_rss_mb(),
+    })
+
+
+def single_args(args, size):
+    return [
+        '--single', '--size', str(size), '--target', args.target, '--mode', args.mode,
+        '--connections', str(args.connections), '--batch-size', str(args.batch_size),
+        '--retry-delay', str(args.retry_delay), '--message', args.message, '--smtp-host', args.smtp_host,
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do envio de e-mails')
+    parser.add_argument('--target', choices=('api', 'streamlit'), default='api')
+    parser.add_argument('--mode', choices=('threads', 'async'), default='threads')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='tamanhos das listas, separados por vírgula')
+    parser.add_argument('--connections', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=1, help='destinatários por mensagem (> 1 ativa o lote)')
+    parser.add_argument('--message', default='Mensagem de teste para {nome} ({partido}).')
+    parser.add_argument('--retry-delay', type=float, default=0.1, help='backoff inicial dos reenvios (s)')
+    parser.add_argument('--smtp-host', default='127.0.0.1')
+    parser.add_argument('--smtp-port', type=int, default=2525)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--temp-fail-rate', type=float, default=0.0)
+    parser.add_argument('--perm-fail-rate', type=float, default=0.0)
+    parser.add_argument('--disconnect-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=3600, help='tempo máximo de cada rodada (s)')
+    parser.add_argument('--output', default='-', help="arquivo JSON de saída ('-' para a saída padrão)")
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single(args)
+        return
+
+    server = FakeSMTPProcess(args.smtp_host, args.smtp_port, FakeSMTPOptions(
+        args.latency_ms, args.temp_fail_rate, args.perm_fail_rate, args.disconnect_rate, args.seed
+    )).start()
+    env = {'MANDAEMAIL_SMTP_SERVER': server.address, 'MANDAEMAIL_SMTP_STARTTLS': '0'}
+
+    runs = []
+    try:
+        for size in [int(size) for size in args.sizes.split(',') if size]:
+            server.reset()
+            result = run_isolated(os.path.abspath(__file__), single_args(args, size), env, args.timeout)
+            stats = server.stats()
+            latencies = stats.pop('latencies_ms')
+            result['latency_ms'] = {'p50': percentile(latencies, 0.50), 'p99': percentile(latencies, 0.99)}
+            result['server'] = stats
+            runs.append(result)
+            print(
+                f"{result['target']}/{result['mode']} {size}: {result['msgs_per_sec']} msgs/s, "
+                f"p50 {result['latency_ms']['p50']} ms, p99 {result['latency_ms']['p99']} ms, "
+                f"pico {result['peak_rss_mb']} MB, falhas {result['failed']}",
+                file=sys.stderr
+            )
+    finally:
+        server.stop()
+
+    write_results(args.output, 'send', runs)
+
+
+if __name__ == '__main__':
+    main()
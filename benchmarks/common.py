@@ -0,0 +1,83 @@
+"""Utilitários compartilhados pelos benchmarks"""
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RESULT_MARKER = 'BENCHMARK_RESULT '
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def add_root_to_path():
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+
+def peak_rss_mb():
+    """Pico de memória residente do processo atual, em MB (None se indisponível)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment_info():
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+    }
+
+def emit_result(result):
+    """Usado pelo subprocesso de cada rodada: imprime o resultado numa linha marcada"""
+    print(RESULT_MARKER + json.dumps(result), flush=True)
+
+def run_isolated(script, args, env=None, timeout=None):
+    """Roda uma rodada em um processo novo (pico de memória isolado) e retorna o resultado"""
+    completed = subprocess.run(
+        [sys.executable, script] + args,
+        cwd=ROOT_DIR,
+        env={**os.environ, **(env or {})},
+        capture_output=True,
+        text=True,
+        timeout=timeout
+    )
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f'Rodada sem resultado (código {completed.returncode}):\n{completed.stderr[-2000:]}')
+
+def write_results(path, benchmark, runs):
+    """Grava (ou imprime, com path '-') o resultado em JSON para comparar entre commits"""
+    payload = {'benchmark': benchmark, 'environment': environment_info(), 'runs': runs}
+    text = json.dumps(payload, indent=2, ensure_ascii=False)
+    if path == '-':
+        print(text)
+    else:
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(text + '\n')
+    return payload
@@ -0,0 +1,241 @@
+"""Servidor SMTP falso para testes de carga do envio.
+
+Aceita EHLO/PIPELINING/AUTH e descarta as mensagens, podendo injetar
+latência, recusas 4xx/5xx no RCPT e quedas de conexão. Uso isolado:
+
+    python benchmarks/fake_smtp.py --port 2525 --latency-ms 20 --temp-fail-rate 0.01
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import threading
+import time
+
+
+class FakeSMTPOptions:
+    def __init__(self, latency_ms=0.0, temp_fail_rate=0.0, perm_fail_rate=0.0, disconnect_rate=0.0, seed=None,
+                 pipelining=True):
+        self.latency_ms = latency_ms
+        self.temp_fail_rate = temp_fail_rate
+        self.perm_fail_rate = perm_fail_rate
+        self.disconnect_rate = disconnect_rate
+        self.seed = seed
+        self.pipelining = pipelining
+
+
+class FakeSMTPStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.connections = 0
+        self.transactions = 0
+        self.messages = 0
+        self.recipients_accepted = 0
+        self.recipients_4xx = 0
+        self.recipients_5xx = 0
+        self.disconnects = 0
+        self.latencies = []
+
+    def to_dict(self):
+        return {
+            'connections': self.connections,
+            'transactions': self.transactions,
+            'messages': self.messages,
+            'recipients_accepted': self.recipients_accepted,
+            'recipients_4xx': self.recipients_4xx,
+            'recipients_5xx': self.recipients_5xx,
+            'disconnects': self.disconnects,
+            'latencies_ms': list(self.latencies),
+        }
+
+
+class FakeSMTPServer:
+    """Servidor asyncio; cada transação mede o tempo entre o MAIL FROM e a resposta final.
+
+    Subclasses (ex.: nos testes) podem sobrescrever ``_rcpt_reply``,
+    ``_drop_connection`` e ``_on_message`` para roteirizar as respostas.
+    """
+
+    def __init__(self, options=None):
+        self.options = options or FakeSMTPOptions()
+        self.stats = FakeSMTPStats()
+        self.random = random.Random(self.options.seed)
+
+    def _rcpt_reply(self, address):
+        draw = self.random.random()
+        if draw < self.options.perm_fail_rate:
+            self.stats.recipients_5xx += 1
+            return b'550 5.1.1 Mailbox unavailable\r\n'
+        if draw < self.options.perm_fail_rate + self.options.temp_fail_rate:
+            self.stats.recipients_4xx += 1
+            return b'451 4.3.0 Try again later\r\n'
+        self.stats.recipients_accepted += 1
+        return b'250 2.1.5 OK\r\n'
+
+    def _drop_connection(self):
+        """Derruba a conexão depois do DATA, sem responder"""
+        return self.random.random() < self.options.disconnect_rate
+
+    def _on_message(self, recipients):
+        """Mensagem aceita para os destinatários informados"""
+
+    async def handle(self, reader, writer):
+        self.stats.connections += 1
+        writer.write(b'220 fake-smtp ESMTP\r\n')
+        started = None
+        accepted = []
+        features = [b'fake-smtp'] + ([b'PIPELINING'] if self.options.pipelining else []) + [b'8BITMIME']
+        ehlo_reply = b''.join(b'250-' + feature + b'\r\n' for feature in features) + b'250 AUTH PLAIN LOGIN\r\n'
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line[:4].upper()
+                if command in (b'EHLO', b'HELO'):
+                    writer.write(ehlo_reply)
+                elif command == b'AUTH':
+                    writer.write(b'235 2.7.0 Authenticated\r\n')
+                elif command == b'MAIL':
+                    started = time.perf_counter()
+                    accepted = []
+                    self.stats.transactions += 1
+                    writer.write(b'250 2.1.0 OK\r\n')
+                elif command == b'RCPT':
+                    address = line[line.find(b'<') + 1:line.rfind(b'>')].decode('utf-8', 'replace')
+                    reply = self._rcpt_reply(address)
+                    if reply.startswith(b'250'):
+                        accepted.append(address)
+                    writer.write(reply)
+                elif command == b'DATA':
+                    if not accepted:
+                        writer.write(b'554 5.5.1 No valid recipients\r\n')
+                        continue
+                    writer.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+                    await writer.drain()
+                    while True:
+                        data_line = await reader.readline()
+                        if not data_line or data_line == b'.\r\n':
+                            break
+                    if self.options.latency_ms:
+                        await asyncio.sleep(self.options.latency_ms / 1000)
+                    if self._drop_connection():
+                        self.stats.disconnects += 1
+                        break
+                    self.stats.messages += 1
+                    self._on_message(accepted)
+                    self.stats.latencies.append((time.perf_counter() - started) * 1000)
+                    writer.write(b'250 2.0.0 Queued\r\n')
+                elif command == b'QUIT':
+                    writer.write(b'221 2.0.0 Bye\r\n')
+                    await writer.drain()
+                    break
+                else:
+                    # RSET, NOOP e demais comandos
+                    writer.write(b'250 2.0.0 OK\r\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port, ready=None):
+        server = await asyncio.start_server(self.handle, host, port)
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+
+def _serve_process(host, port, options, control):
+    server = FakeSMTPServer(options)
+    loop = asyncio.new_event_loop()
+
+    def answer_commands():
+        while True:
+            command = control.recv()
+            if command == 'stats':
+                control.send(server.stats.to_dict())
+            elif command == 'reset':
+                server.stats.reset()
+                control.send(True)
+
+    threading.Thread(target=answer_commands, daemon=True).start()
+    loop.run_until_complete(server.serve(host, port))
+
+
+class FakeSMTPProcess:
+    """Servidor falso em outro processo, para não disputar CPU com o cliente medido"""
+
+    def __init__(self, host='127.0.0.1', port=2525, options=None):
+        self.host = host
+        self.port = port
+        self.options = options or FakeSMTPOptions()
+        self._control, child_control = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_serve_process, args=(host, port, self.options, child_control), daemon=True
+        )
+
+    @property
+    def address(self):
+        return f'{self.host}:{self.port}'
+
+    def start(self, timeout=10.0):
+        self._process.start()
+        # Aguardar o servidor aceitar conexões
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                asyncio.run(self._probe())
+                return self
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError(f'Servidor SMTP falso não respondeu em {self.address}')
+
+    async def _probe(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        await reader.readline()
+        writer.write(b'QUIT\r\n')
+        await writer.drain()
+        writer.close()
+
+    def stats(self):
+        self._control.send('stats')
+        return self._control.recv()
+
+    def reset(self):
+        self._control.send('reset')
+        return self._control.recv()
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor SMTP falso para testes de carga')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2525)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--temp-fail-rate', type=float, default=0.0)
+    parser.add_argument('--perm-fail-rate', type=float, default=0.0)
+    parser.add_argument('--disconnect-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server = FakeSMTPServer(FakeSMTPOptions(
+        args.latency_ms, args.temp_fail_rate, args.perm_fail_rate, args.disconnect_rate, args.seed
+    ))
+    print(f'Servidor SMTP falso em {args.host}:{args.port}')
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        stats = server.stats.to_dict()
+        stats.pop('latencies_ms')
+        print(stats)
+
+
+if __name__ == '__main__':
+    main()
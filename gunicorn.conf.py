@@ -0,0 +1,42 @@
+"""Configuração do gunicorn para produção.
+
+Uso: gunicorn -c gunicorn.conf.py src.main:app
+
+Cada worker é um processo com a sua fila de envios; jobs, progresso e
+histórico ficam no banco, então qualquer worker responde sobre qualquer job.
+Os limites de envio por remetente e as métricas do /metrics também são
+compartilhados pelo banco e valem para todos os workers juntos.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('MANDAEMAIL_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('MANDAEMAIL_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('MANDAEMAIL_THREADS', 4))
+
+# O aplicativo (tabelas, índices, recuperação de jobs) é carregado uma vez, antes do fork
+preload_app = True
+
+# Uploads de planilhas grandes podem demorar
+timeout = 120
+
+# Tempo para os envios em andamento terminarem a transação SMTP atual antes do
+# SIGKILL; deve ser maior que SEND_SHUTDOWN_TIMEOUT (30 s por padrão)
+graceful_timeout = int(os.environ.get('MANDAEMAIL_GRACEFUL_TIMEOUT', 45))
+
+
+def post_fork(server, worker):
+    from src.main import app
+    from src.models.parlamentar import db
+
+    # Conexões abertas pelo processo principal não podem ser usadas pelos filhos
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    from src.services.send_queue import send_queue
+
+    # Para os envios deste worker sem repetir mensagens; os jobs ficam 'interrupted'
+    send_queue.shutdown()
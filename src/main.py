@@ -5,24 +5,56 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
 from flask_cors import CORS
-from src.models.parlamentar import db
+from src.models.parlamentar import db, upgrade_schema, create_search_index
+from src.routes.metrics import metrics_bp
 from src.routes.parlamentar import parlamentar_bp
+from src.services.database import configure_engine, engine_options
+from src.services.history_stats import ensure_stats
+from src.services.http_cache import init_http_cache
+from src.services.log import configure_logging
+from src.services.rate_limit import use_shared_state
+from src.services.send_queue import recover_interrupted_jobs, send_queue
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = 64 * 1024 * 1024  # 64MB max file size
+app.config['IMPORT_CHUNK_SIZE'] = 5000  # Linhas por bloco na importação de planilhas
+app.config['SMTP_POOL_SIZE'] = 4  # Conexões SMTP simultâneas por envio
+app.config['SEND_DELIVERY_MODE'] = 'threads'  # 'threads' (smtplib) ou 'async' (asyncio)
+app.config['SEND_MAX_ATTEMPTS'] = 4  # Tentativas por destinatário em falhas temporárias (com backoff)
+app.config['SEND_BATCH_SIZE'] = 50  # Destinatários (Bcc) por mensagem nos envios em lote
+app.config['SEND_SHUTDOWN_TIMEOUT'] = 30  # Segundos para os envios pararem ao desligar o servidor
 
 # Habilitar CORS
 CORS(app)
 
 app.register_blueprint(parlamentar_bp, url_prefix='/api')
+app.register_blueprint(metrics_bp)
+
+# Respostas comprimidas (gzip) e 304 para ETags que não mudaram
+init_http_cache(app)
+
+# Logs estruturados (JSON) do aplicativo
+configure_logging()
 
 # Configurar banco de dados
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'DATABASE_URL', f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Pool de conexões e PRAGMAs do SQLite (WAL, busy_timeout, mmap), os mesmos do Streamlit
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 db.init_app(app)
+send_queue.init_app(app)
 with app.app_context():
+    configure_engine(db.engine)
     db.create_all()
+    upgrade_schema()
+    app.config['SEARCH_INDEX_ENABLED'] = create_search_index()
+    ensure_stats()
+    recover_interrupted_jobs()
+    # Limites de envio por remetente valem para todos os processos (workers do gunicorn)
+    use_shared_state(db.engine)
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -36,10 +68,17 @@ def serve(path):
     else:
         index_path = os.path.join(static_folder_path, 'index.html')
         if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+            # O navegador guarda a página, mas confirma a versão (ETag) a cada visita
+            response = send_from_directory(static_folder_path, 'index.html')
+            response.cache_control.no_cache = True
+            return response
         else:
             return "index.html not found", 404
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    try:
+        app.run(host='0.0.0.0', port=5000, debug=True)
+    finally:
+        # Ctrl+C: os envios param sem repetir mensagens e podem ser retomados depois
+        send_queue.shutdown()
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -8,19 +9,24 @@ class Parlamentar(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(200), nullable=False)
-    partido = db.Column(db.String(50))
-    uf = db.Column(db.String(2))
-    cargo = db.Column(db.String(50))  # Deputado ou Senador
+    nome_civil = db.Column(db.String(200))
+    partido = db.Column(db.String(50), index=True)
+    uf = db.Column(db.String(2), index=True)
+    cargo = db.Column(db.String(50), index=True)  # Deputado ou Senador
     email = db.Column(db.String(200))
     telefone = db.Column(db.String(50))
     gabinete = db.Column(db.String(50))
     endereco = db.Column(db.Text)
+    nome_busca = db.Column(db.String(200))  # Nome em minúsculas e sem acentos, para busca
+    identity_key = db.Column(db.String(300), unique=True, index=True)  # e-mail ou nome normalizado + UF
+    content_hash = db.Column(db.String(40))  # Hash dos dados, para importação incremental
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
         return {
             'id': self.id,
             'nome': self.nome,
+            'nome_civil': self.nome_civil,
             'partido': self.partido,
             'uf': self.uf,
             'cargo': self.cargo,
@@ -41,7 +47,7 @@ class EmailHistory(db.Model):
     recipients_count = db.Column(db.Integer, nullable=False)
     sent = db.Column(db.Integer, default=0)
     failed = db.Column(db.Integer, default=0)
-    date = db.Column(db.DateTime, default=datetime.utcnow)
+    date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     def to_dict(self):
         return {
@@ -55,4 +61,198 @@ class EmailHistory(db.Model):
             'failed': self.failed,
             'date': self.date.isoformat()
         }
+    
+    def to_summary_dict(self):
+        """Versão para listagens, sem o texto da mensagem"""
+        return {
+            'id': self.id,
+            'subject': self.subject,
+            'sender_name': self.sender_name,
+            'sender_email': self.sender_email,
+            'recipients_count': self.recipients_count,
+            'sent': self.sent,
+            'failed': self.failed,
+            'date': self.date.isoformat()
+        }
+
+
+class EmailStat(db.Model):
+    """Totais do histórico por dia, remetente e servidor SMTP, somados a cada envio"""
+    __tablename__ = 'email_stats'
+    __table_args__ = (db.UniqueConstraint('day', 'sender_email', 'provider'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    sender_email = db.Column(db.String(200), nullable=False)
+    provider = db.Column(db.String(200), nullable=False)  # Servidor SMTP do remetente
+    campaigns = db.Column(db.Integer, nullable=False, default=0)
+    recipients = db.Column(db.Integer, nullable=False, default=0)
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DataVersion(db.Model):
+    """Versão de um conjunto de dados, para que cada processo saiba quando recarregar o cache"""
+    __tablename__ = 'data_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
 
+
+class SendJob(db.Model):
+    __tablename__ = 'send_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed, interrupted
+    subject = db.Column(db.String(500), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    sender_name = db.Column(db.String(200), nullable=False)
+    sender_email = db.Column(db.String(200), nullable=False)
+    batch_size = db.Column(db.Integer, default=1)  # Destinatários por mensagem (1 = mensagens individuais)
+    total = db.Column(db.Integer, nullable=False)
+    sent = db.Column(db.Integer, default=0)
+    failed = db.Column(db.Integer, default=0)
+    deferred = db.Column(db.Integer, default=0)  # Falhas temporárias (4xx, limite do provedor)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    worker_id = db.Column(db.String(64))  # Processo que está enviando (host:pid)
+    heartbeat_at = db.Column(db.DateTime)  # Último sinal de vida desse processo
+    history_id = db.Column(db.Integer)  # Registro em email_history (atualizado quando o job é reenviado)
+    
+    @property
+    def pending(self):
+        return max(self.total - (self.sent or 0) - (self.failed or 0), 0)
+    
+    def progress_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'sent': self.sent or 0,
+            'failed': self.failed or 0,
+            'deferred': self.deferred or 0,
+            'pending': self.pending
+        }
+    
+    def to_dict(self):
+        data = self.progress_dict()
+        data.update({
+            'subject': self.subject,
+            'sender_name': self.sender_name,
+            'sender_email': self.sender_email,
+            'batch_size': self.batch_size or 1,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        })
+        return data
+
+class SendDelivery(db.Model):
+    """Situação de cada destinatário de um job de envio"""
+    __tablename__ = 'send_deliveries'
+    __table_args__ = (db.UniqueConstraint('job_id', 'position'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), db.ForeignKey('send_jobs.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)  # Ordem do destinatário no job
+    email = db.Column(db.String(200))
+    recipient = db.Column(db.Text, nullable=False)  # Dados do destinatário em JSON
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sent, failed, deferred
+    smtp_code = db.Column(db.Integer)
+    smtp_response = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    delivered_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_id': self.job_id,
+            'email': self.email,
+            'status': self.status,
+            'smtp_code': self.smtp_code,
+            'smtp_response': self.smtp_response,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'delivered_at': self.delivered_at.isoformat() if self.delivered_at else None
+        }
+
+class MetricSnapshot(db.Model):
+    """Valores das métricas de um processo, somados pelo /metrics de qualquer outro"""
+    __tablename__ = 'metric_snapshots'
+    
+    worker_id = db.Column(db.String(64), primary_key=True)  # Processo (host:pid)
+    data = db.Column(db.Text, nullable=False)  # Métricas em JSON (Registry.snapshot)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+# Colunas que saíram do modelo; a antiga send_jobs.recipients era NOT NULL e impediria novos jobs
+OBSOLETE_COLUMNS = {'send_jobs': ('recipients', 'deferred_recipients')}
+
+def upgrade_schema():
+    """Adiciona colunas novas a tabelas existentes (o create_all só cria tabelas) e remove as obsoletas"""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        for name in OBSOLETE_COLUMNS.get(table.name, ()):
+            if name in existing:
+                db.session.execute(text(f'ALTER TABLE {table.name} DROP COLUMN {name}'))
+    db.session.commit()
+    
+    # Índices de colunas recém-adicionadas
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+# Índice de busca textual (FTS5) espelhando a tabela parlamentares
+SEARCH_COLUMNS = ('nome', 'nome_civil', 'partido', 'uf', 'cargo', 'gabinete', 'endereco')
+
+def create_search_index():
+    """Cria a tabela FTS5 e os gatilhos que a mantêm sincronizada.
+
+    Retorna False se o SQLite não tiver suporte a FTS5.
+    """
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+    
+    inspector = inspect(db.engine)
+    exists = inspector.has_table('parlamentares_fts')
+    try:
+        db.session.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS parlamentares_fts USING fts5({columns}, "
+            f"content='parlamentares', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+    except Exception:
+        db.session.rollback()
+        return False
+    
+    db.session.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS parlamentares_fts_insert AFTER INSERT ON parlamentares BEGIN "
+        f"INSERT INTO parlamentares_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    ))
+    db.session.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS parlamentares_fts_delete AFTER DELETE ON parlamentares BEGIN "
+        f"INSERT INTO parlamentares_fts(parlamentares_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+    ))
+    db.session.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS parlamentares_fts_update AFTER UPDATE ON parlamentares BEGIN "
+        f"INSERT INTO parlamentares_fts(parlamentares_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO parlamentares_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    ))
+    if not exists:
+        # Indexar as linhas que já estavam na tabela
+        db.session.execute(text("INSERT INTO parlamentares_fts(parlamentares_fts) VALUES ('rebuild')"))
+    db.session.commit()
+    return True
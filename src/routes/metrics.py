@@ -0,0 +1,11 @@
+from flask import Blueprint, Response
+
+from src.services.metrics_store import render_metrics
+from src.services.send_queue import worker_id
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas no formato texto do Prometheus, somadas entre os processos do servidor"""
+    return Response(render_metrics(worker_id()), content_type='text/plain; version=0.0.4; charset=utf-8')
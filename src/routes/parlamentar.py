@@ -1,71 +1,41 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify
 from werkzeug.utils import secure_filename
-import pandas as pd
 import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from src.models.parlamentar import db, Parlamentar, EmailHistory
+import json
+import hashlib
+from sqlalchemy import and_, func, or_, text
+from sqlalchemy.orm import defer
+from src.models.parlamentar import db, Parlamentar, EmailHistory, SendJob, SendDelivery, SEARCH_COLUMNS
+from src.services.delivery import DELIVERY_MODES
+from src.services.facets import FACET_FIELDS
+from src.services.http_cache import accepted_encoding, not_modified
+from src.services.history_stats import DEFAULT_STATS_DAYS, campaign_stats
+from src.services.importer import IMPORT_MODES, import_chunks, import_parlamentares, normalize_term
+from src.services.mailer import smtp_login
+from src.services.metrics import timed
+from src.services.recipients import prepare_recipients
+from src.services.roster import get_roster
+from src.services.send_queue import (
+    DEFERRED_STATUSES, FAILED_STATUSES, RESUMABLE_STATUSES, UNDELIVERED_STATUSES, create_send_job, resume_send_job,
+    send_queue
+)
+from src.services.spreadsheet_cache import content_hash, get_spreadsheet_cache
+from src.services.spreadsheet_reader import DEFAULT_CHUNK_SIZE, iter_spreadsheet_chunks, spreadsheet_extension
 import tempfile
 
 parlamentar_bp = Blueprint('parlamentar', __name__)
 
 ALLOWED_EXTENSIONS = {'xls', 'xlsx', 'csv'}
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Tamanho máximo de página em /api/parlamentares
+MAX_PAGE_SIZE = 1000
 
-def process_camara_data(df):
-    """Processa dados da planilha da Câmara dos Deputados"""
-    parlamentares = []
-    
-    for _, row in df.iterrows():
-        try:
-            parlamentar = {
-                'nome': str(row.get('Nome Parlamentar', '')).strip(),
-                'partido': str(row.get('Partido', '')).strip(),
-                'uf': str(row.get('UF', '')).strip(),
-                'cargo': 'Deputado',
-                'email': str(row.get('Correio Eletrônico', '')).strip(),
-                'telefone': str(row.get('Telefone', '')).strip(),
-                'gabinete': str(row.get('Gabinete', '')).strip(),
-                'endereco': f"{row.get('Endereço', '')} {row.get('Endereço (continuação)', '')} {row.get('Endereço (complemento)', '')}".strip()
-            }
-            
-            # Validar se tem nome e pelo menos um contato
-            if parlamentar['nome'] and (parlamentar['email'] or parlamentar['telefone']):
-                parlamentares.append(parlamentar)
-        except Exception as e:
-            print(f"Erro ao processar linha: {e}")
-            continue
-    
-    return parlamentares
+# Resultados da busca textual; pesos do bm25 na ordem de SEARCH_COLUMNS
+MAX_SEARCH_RESULTS = 100
+SEARCH_WEIGHTS = (10.0, 5.0, 2.0, 2.0, 1.0, 1.0, 1.0)
 
-def process_senado_data(df):
-    """Processa dados do Senado Federal"""
-    parlamentares = []
-    
-    for _, row in df.iterrows():
-        try:
-            parlamentar = {
-                'nome': str(row.get('Nome', '')).strip(),
-                'partido': str(row.get('Partido', '')).strip(),
-                'uf': str(row.get('UF', '')).strip(),
-                'cargo': 'Senador',
-                'email': str(row.get('Correio Eletrônico', '')).strip(),
-                'telefone': str(row.get('Telefones', '')).strip(),
-                'gabinete': '',
-                'endereco': ''
-            }
-            
-            # Validar se tem nome e pelo menos um contato
-            if parlamentar['nome'] and (parlamentar['email'] or parlamentar['telefone']):
-                parlamentares.append(parlamentar)
-        except Exception as e:
-            print(f"Erro ao processar linha: {e}")
-            continue
-    
-    return parlamentares
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 @parlamentar_bp.route('/upload-spreadsheet', methods=['POST'])
 def upload_spreadsheet():
@@ -80,90 +50,51 @@ def upload_spreadsheet():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Formato de arquivo não suportado'}), 400
         
+        # 'incremental' aplica só as diferenças; 'replace' recarrega tudo
+        mode = request.form.get('mode', 'incremental')
+        if mode not in IMPORT_MODES:
+            return jsonify({'error': f'Modo de importação inválido. Use: {", ".join(IMPORT_MODES)}'}), 400
+        
         # Salvar arquivo temporariamente
         with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp_file:
             file.save(tmp_file.name)
             
             try:
-                # Ler arquivo baseado na extensão
-                if file.filename.lower().endswith('.csv'):
-                    df = pd.read_csv(tmp_file.name, encoding='utf-8')
-                elif file.filename.lower().endswith('.xls'):
-                    df = pd.read_excel(tmp_file.name, engine='xlrd')
-                else:
-                    df = pd.read_excel(tmp_file.name, engine='openpyxl')
+                # Planilha idêntica a uma já enviada: usa o resultado mapeado guardado no cache
+                cache = get_spreadsheet_cache(
+                    current_app.config.get('SPREADSHEET_CACHE_DIR'),
+                    current_app.config.get('SPREADSHEET_CACHE_MAX_BYTES')
+                )
+                extension = spreadsheet_extension(file.filename)
+                cache_key = content_hash(tmp_file.name)
+                with timed('import_cache_read'):
+                    cached = cache.get(cache_key, 'api')
                 
-                # Limpar dados existentes
-                Parlamentar.query.delete()
-                db.session.commit()
-                
-                # Detectar tipo de planilha e processar
-                parlamentares_data = []
-                
-                # Verificar se é planilha da Câmara (tem coluna 'Nome Parlamentar')
-                if 'Nome Parlamentar' in df.columns:
-                    parlamentares_data = process_camara_data(df)
-                # Verificar se é planilha do Senado (tem coluna 'Nome' e 'Partido')
-                elif 'Nome' in df.columns and 'Partido' in df.columns:
-                    parlamentares_data = process_senado_data(df)
+                if cached is not None:
+                    diff = import_parlamentares(cached, mode)
                 else:
-                    # Tentar detectar automaticamente baseado nas colunas
-                    columns = [col.lower() for col in df.columns]
-                    if any('nome' in col for col in columns):
-                        # Mapear colunas genéricas
-                        for _, row in df.iterrows():
-                            try:
-                                parlamentar = {
-                                    'nome': '',
-                                    'partido': '',
-                                    'uf': '',
-                                    'cargo': 'Parlamentar',
-                                    'email': '',
-                                    'telefone': '',
-                                    'gabinete': '',
-                                    'endereco': ''
-                                }
-                                
-                                # Tentar mapear colunas automaticamente
-                                for col in df.columns:
-                                    col_lower = col.lower()
-                                    value = str(row[col]).strip()
-                                    
-                                    if 'nome' in col_lower:
-                                        parlamentar['nome'] = value
-                                    elif 'partido' in col_lower:
-                                        parlamentar['partido'] = value
-                                    elif 'uf' in col_lower or 'estado' in col_lower:
-                                        parlamentar['uf'] = value
-                                    elif 'email' in col_lower or 'eletrônico' in col_lower:
-                                        parlamentar['email'] = value
-                                    elif 'telefone' in col_lower or 'fone' in col_lower:
-                                        parlamentar['telefone'] = value
-                                    elif 'gabinete' in col_lower:
-                                        parlamentar['gabinete'] = value
-                                
-                                if parlamentar['nome']:
-                                    parlamentares_data.append(parlamentar)
-                            except Exception as e:
-                                continue
+                    # Ler o arquivo em blocos; cada bloco é mapeado e gravado assim que chega
+                    chunks = iter_spreadsheet_chunks(
+                        tmp_file.name,
+                        extension,
+                        current_app.config.get('IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+                    )
+                    with cache.writer(cache_key, 'api') as cache_entry:
+                        diff = import_chunks(chunks, mode, cache_entry.write)
+                        if diff is not None:
+                            cache_entry.commit()
                 
-                if not parlamentares_data:
+                if diff is None:
                     return jsonify({'error': 'Não foi possível processar a planilha. Verifique se o formato está correto.'}), 400
                 
-                # Salvar no banco de dados
-                for data in parlamentares_data:
-                    parlamentar = Parlamentar(**data)
-                    db.session.add(parlamentar)
-                
-                db.session.commit()
-                
-                # Retornar dados para o frontend
-                result_data = [p.to_dict() for p in Parlamentar.query.all()]
-                
-                return jsonify({
-                    'message': f'{len(result_data)} parlamentares carregados com sucesso',
-                    'data': result_data
-                })
+                # Retornar dados para o frontend: a lista já serializada, recarregada pela importação
+                with timed('import_serialize'):
+                    roster = get_roster()
+                    return json_response(json_object({
+                        'message': f'{len(roster)} parlamentares carregados com sucesso',
+                        'diff': diff,
+                        'cached': cached is not None
+                    }, data=roster.body))
                 
             finally:
                 # Limpar arquivo temporário
@@ -183,6 +114,9 @@ def send_emails():
         sender_email = data.get('sender_email')
         sender_password = data.get('sender_password')
         recipients = data.get('recipients', [])
+        delivery_mode = data.get('delivery_mode')
+        # Em lote, mensagens idênticas do mesmo domínio vão em uma transação (destinatários em Bcc)
+        batch_size = current_app.config.get('SEND_BATCH_SIZE', 1) if data.get('batch') else 1
         
         if not all([subject, message, sender_name, sender_email, sender_password]):
             return jsonify({'error': 'Todos os campos são obrigatórios'}), 400
@@ -190,111 +124,369 @@ def send_emails():
         if not recipients:
             return jsonify({'error': 'Nenhum destinatário selecionado'}), 400
         
-        sent_count = 0
-        failed_count = 0
+        if delivery_mode and delivery_mode not in DELIVERY_MODES:
+            return jsonify({'error': f'Modo de envio inválido. Use: {", ".join(DELIVERY_MODES)}'}), 400
         
-        # Detectar provedor de e-mail e configurar SMTP
-        smtp_config = get_smtp_config(sender_email)
+        # Normalizar e deduplicar: inválidos e repetidos não chegam ao SMTP
+        recipients, recipients_report = prepare_recipients(recipients)
+        if not recipients:
+            return jsonify({
+                'error': 'Nenhum destinatário com e-mail válido',
+                'recipients_report': recipients_report
+            }), 400
         
+        # Validar credenciais antes de enfileirar, para que o erro volte na hora
         try:
-            server = smtplib.SMTP(smtp_config['server'], smtp_config['port'])
-            server.starttls()
-            server.login(sender_email, sender_password)
+            server = smtp_login(sender_email, sender_password)
+            server.quit()
         except Exception as e:
             return jsonify({'error': f'Erro na autenticação do e-mail: {str(e)}. Verifique suas credenciais e se a autenticação de dois fatores está configurada corretamente.'}), 400
         
-        # Enviar e-mails
-        for recipient in recipients:
-            try:
-                if not recipient.get('email'):
-                    failed_count += 1
-                    continue
-                
-                # Personalizar mensagem
-                personalized_message = message.replace('{nome}', recipient.get('nome', ''))
-                
-                # Criar e-mail
-                msg = MIMEMultipart()
-                msg['From'] = f"{sender_name} <{sender_email}>"
-                msg['To'] = recipient['email']
-                msg['Subject'] = subject
-                
-                # Corpo do e-mail
-                body = f"""Prezado(a) {recipient.get('nome', '')},
+        # Criar job e enviar em segundo plano
+        job = create_send_job(subject, message, sender_name, sender_email, recipients, batch_size)
+        send_queue.submit(job.id, sender_password, delivery_mode)
+        
+        response = job.progress_dict()
+        response['message'] = 'Envio enfileirado'
+        response['job_id'] = job.id
+        response['recipients_report'] = recipients_report
+        return jsonify(response), 202
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro ao enviar e-mails: {str(e)}'}), 500
 
-{personalized_message}
+@parlamentar_bp.route('/send-jobs/<job_id>', methods=['GET'])
+def get_send_job(job_id):
+    job = db.session.get(SendJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Job de envio não encontrado'}), 404
+    return with_etag(jsonify(job.to_dict()))
 
-Atenciosamente,
-{sender_name}
-{sender_email}
-"""
-                
-                msg.attach(MIMEText(body, 'plain', 'utf-8'))
-                
-                # Enviar
-                server.send_message(msg)
-                sent_count += 1
-                
-            except Exception as e:
-                print(f"Erro ao enviar para {recipient.get('email', '')}: {e}")
-                failed_count += 1
-        
-        server.quit()
-        
-        # Salvar no histórico
-        history = EmailHistory(
-            subject=subject,
-            message=message,
-            sender_name=sender_name,
-            sender_email=sender_email,
-            recipients_count=len(recipients),
-            sent=sent_count,
-            failed=failed_count
-        )
-        db.session.add(history)
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Envio concluído',
-            'sent': sent_count,
-            'failed': failed_count,
-            'total': len(recipients)
-        })
+@parlamentar_bp.route('/send-jobs/<job_id>/retry', methods=['POST'])
+def retry_send_job(job_id):
+    """Reenvia, no mesmo job, os destinatários que tiveram falha temporária.
+
+    Usa a retomada atômica do /resume: chamadas repetidas enquanto o reenvio
+    está na fila ou em andamento recebem 409, e quem já recebeu não recebe de novo.
+    """
+    try:
+        job = db.session.get(SendJob, job_id)
+        if job is None:
+            return jsonify({'error': 'Job de envio não encontrado'}), 404
+        
+        if job.status not in RESUMABLE_STATUSES:
+            return jsonify({'error': 'O job ainda está na fila ou em andamento'}), 409
+        
+        data = request.get_json() or {}
+        sender_password = data.get('sender_password')
+        delivery_mode = data.get('delivery_mode')
+        if not sender_password:
+            return jsonify({'error': 'Informe a senha do e-mail para reenviar'}), 400
+        
+        if delivery_mode and delivery_mode not in DELIVERY_MODES:
+            return jsonify({'error': f'Modo de envio inválido. Use: {", ".join(DELIVERY_MODES)}'}), 400
+        
+        if SendDelivery.query.filter_by(job_id=job.id, status='deferred').first() is None:
+            return jsonify({'error': 'Nenhum destinatário pendente de reenvio'}), 400
+        
+        if resume_send_job(job, sender_password, delivery_mode, statuses=DEFERRED_STATUSES) is None:
+            return jsonify({'error': 'O reenvio já está na fila ou em andamento'}), 409
+        
+        response = job.progress_dict()
+        response['message'] = 'Reenvio enfileirado'
+        response['job_id'] = job.id
+        return jsonify(response), 202
         
     except Exception as e:
-        return jsonify({'error': f'Erro ao enviar e-mails: {str(e)}'}), 500
+        return jsonify({'error': f'Erro ao reenviar e-mails: {str(e)}'}), 500
 
-def get_smtp_config(email):
-    """Retorna configuração SMTP baseada no provedor de e-mail"""
-    domain = email.split('@')[1].lower()
+@parlamentar_bp.route('/send-jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """Retoma o job enviando só para quem ainda não recebeu a mensagem"""
+    try:
+        job = db.session.get(SendJob, job_id)
+        if job is None:
+            return jsonify({'error': 'Job de envio não encontrado'}), 404
+        
+        if job.status not in RESUMABLE_STATUSES:
+            return jsonify({'error': 'O job ainda está na fila ou em andamento'}), 409
+        
+        data = request.get_json() or {}
+        sender_password = data.get('sender_password')
+        delivery_mode = data.get('delivery_mode')
+        only_failed = bool(data.get('only_failed'))
+        if not sender_password:
+            return jsonify({'error': 'Informe a senha do e-mail para retomar o envio'}), 400
+        
+        if delivery_mode and delivery_mode not in DELIVERY_MODES:
+            return jsonify({'error': f'Modo de envio inválido. Use: {", ".join(DELIVERY_MODES)}'}), 400
+        
+        if job.sent >= job.total:
+            return jsonify({'error': 'Todos os destinatários já receberam a mensagem'}), 400
+        
+        statuses = FAILED_STATUSES if only_failed else UNDELIVERED_STATUSES
+        if resume_send_job(job, sender_password, delivery_mode, statuses=statuses) is None:
+            # Outra requisição (possivelmente em outro processo) retomou o job antes
+            return jsonify({'error': 'O job já foi retomado e está na fila ou em andamento'}), 409
+        
+        response = job.progress_dict()
+        response['message'] = 'Envio retomado'
+        response['job_id'] = job.id
+        return jsonify(response), 202
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro ao retomar envio: {str(e)}'}), 500
+
+@parlamentar_bp.route('/send-jobs/<job_id>/deliveries', methods=['GET'])
+def get_send_job_deliveries(job_id):
+    """Lista as entregas do job, com filtro opcional por situação e paginação por cursor"""
+    job = db.session.get(SendJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Job de envio não encontrado'}), 404
     
-    smtp_configs = {
-        'gmail.com': {'server': 'smtp.gmail.com', 'port': 587},
-        'outlook.com': {'server': 'smtp-mail.outlook.com', 'port': 587},
-        'hotmail.com': {'server': 'smtp-mail.outlook.com', 'port': 587},
-        'live.com': {'server': 'smtp-mail.outlook.com', 'port': 587},
-        'yahoo.com': {'server': 'smtp.mail.yahoo.com', 'port': 587},
-        'yahoo.com.br': {'server': 'smtp.mail.yahoo.com', 'port': 587},
-        'uol.com.br': {'server': 'smtps.uol.com.br', 'port': 587},
-        'terra.com.br': {'server': 'smtp.terra.com.br', 'port': 587},
-        'ig.com.br': {'server': 'smtp.ig.com.br', 'port': 587},
-    }
+    query = SendDelivery.query.filter(SendDelivery.job_id == job.id)
+    status = request.args.get('status', '').strip()
+    if status:
+        query = query.filter(SendDelivery.status == status)
     
-    return smtp_configs.get(domain, {'server': 'smtp.gmail.com', 'port': 587})
+    after = request.args.get('after', type=int)
+    if after is not None:
+        query = query.filter(SendDelivery.id > after)
+    
+    limit = max(1, min(request.args.get('limit', MAX_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    deliveries = query.order_by(SendDelivery.id).limit(limit + 1).all()
+    has_more = len(deliveries) > limit
+    deliveries = deliveries[:limit]
+    
+    return jsonify({
+        'data': [delivery.to_dict() for delivery in deliveries],
+        'next_cursor': deliveries[-1].id if has_more else None
+    })
+
+@parlamentar_bp.route('/send-jobs/<job_id>/progress', methods=['GET'])
+def get_send_job_progress(job_id):
+    job = db.session.get(SendJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Job de envio não encontrado'}), 404
+    # Quem acompanha o progresso recebe 304 (sem corpo) enquanto nada mudar
+    return with_etag(jsonify(job.progress_dict()))
 
 @parlamentar_bp.route('/email-history', methods=['GET'])
 def get_email_history():
     try:
-        history = EmailHistory.query.order_by(EmailHistory.date.desc()).limit(50).all()
-        return jsonify([h.to_dict() for h in history])
+        # O histórico recebe novas linhas e, quando um job é reenviado, novos totais de enviados/falhas:
+        # quantidade, último id e esses totais identificam a versão
+        count, last_id, sent, failed = db.session.query(
+            func.count(EmailHistory.id), func.max(EmailHistory.id),
+            func.sum(EmailHistory.sent), func.sum(EmailHistory.failed)
+        ).one()
+        etag = f'history-{count}-{last_id}-{sent}-{failed}-{hashlib.sha1(request.query_string).hexdigest()[:16]}'
+        if not_modified(etag):
+            return not_modified_response(etag)
+        
+        limit = request.args.get('limit', type=int)
+        if limit is None:
+            history = EmailHistory.query.order_by(EmailHistory.date.desc()).limit(50).all()
+            response = jsonify([h.to_dict() for h in history])
+            response.set_etag(etag)
+            return response
+        
+        # Listagem leve (sem o texto da mensagem), do mais recente ao mais antigo,
+        # paginada por cursor (id do último envio da página anterior) sobre o índice de date
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = EmailHistory.query.options(defer(EmailHistory.message))
+        before = request.args.get('before', type=int)
+        if before is not None:
+            cursor = db.session.get(EmailHistory, before)
+            if cursor is None:
+                return jsonify({'error': 'Cursor inválido'}), 400
+            query = query.filter(or_(
+                EmailHistory.date < cursor.date,
+                and_(EmailHistory.date == cursor.date, EmailHistory.id < cursor.id)
+            ))
+        
+        history = query.order_by(EmailHistory.date.desc(), EmailHistory.id.desc()).limit(limit + 1).all()
+        has_more = len(history) > limit
+        history = history[:limit]
+        
+        response = jsonify({
+            'data': [h.to_summary_dict() for h in history],
+            'next_cursor': history[-1].id if has_more else None
+        })
+        response.set_etag(etag)
+        return response
     except Exception as e:
         return jsonify({'error': f'Erro ao carregar histórico: {str(e)}'}), 500
 
+@parlamentar_bp.route('/email-history/<int:history_id>', methods=['GET'])
+def get_email_history_item(history_id):
+    """Envio completo, com o texto da mensagem"""
+    history = db.session.get(EmailHistory, history_id)
+    if history is None:
+        return jsonify({'error': 'Envio não encontrado'}), 404
+    return jsonify(history.to_dict())
+
+@parlamentar_bp.route('/email-history/stats', methods=['GET'])
+def get_email_history_stats():
+    """Totais e taxas de sucesso por dia, remetente e servidor SMTP (somados a cada envio)"""
+    try:
+        days = request.args.get('days', DEFAULT_STATS_DAYS, type=int)
+        days = max(1, min(days, 366))
+        return with_etag(jsonify(campaign_stats(days)))
+    except Exception as e:
+        return jsonify({'error': f'Erro ao carregar estatísticas: {str(e)}'}), 500
+
+def json_response(body, status=200):
+    return Response(body, status=status, mimetype='application/json')
+
+def with_etag(response):
+    """ETag calculado do corpo; a resposta vira 304 se o cliente já tiver essa versão"""
+    response.add_etag()
+    return response
+
+def not_modified_response(etag):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+def roster_etag(roster):
+    """Versão de uma resposta derivada da lista: conteúdo da lista + parâmetros da consulta"""
+    return f'{roster.etag}-{hashlib.sha1(request.query_string).hexdigest()[:16]}'
+
+def json_object(fields, **serialized):
+    """Objeto JSON com ``fields`` e, sem reserializar, os trechos já em JSON de ``serialized``"""
+    parts = [json.dumps(fields, ensure_ascii=False)[1:-1].encode('utf-8')]
+    parts += [json.dumps(key).encode('utf-8') + b':' + value for key, value in serialized.items()]
+    return b'{' + b','.join(part for part in parts if part) + b'}'
+
+def roster_response(roster, etag):
+    """Lista completa pré-serializada, com a cópia em gzip feita uma vez por importação"""
+    if accepted_encoding() == 'gzip':
+        response = json_response(roster.body_gzip)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+    else:
+        # Cliente sem gzip: resposta sem compressão
+        response = json_response(roster.body)
+    response.set_etag(etag, weak=True)
+    return response
+
+def facet_filters():
+    """Filtros de partido, UF e cargo informados na query string"""
+    filters = {}
+    for field in FACET_FIELDS:
+        value = request.args.get(field, '').strip()
+        if value:
+            filters[field] = value
+    return filters
+
 @parlamentar_bp.route('/parlamentares', methods=['GET'])
 def get_parlamentares():
+    """Lista parlamentares com filtros opcionais e paginação por cursor (id)"""
+    try:
+        # Tudo sai da lista em memória: filtros por bitmap e JSON já serializado por linha
+        roster = get_roster()
+        etag = roster_etag(roster)
+        if not_modified(etag):
+            return not_modified_response(etag)
+        
+        filters = facet_filters()
+        # Busca por trecho do nome, sem diferenciar acentos e maiúsculas
+        term = normalize_term(request.args.get('nome', ''))
+        
+        limit = request.args.get('limit', type=int)
+        if limit is None:
+            if not filters and not term:
+                return roster_response(roster, etag)
+            response = json_response(roster.json_array(roster.select(filters, term)))
+        else:
+            # Paginação por keyset: só linhas com id maior que o cursor
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+            after = request.args.get('after', type=int)
+            positions, next_cursor = roster.page(roster.select(filters, term), after, limit)
+            response = json_response(json_object({'next_cursor': next_cursor}, data=roster.json_array(positions)))
+        
+        response.set_etag(etag)
+        return response
+    except Exception as e:
+        return jsonify({'error': f'Erro ao carregar parlamentares: {str(e)}'}), 500
+
+@parlamentar_bp.route('/parlamentares/ids', methods=['GET'])
+def get_parlamentar_ids():
+    """Ids de todos os parlamentares que atendem aos filtros, sem paginação (para "Selecionar Todos")"""
     try:
-        parlamentares = Parlamentar.query.all()
-        return jsonify([p.to_dict() for p in parlamentares])
+        roster = get_roster()
+        etag = f'ids-{roster_etag(roster)}'
+        if not_modified(etag):
+            return not_modified_response(etag)
+        
+        positions = roster.select(facet_filters(), normalize_term(request.args.get('nome', '')))
+        response = jsonify({'ids': roster.ids[positions].tolist()})
+        response.set_etag(etag)
+        return response
     except Exception as e:
         return jsonify({'error': f'Erro ao carregar parlamentares: {str(e)}'}), 500
 
+@parlamentar_bp.route('/parlamentares/facets', methods=['GET'])
+def get_facets():
+    """Valores de partido, UF e cargo com a contagem de parlamentares de cada um"""
+    try:
+        roster = get_roster()
+        etag = f'facets-{roster_etag(roster)}'
+        if not_modified(etag):
+            return not_modified_response(etag)
+        
+        index = roster.facets
+        filters = facet_filters()
+        
+        # O filtro por nome restringe as contagens às linhas com o trecho no nome
+        base = None
+        term = normalize_term(request.args.get('nome', ''))
+        if term:
+            base = index.ids_bitmap(roster.ids[roster.select({}, term)])
+        
+        response = jsonify({
+            'total': index.count(filters, base),
+            'facets': index.counts(filters, base)
+        })
+        response.set_etag(etag)
+        return response
+    except Exception as e:
+        return jsonify({'error': f'Erro ao carregar filtros: {str(e)}'}), 500
+
+def fts_query(term):
+    """Converte o texto digitado em uma consulta FTS5 (todas as palavras, por prefixo)"""
+    words = normalize_term(term).replace('"', ' ').split()
+    return ' AND '.join(f'"{word}"*' for word in words)
+
+@parlamentar_bp.route('/parlamentares/search', methods=['GET'])
+def search_parlamentares():
+    """Busca textual ordenada por relevância (nome, nome civil, partido, UF, cargo, gabinete e endereço)"""
+    try:
+        match = fts_query(request.args.get('q', ''))
+        if not match:
+            return jsonify({'error': 'Informe o termo de busca (q)'}), 400
+        
+        if not current_app.config.get('SEARCH_INDEX_ENABLED'):
+            return jsonify({'error': 'Busca textual indisponível: SQLite sem suporte a FTS5'}), 503
+        
+        limit = request.args.get('limit', 20, type=int)
+        limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+        
+        weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS[:len(SEARCH_COLUMNS)])
+        rows = db.session.execute(text(
+            f'SELECT rowid, bm25(parlamentares_fts, {weights}) AS score '
+            'FROM parlamentares_fts WHERE parlamentares_fts MATCH :match '
+            'ORDER BY score LIMIT :limit'
+        ), {'match': match, 'limit': limit}).all()
+        
+        # Carregar os registros e devolvê-los na ordem do ranking
+        scores = {row_id: score for row_id, score in rows}
+        parlamentares = Parlamentar.query.filter(Parlamentar.id.in_(scores.keys())).all()
+        parlamentares.sort(key=lambda p: scores[p.id])
+        
+        return jsonify([
+            {**p.to_dict(), 'score': round(-scores[p.id], 4)} for p in parlamentares
+        ])
+    except Exception as e:
+        return jsonify({'error': f'Erro na busca: {str(e)}'}), 500
@@ -0,0 +1,392 @@
+import asyncio
+import base64
+import ssl
+import threading
+from collections import deque
+
+from src.services.mailer import SMTP_TIMEOUT, get_smtp_config
+from src.services.metrics import MESSAGES_TOTAL, SMTP_CONNECTIONS, timed
+from src.services.rate_limit import DailyLimitExceeded, get_rate_limiter
+from src.services.retry import RECONNECT_ATTEMPTS, RetryPolicy
+from src.services.smtp_errors import (
+    SendCancelled, is_connection_error, is_dropped_connection, is_temporary_error, split_recipient_errors
+)
+from src.services.templates import EmailTemplate, iter_messages
+
+# Conexões SMTP de longa duração abertas pelo modo assíncrono
+DEFAULT_CONNECTIONS = 4
+
+# Mensagens montadas e ainda não confirmadas pelo servidor (contrapressão)
+DEFAULT_MAX_IN_FLIGHT = 200
+
+# Intervalo de verificação dos resultados enquanto restam mensagens em backoff
+RESULT_POLL_INTERVAL = 0.05
+
+# Intervalo entre tentativas de ocupar uma vaga de conexão do provedor
+SLOT_POLL_INTERVAL = 0.05
+
+
+class AsyncSMTPError(Exception):
+    def __init__(self, code, text):
+        super().__init__(f'{code} {text}')
+        self.smtp_code = code
+        self.smtp_error = text
+
+
+class AsyncSMTPConnection:
+    """Cliente SMTP mínimo sobre asyncio, com suporte a PIPELINING (RFC 2920)"""
+
+    def __init__(self, host, port, timeout=SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.features = set()
+        self._reader = None
+        self._writer = None
+
+    async def _read_reply(self):
+        lines = []
+        while True:
+            line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+            if not line:
+                raise ConnectionResetError('Conexão SMTP encerrada pelo servidor')
+            line = line.decode('utf-8', 'replace').rstrip('\r\n')
+            lines.append(line[4:])
+            if line[3:4] != '-':
+                return int(line[:3]), '\n'.join(lines)
+
+    async def _expect(self, *codes):
+        code, text = await self._read_reply()
+        if code not in codes:
+            raise AsyncSMTPError(code, text)
+        return code, text
+
+    async def _command(self, line, *codes):
+        self._writer.write(line.encode('utf-8') + b'\r\n')
+        await self._writer.drain()
+        return await self._expect(*codes)
+
+    async def _ehlo(self):
+        _, text = await self._command('EHLO localhost', 250)
+        self.features = {line.split(' ', 1)[0].upper() for line in text.split('\n')[1:]}
+
+    async def connect(self, username, password, use_tls=True):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        await self._expect(220)
+        await self._ehlo()
+        if use_tls:
+            await self._command('STARTTLS', 220)
+            await self._writer.start_tls(ssl.create_default_context(), server_hostname=self.host)
+            await self._ehlo()
+        credentials = base64.b64encode(f'\0{username}\0{password}'.encode('utf-8')).decode('ascii')
+        await self._command(f'AUTH PLAIN {credentials}', 235)
+
+    async def send(self, from_addr, to_addrs, data):
+        """Envia uma transação; com PIPELINING, MAIL/RCPT/DATA seguem num único pacote.
+
+        Retorna os destinatários recusados, como o ``sendmail`` do smtplib.
+        """
+        commands = [f'MAIL FROM:<{from_addr}>'] + [f'RCPT TO:<{addr}>' for addr in to_addrs] + ['DATA']
+        if 'PIPELINING' in self.features:
+            self._writer.write(''.join(f'{command}\r\n' for command in commands).encode('utf-8'))
+            await self._writer.drain()
+            replies = [await self._read_reply() for _ in commands]
+        else:
+            replies = []
+            for command in commands:
+                self._writer.write(command.encode('utf-8') + b'\r\n')
+                await self._writer.drain()
+                replies.append(await self._read_reply())
+                if replies[0][0] != 250:
+                    break
+
+        mail_reply = replies[0]
+        refused = {
+            addr: reply for addr, reply in zip(to_addrs, replies[1:len(to_addrs) + 1])
+            if reply[0] not in (250, 251)
+        }
+        data_reply = replies[-1] if len(replies) == len(commands) else None
+
+        if mail_reply[0] != 250:
+            error = mail_reply
+        elif len(refused) == len(to_addrs):
+            error = next(iter(refused.values()))
+        elif data_reply[0] != 354:
+            error = data_reply
+        else:
+            self._writer.write(data)
+            await self._writer.drain()
+            await self._expect(250)
+            return refused
+
+        await self._reset(data_reply)
+        raise AsyncSMTPError(*error)
+
+    async def _reset(self, data_reply):
+        # Se o servidor aceitou o DATA, encerra a mensagem vazia antes do RSET
+        if data_reply and data_reply[0] == 354:
+            self._writer.write(b'.\r\n')
+            await self._writer.drain()
+            await self._read_reply()
+        await self._command('RSET', 250)
+
+    async def quit(self):
+        try:
+            await self._command('QUIT', 221)
+        except Exception:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def to_smtp_data(message_bytes):
+    """Aplica dot-stuffing e o terminador do DATA"""
+    data = message_bytes
+    if data.startswith(b'.'):
+        data = b'.' + data
+    data = data.replace(b'\r\n.', b'\r\n..')
+    if not data.endswith(b'\r\n'):
+        data += b'\r\n'
+    return data + b'.\r\n'
+
+
+class AsyncDeliveryEngine:
+    """Envia por poucas conexões assíncronas de longa duração, com contrapressão"""
+
+    def __init__(self, sender_email, sender_password, connections=None, max_in_flight=None, use_tls=None,
+                 rate_limits=None, retry_policy=None, cancel_event=None, provider_slots=None):
+        smtp_config = get_smtp_config(sender_email)
+        self.host = smtp_config['server']
+        self.port = smtp_config['port']
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.pool_size = max(1, connections or DEFAULT_CONNECTIONS)
+        self.max_in_flight = max_in_flight or DEFAULT_MAX_IN_FLIGHT
+        self.use_tls = smtp_config.get('starttls', True) if use_tls is None else use_tls
+        self.limiter = get_rate_limiter(sender_email, rate_limits)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.cancelled = cancel_event or threading.Event()
+        # Semáforo do processo com o teto de conexões do provedor (get_provider_slots); None não limita.
+        # Cada worker de conexão ocupa uma vaga do início ao fim, inclusive nas reconexões.
+        self.provider_slots = provider_slots
+        self._slots_held = 0
+
+    async def _acquire_slot(self, shared=False):
+        """Ocupa uma vaga de conexão do provedor sem bloquear o loop de eventos.
+
+        Com ``shared``, desiste (retorna False) se não houver vaga e este envio
+        já tiver outra, que continua atendendo a fila.
+        """
+        if self.provider_slots is not None:
+            while not self.provider_slots.acquire(blocking=False):
+                if self.cancelled.is_set():
+                    raise SendCancelled()
+                if shared and self._slots_held:
+                    return False
+                await asyncio.sleep(SLOT_POLL_INTERVAL)
+        self._slots_held += 1
+        return True
+
+    def _release_slot(self):
+        self._slots_held -= 1
+        if self.provider_slots is not None:
+            self.provider_slots.release()
+
+    async def _open(self):
+        connection = AsyncSMTPConnection(self.host, self.port)
+        try:
+            with timed('smtp_connect'):
+                await connection.connect(self.sender_email, self.sender_password, self.use_tls)
+        except BaseException:
+            connection.close()
+            raise
+        SMTP_CONNECTIONS.inc(provider=self.host)
+        return connection
+
+    def _discard(self, connection):
+        connection.close()
+        SMTP_CONNECTIONS.dec(provider=self.host)
+
+    async def _close(self, connection):
+        await connection.quit()
+        SMTP_CONNECTIONS.dec(provider=self.host)
+
+    async def _warm_up(self):
+        await self._acquire_slot()
+        try:
+            await self._close(await self._open())
+        finally:
+            self._release_slot()
+
+    def warm_up(self):
+        """Abre uma conexão para validar as credenciais antes do envio"""
+        asyncio.run(self._warm_up())
+
+    async def _wait_turn(self, delay):
+        """Espera a vez no limite de taxa, em fatias, para perceber um cancelamento"""
+        deadline = asyncio.get_running_loop().time() + delay
+        while True:
+            if self.cancelled.is_set():
+                raise SendCancelled()
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, RESULT_POLL_INTERVAL))
+
+    async def _connection_worker(self, pending, in_flight, results):
+        try:
+            if not await self._acquire_slot(shared=True):
+                # Provedor no limite de conexões: as outras conexões deste envio atendem a fila
+                return
+        except SendCancelled:
+            return
+        connection = None
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                item = await pending.get()
+                if item is None:
+                    return
+                batch, data, attempt = item
+                if self.cancelled.is_set():
+                    # Cancelado: a mensagem não sai e os destinatários ficam sem resultado
+                    if attempt == 1:
+                        in_flight.release()
+                    continue
+                refused = None
+                try:
+                    if data is None:
+                        raise ValueError('Destinatário sem e-mail')
+                    await self._wait_turn(self.limiter.reserve(len(batch)))
+                    addresses = [recipient['email'] for recipient in batch]
+                    for reconnect in range(RECONNECT_ATTEMPTS + 1):
+                        if connection is None:
+                            connection = await self._open()
+                        try:
+                            with timed('smtp_send'):
+                                refused = await connection.send(self.sender_email, addresses, data)
+                            break
+                        except Exception as e:
+                            if connection is not None and is_connection_error(e):
+                                # Conexão perdida: a próxima mensagem abre outra
+                                self._discard(connection)
+                                connection = None
+                            if not (is_dropped_connection(e) and reconnect < RECONNECT_ATTEMPTS):
+                                raise
+                    self.limiter.on_success()
+                    error = None
+                except Exception as e:
+                    error = e
+                    if is_temporary_error(e) and not isinstance(e, DailyLimitExceeded):
+                        self.limiter.on_temporary_error(e)
+                finally:
+                    # Reenvios voltam direto para a fila, sem ocupar lugar em in_flight
+                    if attempt == 1:
+                        in_flight.release()
+                if isinstance(error, SendCancelled):
+                    continue
+
+                errors = split_recipient_errors(
+                    [recipient.get('email') for recipient in batch], refused=refused, error=error
+                )
+                retry_batch = [
+                    recipient for recipient in batch
+                    if errors[recipient.get('email')] is not None
+                    and self.retry_policy.should_retry(errors[recipient.get('email')], attempt)
+                ]
+                retrying = {id(recipient) for recipient in retry_batch}
+                if self.cancelled.is_set():
+                    # Não haverá nova tentativa: esses destinatários ficam pendentes
+                    batch = [recipient for recipient in batch if id(recipient) not in retrying]
+                    retry_batch = []
+                delay = self.retry_policy.delay(attempt) if retry_batch else None
+                if retry_batch:
+                    loop.call_later(delay, pending.put_nowait, (retry_batch, data, attempt + 1))
+                for recipient in batch:
+                    retry_delay = delay if id(recipient) in retrying else None
+                    recipient_error = errors[recipient.get('email')]
+                    if retry_delay is not None:
+                        result = 'retried'
+                    else:
+                        result = 'sent' if recipient_error is None else 'failed'
+                    MESSAGES_TOTAL.inc(provider=self.host, result=result)
+                    results.append((recipient, recipient_error, attempt, retry_delay))
+        finally:
+            if connection is not None:
+                await self._close(connection)
+            self._release_slot()
+
+    async def _send_all(self, recipients, subject, message, sender_name, sender_email, on_result, on_retry,
+                        batch_size):
+        pending = asyncio.Queue()
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        results = deque()
+        workers = [
+            asyncio.create_task(self._connection_worker(pending, in_flight, results))
+            for _ in range(self.pool_size)
+        ]
+
+        sent_count = 0
+        failed_count = 0
+
+        def drain_results():
+            nonlocal sent_count, failed_count
+            while results:
+                recipient, error, attempt, retry_delay = results.popleft()
+                if retry_delay is not None:
+                    if on_retry:
+                        on_retry(recipient, error, attempt, retry_delay)
+                    continue
+                if error is None:
+                    sent_count += 1
+                else:
+                    failed_count += 1
+                if on_result:
+                    on_result(recipient, error)
+
+        template = EmailTemplate(subject, message, sender_name, sender_email, batch=batch_size > 1)
+        total = 0
+        for batch, data in iter_messages(template, recipients, batch_size):
+            if self.cancelled.is_set():
+                break
+            await in_flight.acquire()
+            drain_results()
+            await pending.put((batch, None if data is None else to_smtp_data(data), 1))
+            total += len(batch)
+
+        # Aguardar o resultado final de todos, inclusive dos que estão em backoff (salvo cancelamento)
+        while (
+            sent_count + failed_count < total
+            and not self.cancelled.is_set()
+            and not all(worker.done() for worker in workers)
+        ):
+            await asyncio.sleep(RESULT_POLL_INTERVAL)
+            drain_results()
+
+        for _ in workers:
+            await pending.put(None)
+        await asyncio.gather(*workers)
+        drain_results()
+
+        return sent_count, failed_count
+
+    def send(self, recipients, subject, message, sender_name, sender_email, on_result=None, on_retry=None,
+             batch_size=1):
+        """Envia para todos os destinatários; on_result e on_retry rodam na thread que chamou"""
+        return asyncio.run(
+            self._send_all(recipients, subject, message, sender_name, sender_email, on_result, on_retry, batch_size)
+        )
+
+    def cancel(self):
+        """Interrompe o envio: as transações em andamento terminam e nenhuma outra começa"""
+        self.cancelled.set()
+
+    def close(self):
+        pass
@@ -0,0 +1,56 @@
+import threading
+
+from sqlalchemy import create_engine, event
+
+# Ajustes aplicados a cada conexão SQLite nova. Com WAL, leituras não esperam
+# pela importação ou pelo log de envios, e o busy_timeout faz quem escreve
+# aguardar a vez em vez de falhar com "database is locked".
+BUSY_TIMEOUT_MS = 5000
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),  # seguro com WAL; o fsync fica só nos checkpoints
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('cache_size', -16000),  # em KiB (16 MB por conexão)
+    ('temp_store', 'MEMORY'),
+)
+
+# Conexões mantidas abertas por processo (workers de envio + requisições)
+POOL_SIZE = 8
+MAX_OVERFLOW = 16
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def apply_pragmas(dbapi_connection, connection_record=None):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS:
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+def engine_options(uri):
+    """Opções do engine do SQLAlchemy (Flask: SQLALCHEMY_ENGINE_OPTIONS) para a URI"""
+    if not uri.startswith('sqlite') or ':memory:' in uri or uri.rstrip('/') == 'sqlite:':
+        return {}
+    return {
+        'pool_size': POOL_SIZE,
+        'max_overflow': MAX_OVERFLOW,
+        'connect_args': {'timeout': BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False},
+    }
+
+def configure_engine(engine):
+    """Aplica os PRAGMAs em toda conexão nova do engine (só SQLite)"""
+    if engine.dialect.name == 'sqlite' and not event.contains(engine, 'connect', apply_pragmas):
+        event.listen(engine, 'connect', apply_pragmas)
+    return engine
+
+def get_engine(path):
+    """Engine com pool de conexões para o arquivo SQLite, compartilhado no processo"""
+    uri = f'sqlite:///{path}'
+    with _engines_lock:
+        if uri not in _engines:
+            _engines[uri] = configure_engine(create_engine(uri, **engine_options(uri)))
+        return _engines[uri]
@@ -0,0 +1,304 @@
+import heapq
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+from src.services.async_delivery import AsyncDeliveryEngine
+from src.services.mailer import get_smtp_config, smtp_login
+from src.services.metrics import MESSAGES_TOTAL, SMTP_CONNECTIONS, timed
+from src.services.rate_limit import get_rate_limiter
+from src.services.retry import RECONNECT_ATTEMPTS, RetryPolicy
+from src.services.smtp_errors import (
+    SendCancelled, is_connection_error, is_dropped_connection, is_temporary_error, split_recipient_errors
+)
+from src.services.templates import EmailTemplate, iter_messages
+
+# Conexões simultâneas por remetente
+DEFAULT_POOL_SIZE = 4
+
+# Mensagens renderizadas aguardando envio, por conexão (o gerador só avança quando há vaga)
+IN_FLIGHT_PER_CONNECTION = 4
+
+# Limite de conexões simultâneas por servidor SMTP, somando todos os envios do processo
+PROVIDER_MAX_CONNECTIONS = {
+    'smtp.gmail.com': 10,
+    'smtp-mail.outlook.com': 3,
+    'smtp.mail.yahoo.com': 5,
+    'smtps.uol.com.br': 3,
+    'smtp.terra.com.br': 3,
+    'smtp.ig.com.br': 3,
+}
+DEFAULT_PROVIDER_MAX_CONNECTIONS = 3
+
+# 'threads' usa smtplib bloqueante; 'async' usa o cliente asyncio com pipelining
+DELIVERY_MODES = ('threads', 'async')
+DEFAULT_DELIVERY_MODE = 'threads'
+
+_provider_slots = {}
+_provider_slots_lock = threading.Lock()
+
+
+def get_provider_slots(server, limits=None):
+    """Retorna o semáforo que limita as conexões abertas para um servidor SMTP"""
+    with _provider_slots_lock:
+        if server not in _provider_slots:
+            limits = limits or PROVIDER_MAX_CONNECTIONS
+            limit = limits.get(server, DEFAULT_PROVIDER_MAX_CONNECTIONS)
+            _provider_slots[server] = threading.BoundedSemaphore(limit)
+        return _provider_slots[server]
+
+
+class SMTPConnectionPool:
+    """Pool limitado de sessões SMTP autenticadas de um mesmo remetente"""
+
+    def __init__(self, sender_email, sender_password, size=DEFAULT_POOL_SIZE, provider_limits=None):
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.size = size
+        self.server = get_smtp_config(sender_email)['server']
+        self._provider_slots = get_provider_slots(self.server, provider_limits)
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+
+    def _acquire_server(self):
+        # Reutiliza uma conexão ociosa ou abre uma nova se o provedor permitir
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self._provider_slots.acquire(timeout=0.5):
+                try:
+                    server = smtp_login(self.sender_email, self.sender_password)
+                except Exception:
+                    self._provider_slots.release()
+                    raise
+                with self._lock:
+                    self._open += 1
+                SMTP_CONNECTIONS.inc(provider=self.server)
+                return server
+
+    def _discard(self, server):
+        try:
+            server.close()
+        finally:
+            with self._lock:
+                self._open -= 1
+            SMTP_CONNECTIONS.dec(provider=self.server)
+            self._provider_slots.release()
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            server = self._acquire_server()
+            try:
+                yield server
+            except Exception as e:
+                if is_connection_error(e):
+                    self._discard(server)
+                else:
+                    self._idle.put(server)
+                raise
+            else:
+                self._idle.put(server)
+        finally:
+            self._slots.release()
+
+    def warm_up(self):
+        """Abre uma conexão para validar as credenciais antes do envio"""
+        with self.connection():
+            pass
+
+    @property
+    def open_connections(self):
+        return self._open
+
+    def close(self):
+        while True:
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                server.quit()
+            except Exception:
+                pass
+            with self._lock:
+                self._open -= 1
+            SMTP_CONNECTIONS.dec(provider=self.server)
+            self._provider_slots.release()
+
+
+def capped_pool_size(sender_email, pool_size=None, provider_limits=None):
+    """Tamanho do pool limitado pelo teto de conexões do provedor"""
+    server = get_smtp_config(sender_email)['server']
+    limits = provider_limits or PROVIDER_MAX_CONNECTIONS
+    provider_cap = limits.get(server, DEFAULT_PROVIDER_MAX_CONNECTIONS)
+    return max(1, min(pool_size or DEFAULT_POOL_SIZE, provider_cap))
+
+
+class DeliveryEngine:
+    """Distribui os destinatários entre as conexões do pool usando threads"""
+
+    def __init__(self, sender_email, sender_password, pool_size=None, provider_limits=None, rate_limits=None,
+                 retry_policy=None, cancel_event=None):
+        self.pool_size = capped_pool_size(sender_email, pool_size, provider_limits)
+        self.pool = SMTPConnectionPool(sender_email, sender_password, self.pool_size, provider_limits)
+        self.max_in_flight = self.pool_size * IN_FLIGHT_PER_CONNECTION
+        self.limiter = get_rate_limiter(sender_email, rate_limits)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.cancelled = cancel_event or threading.Event()
+
+    def warm_up(self):
+        """Abre uma conexão para validar as credenciais antes do envio"""
+        self.pool.warm_up()
+
+    def _send_message(self, batch, data, sender_email):
+        """Uma transação SMTP para o lote; retorna os endereços recusados no RCPT"""
+        if data is None:
+            raise ValueError('Destinatário sem e-mail')
+        # Depois do cancelamento nenhuma transação nova começa; as já iniciadas terminam
+        if self.cancelled.is_set() or self.cancelled.wait(self.limiter.reserve(len(batch))):
+            raise SendCancelled()
+        for reconnect in range(RECONNECT_ATTEMPTS + 1):
+            try:
+                with self.pool.connection() as server, timed('smtp_send'):
+                    refused = server.sendmail(sender_email, [recipient['email'] for recipient in batch], data)
+                break
+            except Exception as e:
+                if is_dropped_connection(e) and reconnect < RECONNECT_ATTEMPTS:
+                    # O pool já descartou a sessão; tenta de novo em outra
+                    continue
+                if is_temporary_error(e):
+                    self.limiter.on_temporary_error(e)
+                raise
+        self.limiter.on_success()
+        return refused
+
+    def send(self, recipients, subject, message, sender_name, sender_email, on_result=None, on_retry=None,
+             batch_size=1):
+        """Envia para todos os destinatários; on_result e on_retry rodam na thread que chamou.
+
+        Falhas temporárias voltam para a fila após o backoff da RetryPolicy;
+        on_retry(recipient, error, attempt, delay) é chamado a cada reagendamento.
+        Com ``batch_size`` > 1, mensagens idênticas do mesmo domínio seguem em
+        uma única transação com vários RCPT TO. Se ``cancelled`` for acionado, os
+        destinatários ainda não enviados ficam sem resultado (nem on_result).
+        """
+        template = EmailTemplate(subject, message, sender_name, sender_email, batch=batch_size > 1)
+        sent_count = 0
+        failed_count = 0
+        retries = []  # heap de (horário, desempate, lote, mensagem, tentativa)
+        order = itertools.count()
+
+        messages = iter_messages(template, recipients, batch_size)
+        exhausted = False
+
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            futures = {}
+
+            def submit_next():
+                """Renderiza e enfileira mensagens novas até ``max_in_flight`` (memória limitada em listas grandes)"""
+                nonlocal exhausted
+                while not exhausted and len(futures) < self.max_in_flight and not self.cancelled.is_set():
+                    message = next(messages, None)
+                    if message is None:
+                        exhausted = True
+                        return
+                    batch, data = message
+                    futures[executor.submit(self._send_message, batch, data, sender_email)] = (batch, data, 1)
+
+            submit_next()
+            while futures or retries:
+                if self.cancelled.is_set():
+                    # Reenvios em backoff não voltam mais para a fila
+                    retries.clear()
+                    if not futures:
+                        break
+                timeout = max(0.0, retries[0][0] - time.monotonic()) if retries else None
+                if futures:
+                    done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    # Só restam reenvios em backoff: a espera termina antes se o envio for cancelado
+                    done = ()
+                    self.cancelled.wait(timeout)
+                for future in done:
+                    batch, data, attempt = futures.pop(future)
+                    error = future.exception()
+                    if isinstance(error, SendCancelled):
+                        continue
+                    errors = split_recipient_errors(
+                        [recipient.get('email') for recipient in batch],
+                        refused=None if error else future.result(),
+                        error=error
+                    )
+                    retry_batch = []
+                    for recipient in batch:
+                        recipient_error = errors[recipient.get('email')]
+                        if recipient_error is not None and self.retry_policy.should_retry(recipient_error, attempt):
+                            if self.cancelled.is_set():
+                                # Não haverá nova tentativa: o destinatário fica pendente
+                                continue
+                            retry_batch.append((recipient, recipient_error))
+                            MESSAGES_TOTAL.inc(provider=self.pool.server, result='retried')
+                            continue
+                        if recipient_error is None:
+                            sent_count += 1
+                        else:
+                            failed_count += 1
+                        MESSAGES_TOTAL.inc(provider=self.pool.server, result='sent' if recipient_error is None else 'failed')
+                        if on_result:
+                            on_result(recipient, recipient_error)
+
+                    if retry_batch:
+                        delay = self.retry_policy.delay(attempt)
+                        batch = [recipient for recipient, _ in retry_batch]
+                        heapq.heappush(retries, (time.monotonic() + delay, next(order), batch, data, attempt + 1))
+                        if on_retry:
+                            for recipient, recipient_error in retry_batch:
+                                on_retry(recipient, recipient_error, attempt, delay)
+
+                # Reenfileirar as tentativas cujo backoff terminou
+                now = time.monotonic()
+                while retries and retries[0][0] <= now:
+                    _, _, batch, data, attempt = heapq.heappop(retries)
+                    futures[executor.submit(self._send_message, batch, data, sender_email)] = (batch, data, attempt)
+                submit_next()
+
+        return sent_count, failed_count
+
+    def cancel(self):
+        """Interrompe o envio: as transações em andamento terminam e nenhuma outra começa"""
+        self.cancelled.set()
+
+    def close(self):
+        self.pool.close()
+
+
+def create_delivery_engine(sender_email, sender_password, mode=None, pool_size=None, provider_limits=None,
+                           rate_limits=None, retry_policy=None, cancel_event=None):
+    """Cria o motor de envio do modo escolhido ('threads' ou 'async').
+
+    ``cancel_event`` (threading.Event) permite cancelar o envio de outra thread.
+    """
+    mode = mode or DEFAULT_DELIVERY_MODE
+    if mode not in DELIVERY_MODES:
+        raise ValueError(f'Modo de envio inválido: {mode}')
+
+    if mode == 'async':
+        connections = capped_pool_size(sender_email, pool_size, provider_limits)
+        # O teto por provedor vale para os dois modos, somando todos os envios do processo
+        provider_slots = get_provider_slots(get_smtp_config(sender_email)['server'], provider_limits)
+        return AsyncDeliveryEngine(
+            sender_email, sender_password, connections=connections, rate_limits=rate_limits, retry_policy=retry_policy,
+            cancel_event=cancel_event, provider_slots=provider_slots
+        )
+    return DeliveryEngine(
+        sender_email, sender_password, pool_size, provider_limits, rate_limits, retry_policy, cancel_event
+    )
@@ -0,0 +1,105 @@
+import numpy as np
+
+# Colunas com filtro por valor exato (partido, UF e cargo)
+FACET_FIELDS = ('partido', 'uf', 'cargo')
+
+
+def _bitmap(mask):
+    """Converte uma máscara booleana em bitmap (int do Python; bit i = linha i)"""
+    return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+
+
+class FacetIndex:
+    """Índice de facetas: para cada valor de partido/UF/cargo, o bitmap das linhas.
+
+    Combinar filtros é um AND entre bitmaps e as contagens saem de
+    ``int.bit_count()``, sem percorrer as linhas. As linhas ficam na ordem de
+    ``ids`` (crescente), o que permite paginar por cursor sobre o resultado.
+    """
+
+    def __init__(self, ids, bitmaps):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.size = len(self.ids)
+        self.bitmaps = bitmaps
+        self.all = (1 << self.size) - 1
+
+    @classmethod
+    def from_frame(cls, df, fields=FACET_FIELDS, id_column=None):
+        """Monta o índice a partir das colunas categóricas (ou de texto) do DataFrame"""
+        ids = df[id_column].to_numpy() if id_column else df.index.to_numpy()
+        bitmaps = {}
+        for field in fields:
+            categorical = df[field].astype('category').cat
+            codes = categorical.codes.to_numpy()
+            bitmaps[field] = {
+                str(value): _bitmap(codes == code)
+                for code, value in enumerate(categorical.categories)
+                if str(value).strip()
+            }
+        return cls(ids, bitmaps)
+
+    def ids_bitmap(self, ids):
+        """Bitmap das linhas com os ids informados (ex.: resultado de uma busca por nome)"""
+        mask = np.zeros(self.size, dtype=bool)
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids)
+        found = positions < self.size
+        found[found] = self.ids[positions[found]] == ids[found]
+        mask[positions[found]] = True
+        return _bitmap(mask)
+
+    def mask(self, filters, exclude=None, base=None):
+        """Bitmap das linhas que atendem aos filtros (valor vazio não filtra)"""
+        result = self.all if base is None else base
+        for field, value in filters.items():
+            if field == exclude or field not in self.bitmaps or not value:
+                continue
+            result &= self.bitmaps[field].get(str(value), 0)
+        return result
+
+    def positions(self, bitmap):
+        """Posições (em ordem) das linhas marcadas no bitmap"""
+        if not bitmap:
+            return np.empty(0, dtype=np.int64)
+        data = np.frombuffer(bitmap.to_bytes((self.size + 7) // 8, 'little'), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(data, bitorder='little')[:self.size])
+
+    def select_ids(self, filters, after=None, limit=None, base=None):
+        """Ids das linhas filtradas, opcionalmente após o cursor ``after`` e limitados a ``limit``"""
+        ids = self.ids[self.positions(self.mask(filters, base=base))]
+        if after is not None:
+            ids = ids[np.searchsorted(ids, after, side='right'):]
+        if limit is not None:
+            ids = ids[:limit]
+        return ids.tolist()
+
+    def count(self, filters, base=None):
+        return self.mask(filters, base=base).bit_count()
+
+    def counts(self, filters, base=None):
+        """Contagem de cada valor das facetas.
+
+        Cada faceta é contada com os filtros das demais aplicados, mas não o
+        seu próprio, para que os outros valores continuem selecionáveis.
+        """
+        result = {}
+        for field, values in self.bitmaps.items():
+            others = self.mask(filters, exclude=field, base=base)
+            result[field] = [
+                {'value': value, 'count': (bitmap & others).bit_count()}
+                for value, bitmap in sorted(values.items())
+            ]
+        return result
+
+
+def categorize(df, fields=FACET_FIELDS):
+    """Converte as colunas de faceta para o dtype 'category' (valores repetidos guardados uma vez)"""
+    for field in fields:
+        if field in df.columns:
+            df[field] = df[field].astype('category')
+    return df
+
+
+def facet_options(index, field, all_label):
+    """Opções de um filtro: o rótulo de 'todos' seguido dos valores em ordem"""
+    return [all_label] + sorted(index.bitmaps.get(field, {}))
@@ -0,0 +1,118 @@
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from src.models.parlamentar import db, EmailHistory, EmailStat
+from src.services.mailer import get_smtp_config
+
+# Dias retornados em /api/email-history/stats por padrão
+DEFAULT_STATS_DAYS = 30
+
+
+def smtp_provider(sender_email):
+    """Servidor SMTP usado pelo remetente (o mesmo rótulo das métricas de envio)"""
+    try:
+        return get_smtp_config(sender_email)['server']
+    except (IndexError, AttributeError):
+        return 'desconhecido'
+
+def _add_stats(history, campaigns, recipients, sent, failed):
+    """Soma valores aos totais do dia/remetente/servidor do envio (upsert atômico)"""
+    day = (history.date or datetime.utcnow()).date()
+    statement = insert(EmailStat).values(
+        day=day,
+        sender_email=history.sender_email.lower(),
+        provider=smtp_provider(history.sender_email),
+        campaigns=campaigns,
+        recipients=recipients,
+        sent=sent,
+        failed=failed,
+    )
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['day', 'sender_email', 'provider'],
+        set_={
+            'campaigns': EmailStat.campaigns + statement.excluded.campaigns,
+            'recipients': EmailStat.recipients + statement.excluded.recipients,
+            'sent': EmailStat.sent + statement.excluded.sent,
+            'failed': EmailStat.failed + statement.excluded.failed,
+        }
+    ))
+
+def record_campaign(history):
+    """Soma um envio aos totais do dia/remetente/servidor, na transação do histórico.
+
+    O upsert é atômico, então jobs terminando ao mesmo tempo não se sobrepõem.
+    """
+    _add_stats(history, 1, history.recipients_count, history.sent or 0, history.failed or 0)
+
+def update_campaign(history, sent, failed):
+    """Atualiza um envio já contado (job reenviado) somando aos totais só a diferença"""
+    _add_stats(history, 0, 0, sent - (history.sent or 0), failed - (history.failed or 0))
+    history.sent = sent
+    history.failed = failed
+
+def rebuild_stats():
+    """Recalcula os totais a partir do histórico (bancos criados antes de email_stats)"""
+    totals = {}
+    rows = db.session.query(
+        EmailHistory.date, EmailHistory.sender_email, EmailHistory.recipients_count,
+        EmailHistory.sent, EmailHistory.failed
+    )
+    for date, sender_email, recipients, sent, failed in rows.yield_per(1000):
+        key = (date.date(), sender_email.lower(), smtp_provider(sender_email))
+        entry = totals.setdefault(key, [0, 0, 0, 0])
+        entry[0] += 1
+        entry[1] += recipients or 0
+        entry[2] += sent or 0
+        entry[3] += failed or 0
+
+    EmailStat.query.delete()
+    if totals:
+        db.session.execute(EmailStat.__table__.insert(), [
+            {
+                'day': day, 'sender_email': sender_email, 'provider': provider,
+                'campaigns': campaigns, 'recipients': recipients, 'sent': sent, 'failed': failed,
+            }
+            for (day, sender_email, provider), (campaigns, recipients, sent, failed) in totals.items()
+        ])
+    db.session.commit()
+    return len(totals)
+
+def ensure_stats():
+    """Preenche email_stats na primeira execução com histórico já existente"""
+    if EmailStat.query.first() is None and EmailHistory.query.first() is not None:
+        rebuild_stats()
+
+
+def _totals(campaigns, recipients, sent, failed):
+    attempted = (sent or 0) + (failed or 0)
+    return {
+        'campaigns': campaigns or 0,
+        'recipients': recipients or 0,
+        'sent': sent or 0,
+        'failed': failed or 0,
+        'success_rate': round(sent / attempted, 4) if attempted else None,
+    }
+
+def _grouped(column, order_by=None, limit=None):
+    query = db.session.query(
+        column, func.sum(EmailStat.campaigns), func.sum(EmailStat.recipients),
+        func.sum(EmailStat.sent), func.sum(EmailStat.failed)
+    ).group_by(column).order_by(order_by if order_by is not None else func.sum(EmailStat.campaigns).desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return [{column.key: str(key), **_totals(*values)} for key, *values in query]
+
+def campaign_stats(days=DEFAULT_STATS_DAYS):
+    """Totais e taxas de sucesso gerais, por dia (últimos ``days``), por remetente e por servidor"""
+    total = db.session.query(
+        func.sum(EmailStat.campaigns), func.sum(EmailStat.recipients),
+        func.sum(EmailStat.sent), func.sum(EmailStat.failed)
+    ).one()
+    return {
+        'totals': _totals(*total),
+        'by_day': _grouped(EmailStat.day, EmailStat.day.desc(), days),
+        'by_sender': _grouped(EmailStat.sender_email),
+        'by_provider': _grouped(EmailStat.provider),
+    }
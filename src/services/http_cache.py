@@ -0,0 +1,53 @@
+import gzip
+
+from flask import request
+
+# Tipos comprimidos e tamanho mínimo (abaixo disso o cabeçalho gzip não compensa)
+COMPRESSIBLE_TYPES = {
+    'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript', 'text/javascript',
+}
+MIN_COMPRESS_SIZE = 512
+GZIP_LEVEL = 6
+
+
+def accepted_encoding():
+    """'gzip' se o cliente aceitar, senão None"""
+    return request.accept_encodings.best_match(['gzip'])
+
+def compress(data):
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def not_modified(etag):
+    """O cliente já tem a versão ``etag`` (If-None-Match usa comparação fraca)"""
+    return request.if_none_match.contains_weak(etag)
+
+
+def compress_response(response):
+    """Comprime as respostas de texto/JSON e responde 304 quando o ETag não mudou"""
+    if request.method not in ('GET', 'HEAD', 'POST') or response.status_code != 200:
+        return response
+
+    if (
+        response.mimetype in COMPRESSIBLE_TYPES
+        and 'Content-Encoding' not in response.headers
+        and (encoding := accepted_encoding())
+    ):
+        # Arquivos estáticos chegam em modo passthrough; index.html é pequeno o bastante para ler
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) >= MIN_COMPRESS_SIZE:
+            response.set_data(compress(data))
+            response.headers['Content-Encoding'] = encoding
+            # O mesmo ETag vale com e sem gzip, por isso passa a ser fraco
+            etag, _ = response.get_etag()
+            if etag:
+                response.set_etag(etag, weak=True)
+        response.vary.add('Accept-Encoding')
+
+    if request.method != 'POST' and response.get_etag()[0] and not response.direct_passthrough:
+        response = response.make_conditional(request)
+    return response
+
+
+def init_http_cache(app):
+    app.after_request(compress_response)
@@ -0,0 +1,282 @@
+import hashlib
+import re
+import unicodedata
+
+import pandas as pd
+from sqlalchemy import update
+
+from src.models.parlamentar import db, Parlamentar
+from src.services.log import log_event
+from src.services.metrics import timed, timed_iter
+from src.services.recipients import clean_email_column
+from src.services.roster import bump_roster_version, refresh_roster
+
+PARLAMENTAR_COLUMNS = ['nome', 'nome_civil', 'partido', 'uf', 'cargo', 'email', 'telefone', 'gabinete', 'endereco']
+
+IMPORT_MODES = ('incremental', 'replace')
+
+# Limite de parâmetros por DELETE ... IN (...)
+DELETE_BATCH_SIZE = 500
+
+
+def _text(df, column):
+    """Coluna como texto limpo; ausente ou vazia vira ''"""
+    if column not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[column].fillna('').astype(str).str.strip()
+
+def _join_text(*columns):
+    joined = columns[0].str.cat(columns[1:], sep=' ')
+    return joined.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+def _valid_rows(result, require_contact=True):
+    # E-mails normalizados; células com vários endereços ficam separadas por '; '
+    result['email'] = clean_email_column(result['email'])
+    mask = result['nome'] != ''
+    if require_contact:
+        mask &= (result['email'] != '') | (result['telefone'] != '')
+    return result[mask].reset_index(drop=True)
+
+
+def normalize_text(series):
+    """Minúsculas e sem acentos ("Acácio" -> "acacio")"""
+    return (
+        series.str.normalize('NFKD')
+        .str.encode('ascii', 'ignore')
+        .str.decode('ascii')
+        .str.lower()
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+    )
+
+
+def normalize_term(text):
+    """Versão de normalize_text para um único termo de busca"""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'\s+', ' ', text.lower()).strip()
+
+
+def process_camara_data(df):
+    """Processa dados da planilha da Câmara dos Deputados"""
+    result = pd.DataFrame({
+        'nome': _text(df, 'Nome Parlamentar'),
+        'nome_civil': _text(df, 'Nome Civil'),
+        'partido': _text(df, 'Partido'),
+        'uf': _text(df, 'UF'),
+        'cargo': 'Deputado',
+        'email': _text(df, 'Correio Eletrônico'),
+        'telefone': _text(df, 'Telefone'),
+        'gabinete': _text(df, 'Gabinete'),
+        'endereco': _join_text(
+            _text(df, 'Endereço'), _text(df, 'Endereço (continuação)'), _text(df, 'Endereço (complemento)')
+        ),
+    }, columns=PARLAMENTAR_COLUMNS)
+
+    # Validar se tem nome e pelo menos um contato
+    return _valid_rows(result)
+
+def process_senado_data(df):
+    """Processa dados do Senado Federal"""
+    result = pd.DataFrame({
+        'nome': _text(df, 'Nome'),
+        'nome_civil': _text(df, 'Nome Completo'),
+        'partido': _text(df, 'Partido'),
+        'uf': _text(df, 'UF'),
+        'cargo': 'Senador',
+        'email': _text(df, 'Correio Eletrônico'),
+        'telefone': _text(df, 'Telefones'),
+        'gabinete': '',
+        'endereco': '',
+    }, columns=PARLAMENTAR_COLUMNS)
+
+    # Validar se tem nome e pelo menos um contato
+    return _valid_rows(result)
+
+def process_generic_data(df):
+    """Mapeia colunas genéricas pelo nome (a última coluna compatível prevalece)"""
+    result = pd.DataFrame('', index=df.index, columns=PARLAMENTAR_COLUMNS)
+    result['cargo'] = 'Parlamentar'
+
+    for col in df.columns:
+        col_lower = str(col).lower()
+        if 'nome' in col_lower:
+            target = 'nome'
+        elif 'partido' in col_lower:
+            target = 'partido'
+        elif 'uf' in col_lower or 'estado' in col_lower:
+            target = 'uf'
+        elif 'email' in col_lower or 'eletrônico' in col_lower:
+            target = 'email'
+        elif 'telefone' in col_lower or 'fone' in col_lower:
+            target = 'telefone'
+        elif 'gabinete' in col_lower:
+            target = 'gabinete'
+        else:
+            continue
+        result[target] = _text(df, col)
+
+    return _valid_rows(result, require_contact=False)
+
+def detect_mapper(columns):
+    """Escolhe o mapeador pelas colunas da planilha (None se não reconhecer)"""
+    # Verificar se é planilha da Câmara (tem coluna 'Nome Parlamentar')
+    if 'Nome Parlamentar' in columns:
+        return process_camara_data
+    # Verificar se é planilha do Senado (tem coluna 'Nome' e 'Partido')
+    if 'Nome' in columns and 'Partido' in columns:
+        return process_senado_data
+    # Tentar detectar automaticamente baseado nas colunas
+    if any('nome' in str(col).lower() for col in columns):
+        return process_generic_data
+    return None
+
+def detect_and_process(df):
+    """Detecta o tipo de planilha e retorna os parlamentares mapeados"""
+    mapper = detect_mapper(df.columns)
+    if mapper is None:
+        return pd.DataFrame(columns=PARLAMENTAR_COLUMNS)
+    return mapper(df)
+
+def with_identity(parlamentares_df):
+    """Acrescenta a chave de identidade e o hash do conteúdo de cada linha"""
+    df = parlamentares_df.copy()
+    email_key = df['email'].str.lower()
+    name_key = normalize_text(df['nome']) + '|' + df['uf'].str.upper()
+    df['identity_key'] = email_key.where(email_key != '', name_key)
+    df['nome_busca'] = normalize_text(df['nome'])
+    content = df[PARLAMENTAR_COLUMNS[0]].str.cat([df[column] for column in PARLAMENTAR_COLUMNS[1:]], sep='\x1f')
+    df['content_hash'] = content.map(lambda row: hashlib.sha1(row.encode('utf-8')).hexdigest())
+    # A primeira ocorrência de cada identidade prevalece
+    return df.drop_duplicates(subset='identity_key', keep='first').reset_index(drop=True)
+
+
+class ImportSession:
+    """Grava uma importação bloco a bloco, em uma única transação.
+
+    No modo 'replace' a tabela é esvaziada e recarregada; no modo
+    'incremental' cada bloco só insere/atualiza o que mudou e, ao final,
+    são removidas as identidades que não apareceram na planilha.
+    """
+
+    def __init__(self, mode='incremental'):
+        self.mode = mode
+        self.mapper = None
+        self.diff = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        self._seen = set()
+        self._existing = {}
+        self._stale_ids = []
+
+        if mode == 'replace':
+            Parlamentar.query.delete()
+            return
+
+        for row_id, identity_key, content_hash, nome_busca in db.session.query(
+            Parlamentar.id, Parlamentar.identity_key, Parlamentar.content_hash, Parlamentar.nome_busca
+        ):
+            if identity_key is None:
+                # Linhas de importações antigas, sem chave: recarregadas uma única vez
+                self._stale_ids.append(row_id)
+            else:
+                # Sem nome_busca a linha é tratada como alterada, para preencher a coluna
+                self._existing[identity_key] = (row_id, content_hash if nome_busca is not None else None)
+
+    @property
+    def total(self):
+        return len(self._seen)
+
+    def add_chunk(self, raw_df):
+        """Mapeia um bloco da planilha original, grava as diferenças e retorna o bloco mapeado"""
+        if self.mapper is None:
+            self.mapper = detect_mapper(raw_df.columns)
+            if self.mapper is None:
+                return None
+        with timed('import_map'):
+            parlamentares_df = self.mapper(raw_df)
+        self.add_parlamentares(parlamentares_df)
+        return parlamentares_df
+
+    def add_parlamentares(self, parlamentares_df):
+        """Grava um bloco de parlamentares já mapeados"""
+        with timed('import_db_write'):
+            self._write(parlamentares_df)
+
+    def _write(self, parlamentares_df):
+        df = with_identity(parlamentares_df)
+        df = df[~df['identity_key'].isin(self._seen)]
+        self._seen.update(df['identity_key'])
+
+        known = df['identity_key'].isin(self._existing.keys())
+        inserts = df[~known]
+        matched = df[known]
+        current = matched['identity_key'].map(lambda key: self._existing[key][1])
+        changed = matched[matched['content_hash'] != current]
+
+        if len(inserts):
+            db.session.execute(Parlamentar.__table__.insert(), inserts.to_dict('records'))
+
+        if len(changed):
+            updates = changed.assign(id=changed['identity_key'].map(lambda key: self._existing[key][0]))
+            db.session.execute(update(Parlamentar), updates.to_dict('records'))
+
+        self.diff['inserted'] += len(inserts)
+        self.diff['updated'] += len(changed)
+        self.diff['unchanged'] += len(matched) - len(changed)
+
+    def finish(self, refresh=True):
+        """Remove as identidades ausentes da planilha e confirma a transação.
+
+        Com ``refresh=False`` a lista em memória não é recarregada aqui (o
+        benchmark cronometra essa etapa separadamente).
+        """
+        stale_ids = self._stale_ids + [
+            row_id for key, (row_id, _) in self._existing.items() if key not in self._seen
+        ]
+        for start in range(0, len(stale_ids), DELETE_BATCH_SIZE):
+            batch = stale_ids[start:start + DELETE_BATCH_SIZE]
+            Parlamentar.query.filter(Parlamentar.id.in_(batch)).delete(synchronize_session=False)
+        self.diff['deleted'] = len(stale_ids)
+        bump_roster_version()
+
+        with timed('import_commit'):
+            db.session.commit()
+        # A lista em memória (e o índice de facetas) passa a refletir a importação
+        if refresh:
+            refresh_roster()
+        log_event('import_finished', mode=self.mode, total=self.total, **self.diff)
+        return self.diff
+
+    def rollback(self):
+        db.session.rollback()
+
+
+def import_parlamentares(parlamentares_df, mode='incremental'):
+    """Grava os parlamentares mapeados e retorna o resumo das alterações"""
+    session = ImportSession(mode)
+    try:
+        session.add_parlamentares(parlamentares_df)
+        return session.finish()
+    except Exception:
+        session.rollback()
+        raise
+
+def import_chunks(chunks, mode='incremental', on_chunk=None):
+    """Importa uma planilha lida em blocos; retorna o resumo ou None se não reconhecer o formato.
+
+    ``on_chunk`` recebe cada bloco já mapeado assim que é lido (ex.: para gravá-lo no cache
+    de planilhas), sem que os blocos anteriores fiquem em memória.
+    """
+    session = ImportSession(mode)
+    try:
+        for chunk in timed_iter(chunks, 'import_parse'):
+            parlamentares_df = session.add_chunk(chunk)
+            if session.mapper is None:
+                break
+            if on_chunk is not None:
+                on_chunk(parlamentares_df)
+        if session.total == 0:
+            session.rollback()
+            return None
+        return session.finish()
+    except Exception:
+        session.rollback()
+        raise
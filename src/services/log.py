@@ -0,0 +1,37 @@
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+
+logger = logging.getLogger('mandaemail')
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por evento, com os campos passados em ``extra={'fields': ...}``"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level=logging.INFO, stream=None):
+    """Envia os logs do aplicativo em JSON para a saída de erros (uma única vez)"""
+    if any(isinstance(handler.formatter, JsonFormatter) for handler in logger.handlers):
+        return logger
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+def log_event(event, level=logging.INFO, **fields):
+    logger.log(level, event, extra={'fields': fields})
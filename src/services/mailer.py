@@ -0,0 +1,50 @@
+import os
+import smtplib
+
+from src.services.metrics import timed
+
+# Servidor SMTP usado para qualquer remetente (host:porta), ex.: o servidor falso dos benchmarks
+SMTP_SERVER_ENV = 'MANDAEMAIL_SMTP_SERVER'
+SMTP_STARTTLS_ENV = 'MANDAEMAIL_SMTP_STARTTLS'
+
+# Segundos de espera por cada resposta do servidor SMTP (nos dois motores de envio)
+SMTP_TIMEOUT = 60
+
+
+def get_smtp_config(email):
+    """Retorna configuração SMTP baseada no provedor de e-mail"""
+    override = os.environ.get(SMTP_SERVER_ENV)
+    if override:
+        host, _, port = override.partition(':')
+        return {'server': host, 'port': int(port or 25), 'starttls': os.environ.get(SMTP_STARTTLS_ENV) == '1'}
+
+    domain = email.split('@')[1].lower()
+
+    smtp_configs = {
+        'gmail.com': {'server': 'smtp.gmail.com', 'port': 587},
+        'outlook.com': {'server': 'smtp-mail.outlook.com', 'port': 587},
+        'hotmail.com': {'server': 'smtp-mail.outlook.com', 'port': 587},
+        'live.com': {'server': 'smtp-mail.outlook.com', 'port': 587},
+        'yahoo.com': {'server': 'smtp.mail.yahoo.com', 'port': 587},
+        'yahoo.com.br': {'server': 'smtp.mail.yahoo.com', 'port': 587},
+        'uol.com.br': {'server': 'smtps.uol.com.br', 'port': 587},
+        'terra.com.br': {'server': 'smtp.terra.com.br', 'port': 587},
+        'ig.com.br': {'server': 'smtp.ig.com.br', 'port': 587},
+    }
+
+    return smtp_configs.get(domain, {'server': 'smtp.gmail.com', 'port': 587})
+
+def smtp_login(sender_email, sender_password):
+    """Abre uma sessão SMTP autenticada para o remetente"""
+    smtp_config = get_smtp_config(sender_email)
+
+    with timed('smtp_connect'):
+        server = smtplib.SMTP(smtp_config['server'], smtp_config['port'], timeout=SMTP_TIMEOUT)
+        try:
+            if smtp_config.get('starttls', True):
+                server.starttls()
+            server.login(sender_email, sender_password)
+        except Exception:
+            server.close()
+            raise
+    return server
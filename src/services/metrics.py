@@ -0,0 +1,235 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Limites (em segundos) dos buckets do histograma de etapas
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def _items(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def _add(self, current, value):
+        return (current or 0) + value
+
+    def snapshot(self):
+        """Valores deste processo em formato JSON, para somar aos dos outros processos"""
+        return [[list(key), value] for key, value in self._items()]
+
+    def merged(self, snapshots=()):
+        """Valores deste processo somados aos de ``snapshots`` (listas geradas por ``snapshot()``)"""
+        values = dict(self._items())
+        for snapshot in snapshots:
+            for key, value in snapshot:
+                key = tuple(key)
+                values[key] = self._add(values.get(key), value)
+        return list(values.items())
+
+    def samples(self, snapshots=()):
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in self.merged(snapshots)
+        ]
+
+
+class Counter(_Metric):
+    """Contador que só cresce"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Valor instantâneo; com ``function`` é lido na hora da coleta"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, function=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.function = function
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        self.function = function
+
+    def value(self, **labels):
+        if self.function is not None:
+            return self.function()
+        return self._values.get(self._key(labels), 0)
+
+    def _items(self):
+        if self.function is not None:
+            return [((), self.function())]
+        return super()._items()
+
+
+class Histogram(_Metric):
+    """Distribuição de durações em buckets cumulativos, no formato do Prometheus"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            counts[position] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels), ([0], 0.0))
+        return sum(counts)
+
+    def _items(self):
+        with self._lock:
+            return [(key, (list(counts), total)) for key, (counts, total) in self._values.items()]
+
+    def _add(self, current, value):
+        counts, total = value
+        if current is None:
+            return list(counts), total
+        return [a + b for a, b in zip(current[0], counts)], current[1] + total
+
+    def samples(self, snapshots=()):
+        lines = []
+        for key, (counts, total) in self.merged(snapshots):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def snapshot(self):
+        """Valores de todas as métricas deste processo (JSON), para publicar aos outros processos"""
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def render(self, snapshots=()):
+        """Todas as métricas no formato texto do Prometheus (versão 0.0.4).
+
+        ``snapshots`` são pares (``snapshot()`` de outro processo, processo vivo):
+        contadores e histogramas somam todos; gauges, só os dos processos vivos.
+        """
+        snapshots = list(snapshots)
+        lines = []
+        for metric in self._metrics:
+            others = [
+                data.get(metric.name, []) for data, alive in snapshots
+                if alive or metric.kind != 'gauge'
+            ]
+            lines.extend(metric.header())
+            lines.extend(metric.samples(others))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    'mandaemail_stage_seconds',
+    'Duração das etapas de importação e envio',
+    ['stage']
+)
+MESSAGES_TOTAL = Counter(
+    'mandaemail_messages_total',
+    'Destinatários processados, por servidor SMTP e resultado (sent, failed, retried)',
+    ['provider', 'result']
+)
+SMTP_CONNECTIONS = Gauge(
+    'mandaemail_smtp_connections',
+    'Conexões SMTP abertas, por servidor',
+    ['provider']
+)
+SEND_QUEUE_DEPTH = Gauge(
+    'mandaemail_send_queue_depth',
+    'Jobs de envio aguardando na fila'
+)
+SEND_JOBS_ACTIVE = Gauge(
+    'mandaemail_send_jobs_active',
+    'Jobs de envio em andamento'
+)
+
+
+def timed(stage):
+    """Cronometra um trecho como uma etapa de mandaemail_stage_seconds"""
+    return STAGE_SECONDS.time(stage=stage)
+
+def timed_iter(iterable, stage):
+    """Cronometra o tempo gasto para produzir cada item do iterador"""
+    iterator = iter(iterable)
+    while True:
+        with timed(stage):
+            item = next(iterator, StopIteration)
+        if item is StopIteration:
+            return
+        yield item
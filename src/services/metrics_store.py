@@ -0,0 +1,29 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.sqlite import insert
+
+from src.models.parlamentar import db, MetricSnapshot
+from src.services.metrics import REGISTRY
+
+# Processos sem publicar há mais que isso são considerados mortos: os gauges deles
+# deixam de contar, mas contadores e histogramas continuam somados
+SNAPSHOT_STALE_AFTER = 30.0
+
+
+def publish_metrics(worker):
+    """Grava as métricas deste processo (chamado a cada sinal de vida da fila de envios)"""
+    statement = insert(MetricSnapshot).values(
+        worker_id=worker, data=json.dumps(REGISTRY.snapshot()), updated_at=datetime.utcnow()
+    )
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['worker_id'],
+        set_={'data': statement.excluded.data, 'updated_at': statement.excluded.updated_at}
+    ))
+    db.session.commit()
+
+def render_metrics(worker, stale_after=SNAPSHOT_STALE_AFTER):
+    """Métricas de todos os processos: as deste ao vivo, as dos outros pela última publicação"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    rows = MetricSnapshot.query.filter(MetricSnapshot.worker_id != worker)
+    return REGISTRY.render((json.loads(row.data), row.updated_at >= cutoff) for row in rows)
@@ -0,0 +1,223 @@
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import Column, Float, Index, Integer, MetaData, String, Table, delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+
+# Orçamento de envio por provedor (domínio do remetente); None desativa o limite
+PROVIDER_RATE_LIMITS = {
+    'gmail.com': {'per_minute': 60, 'per_day': 500},
+    'outlook.com': {'per_minute': 30, 'per_day': 300},
+    'hotmail.com': {'per_minute': 30, 'per_day': 300},
+    'live.com': {'per_minute': 30, 'per_day': 300},
+    'yahoo.com': {'per_minute': 30, 'per_day': 500},
+    'yahoo.com.br': {'per_minute': 30, 'per_day': 500},
+    'uol.com.br': {'per_minute': 20, 'per_day': 500},
+    'terra.com.br': {'per_minute': 20, 'per_day': 500},
+    'ig.com.br': {'per_minute': 20, 'per_day': 500},
+}
+DEFAULT_RATE_LIMIT = {'per_minute': 60, 'per_day': 2000}
+
+# AIMD: corta a taxa pela metade a cada erro temporário e recupera aos poucos
+MULTIPLICATIVE_DECREASE = 0.5
+ADDITIVE_INCREASE = 0.02  # fração da taxa máxima recuperada a cada envio bem-sucedido
+MIN_RATE_FRACTION = 0.05
+
+DAY_SECONDS = 24 * 60 * 60
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+# Engine do banco compartilhado (use_shared_state); None guarda o estado só no processo
+_shared_engine = None
+
+# Tabelas do estado compartilhado, em SQLAlchemy puro (o Streamlit usa este módulo sem o Flask)
+metadata = MetaData()
+rate_limit_buckets = Table(
+    'rate_limit_buckets', metadata,
+    Column('sender_email', String(200), primary_key=True),
+    Column('tokens', Float, nullable=False),
+    Column('rate', Float, nullable=False),  # Destinatários por segundo (ajustada pelo AIMD)
+    Column('updated_at', Float, nullable=False),  # time.time() da última atualização
+)
+rate_limit_sends = Table(
+    'rate_limit_sends', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('sender_email', String(200), nullable=False),
+    Column('sent_at', Float, nullable=False),  # time.time() da reserva
+    Column('count', Integer, nullable=False),
+    Index('ix_rate_limit_sends_sender_time', 'sender_email', 'sent_at'),
+)
+
+
+class DailyLimitExceeded(Exception):
+    """Orçamento diário do remetente esgotado; o envio pode ser retomado depois"""
+    temporary = True
+
+
+class ProviderRateLimiter:
+    """Token bucket com orçamento diário e ajuste AIMD da taxa"""
+
+    def __init__(self, per_minute=None, per_day=None, clock=time.monotonic):
+        self.clock = clock
+        self.max_rate = per_minute / 60.0 if per_minute else None
+        self.rate = self.max_rate
+        self.capacity = max(1.0, per_minute / 6.0) if per_minute else None  # rajada de ~10s
+        self.tokens = self.capacity
+        self.per_day = per_day
+        self.temporary_errors = 0
+        self.last_error = None
+        self._sent = deque()
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, count=1):
+        """Reserva ``count`` destinatários e retorna quantos segundos esperar antes do envio"""
+        with self._lock:
+            now = self.clock()
+            while self._sent and now - self._sent[0] >= DAY_SECONDS:
+                self._sent.popleft()
+            if self.per_day and len(self._sent) + count > self.per_day:
+                raise DailyLimitExceeded(f'Limite diário de {self.per_day} envios atingido')
+            self._sent.extend([now] * count)
+
+            if self.rate is None:
+                return 0.0
+            self._refill(now)
+            self.tokens -= count
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def on_success(self):
+        with self._lock:
+            if self.rate is not None:
+                self._refill(self.clock())
+                self.rate = min(self.max_rate, self.rate + self.max_rate * ADDITIVE_INCREASE)
+
+    def on_temporary_error(self, error=None):
+        with self._lock:
+            self.temporary_errors += 1
+            self.last_error = str(error) if error is not None else None
+            if self.rate is not None:
+                self._refill(self.clock())
+                self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate * MULTIPLICATIVE_DECREASE)
+
+    @property
+    def sent_today(self):
+        return len(self._sent)
+
+
+class SharedRateLimiter(ProviderRateLimiter):
+    """O mesmo limitador com o estado no banco, valendo para todos os processos do remetente.
+
+    Token bucket, taxa do AIMD e envios das últimas 24 h ficam nas tabelas
+    rate_limit_buckets e rate_limit_sends. Cada operação é uma transação curta
+    que começa por uma escrita: o SQLite a serializa entre os processos
+    (busy_timeout) e ninguém decide com base em um estado antigo.
+    """
+
+    def __init__(self, engine, sender_email, per_minute=None, per_day=None, clock=time.time):
+        super().__init__(per_minute, per_day, clock)
+        self.engine = engine
+        self.sender_email = sender_email
+
+    def _bucket(self, conn, now):
+        """Tokens e taxa do remetente, reabastecidos até ``now`` (o insert já trava o banco para escrita)"""
+        bucket = rate_limit_buckets
+        conn.execute(insert(bucket).values(
+            sender_email=self.sender_email, tokens=self.capacity, rate=self.max_rate, updated_at=now
+        ).on_conflict_do_nothing())
+        tokens, rate, updated = conn.execute(
+            select(bucket.c.tokens, bucket.c.rate, bucket.c.updated_at).where(bucket.c.sender_email == self.sender_email)
+        ).one()
+        # Os limites podem ter mudado na configuração desde a última gravação
+        rate = min(max(rate, self.max_rate * MIN_RATE_FRACTION), self.max_rate)
+        tokens = min(self.capacity, tokens + max(0.0, now - updated) * rate)
+        return tokens, rate
+
+    def _save_bucket(self, conn, now, tokens, rate):
+        conn.execute(
+            update(rate_limit_buckets).where(rate_limit_buckets.c.sender_email == self.sender_email)
+            .values(tokens=tokens, rate=rate, updated_at=now)
+        )
+
+    def reserve(self, count=1):
+        """Reserva ``count`` destinatários e retorna quantos segundos esperar antes do envio"""
+        now = self.clock()
+        with self.engine.begin() as conn:
+            if self.per_day:
+                sends = rate_limit_sends
+                mine = sends.c.sender_email == self.sender_email
+                conn.execute(delete(sends).where(mine, sends.c.sent_at <= now - DAY_SECONDS))
+                sent = conn.execute(select(func.coalesce(func.sum(sends.c.count), 0)).where(mine)).scalar()
+                if sent + count > self.per_day:
+                    raise DailyLimitExceeded(f'Limite diário de {self.per_day} envios atingido')
+                conn.execute(insert(sends).values(sender_email=self.sender_email, sent_at=now, count=count))
+
+            if self.max_rate is None:
+                return 0.0
+            tokens, rate = self._bucket(conn, now)
+            tokens -= count
+            self._save_bucket(conn, now, tokens, rate)
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+    def on_success(self):
+        if self.max_rate is None:
+            return
+        now = self.clock()
+        with self.engine.begin() as conn:
+            tokens, rate = self._bucket(conn, now)
+            self._save_bucket(conn, now, tokens, min(self.max_rate, rate + self.max_rate * ADDITIVE_INCREASE))
+
+    def on_temporary_error(self, error=None):
+        with self._lock:
+            self.temporary_errors += 1
+            self.last_error = str(error) if error is not None else None
+        if self.max_rate is None:
+            return
+        now = self.clock()
+        with self.engine.begin() as conn:
+            tokens, rate = self._bucket(conn, now)
+            rate = max(self.max_rate * MIN_RATE_FRACTION, rate * MULTIPLICATIVE_DECREASE)
+            self._save_bucket(conn, now, tokens, rate)
+
+    @property
+    def sent_today(self):
+        sends = rate_limit_sends
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.coalesce(func.sum(sends.c.count), 0)).where(
+                sends.c.sender_email == self.sender_email, sends.c.sent_at > self.clock() - DAY_SECONDS
+            )).scalar()
+
+
+def use_shared_state(engine):
+    """Guarda o estado dos limitadores no banco do engine.
+
+    Com vários processos (workers do gunicorn) o limite por minuto, o diário e
+    o AIMD valem para o remetente como um todo, e não para cada processo.
+    ``None`` volta ao estado em memória (ex.: Streamlit, processo único).
+    """
+    global _shared_engine
+    if engine is not None:
+        metadata.create_all(engine)
+    with _limiters_lock:
+        _shared_engine = engine
+        _limiters.clear()
+
+def get_rate_limiter(sender_email, limits=None):
+    """Retorna o limitador do remetente, configurado pelo provedor do domínio"""
+    key = sender_email.lower()
+    with _limiters_lock:
+        if key not in _limiters:
+            domain = key.split('@')[1]
+            config = (limits or PROVIDER_RATE_LIMITS).get(domain, DEFAULT_RATE_LIMIT)
+            per_minute, per_day = config.get('per_minute'), config.get('per_day')
+            if _shared_engine is not None and (per_minute or per_day):
+                _limiters[key] = SharedRateLimiter(_shared_engine, key, per_minute, per_day)
+            else:
+                _limiters[key] = ProviderRateLimiter(per_minute, per_day)
+        return _limiters[key]
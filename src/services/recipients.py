@@ -0,0 +1,82 @@
+import pandas as pd
+
+# Separadores aceitos entre vários e-mails na mesma célula
+EMAIL_SEPARATORS = r'[;,\s]+'
+
+# Sintaxe básica (após IDNA o endereço é ASCII): local@dominio.tld
+EMAIL_PATTERN = r"^[a-z0-9!#$%&'*+/=?^_`{|}~.-]+@(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z0-9-]{2,63}$"
+
+# Textos que o pandas/str() produzem para células vazias
+EMPTY_VALUES = {'', 'nan', 'none', 'null', 'nat'}
+
+# Quantos endereços inválidos devolver no resumo
+MAX_REPORTED_INVALID = 50
+
+
+def _idna_domain(domain):
+    try:
+        return domain.encode('idna').decode('ascii')
+    except UnicodeError:
+        return None
+
+def split_emails(series):
+    """Separa as células com vários endereços; cada endereço mantém o índice da linha"""
+    exploded = series.astype(object).where(series.notna(), '').astype(str).str.split(EMAIL_SEPARATORS).explode()
+    exploded = exploded.str.strip().str.strip('<>')
+    return exploded[~exploded.str.lower().isin(EMPTY_VALUES)]
+
+def normalize_emails(series):
+    """Minúsculas, domínio em IDNA e checagem de sintaxe; inválidos viram None"""
+    if series.empty:
+        return series.astype(object)
+    emails = series.str.lower()
+    parts = emails.str.rpartition('@')
+    local, domain = parts[0], parts[2]
+
+    # O IDNA é aplicado uma vez por domínio distinto, só aos que não são ASCII
+    non_ascii = ~domain.map(str.isascii)
+    if non_ascii.any():
+        encoded = {value: _idna_domain(value) for value in domain[non_ascii].unique()}
+        domain = domain.where(~non_ascii, domain.map(encoded))
+
+    emails = local + '@' + domain
+    valid = (local != '') & domain.notna() & emails.str.match(EMAIL_PATTERN, na=False)
+    return emails.where(valid, None)
+
+def clean_email_column(series):
+    """Versão para importação: endereços válidos e únicos de cada célula, separados por '; '"""
+    candidates = split_emails(series)
+    emails = normalize_emails(candidates).dropna().rename('email').rename_axis('row').reset_index()
+    emails = emails.drop_duplicates()
+    joined = emails.groupby('row')['email'].agg('; '.join)
+    return joined.reindex(series.index, fill_value='')
+
+def prepare_recipients(recipients):
+    """Normaliza e deduplica os destinatários antes do envio.
+
+    Células com vários endereços geram um destinatário por endereço; vazios,
+    inválidos e repetidos (mesmo e-mail normalizado) são removidos. Retorna
+    a lista limpa e um resumo do que foi descartado.
+    """
+    df = pd.DataFrame.from_records(recipients)
+    if 'email' not in df.columns:
+        df['email'] = None
+
+    candidates = split_emails(df['email'])
+    emails = normalize_emails(candidates)
+    invalid = candidates[emails.isna()]
+    emails = emails.dropna()
+    unique = emails[~emails.duplicated(keep='first')]
+
+    cleaned = df.loc[unique.index].assign(email=unique.values)
+    cleaned = cleaned.astype(object).where(cleaned.notna(), None)
+
+    report = {
+        'received': len(df),
+        'valid': len(unique),
+        'duplicates': int(len(emails) - len(unique)),
+        'invalid': int(len(invalid)),
+        'missing': int(len(df) - candidates.index.nunique()),
+        'invalid_emails': invalid.head(MAX_REPORTED_INVALID).tolist()
+    }
+    return cleaned.to_dict('records'), report
@@ -0,0 +1,47 @@
+import random
+
+from src.services.rate_limit import DailyLimitExceeded
+from src.services.smtp_errors import is_temporary_error
+
+# Tentativas por destinatário (a primeira conta) antes de desistir no job
+DEFAULT_MAX_ATTEMPTS = 4
+# Espera máxima antes da 2ª tentativa; dobra a cada nova tentativa até DEFAULT_MAX_DELAY
+DEFAULT_BASE_DELAY = 2.0
+DEFAULT_MAX_DELAY = 120.0
+
+# Reenvios imediatos, em outra sessão do pool, quando a conexão cai sem resposta do servidor
+RECONNECT_ATTEMPTS = 1
+
+
+class RetryPolicy:
+    """Backoff exponencial com jitter para falhas temporárias de envio"""
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, rng=random.random):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng
+
+    def should_retry(self, error, attempt):
+        """Indica se vale tentar de novo depois da tentativa ``attempt`` (a partir de 1)"""
+        if attempt >= self.max_attempts:
+            return False
+        if isinstance(error, DailyLimitExceeded):
+            # O orçamento só volta no dia seguinte; o job pode ser retomado depois
+            return False
+        return is_temporary_error(error)
+
+    def delay(self, attempt):
+        """Segundos até a próxima tentativa: metade fixa, metade aleatória"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return ceiling / 2 + self.rng() * ceiling / 2
+
+
+def create_retry_policy(config):
+    """RetryPolicy a partir das chaves SEND_MAX_ATTEMPTS / SEND_RETRY_* da configuração"""
+    return RetryPolicy(
+        max_attempts=config.get('SEND_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+        base_delay=config.get('SEND_RETRY_BASE_DELAY', DEFAULT_BASE_DELAY),
+        max_delay=config.get('SEND_RETRY_MAX_DELAY', DEFAULT_MAX_DELAY)
+    )
@@ -0,0 +1,123 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.dialects.sqlite import insert
+
+from src.models.parlamentar import db, DataVersion, Parlamentar
+from src.services.facets import FACET_FIELDS, FacetIndex, categorize
+from src.services.metrics import timed
+
+# Campos de cada parlamentar na resposta da API (mesma ordem de Parlamentar.to_dict)
+ROSTER_FIELDS = ('id', 'nome', 'nome_civil', 'partido', 'uf', 'cargo', 'email', 'telefone', 'gabinete', 'endereco')
+
+# Nome da versão em data_versions e intervalo mínimo (s) entre consultas a ela.
+# Com vários processos, cada um tem a sua lista; a versão no banco avisa que
+# outro processo importou uma planilha e a lista precisa ser recarregada.
+ROSTER_VERSION_NAME = 'parlamentares'
+ROSTER_CHECK_INTERVAL = 1.0
+
+_roster = None
+_checked_at = 0.0
+_roster_lock = threading.Lock()
+
+
+def _serialize(row):
+    return json.dumps(dict(zip(ROSTER_FIELDS, row)), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class Roster:
+    """Lista de parlamentares em memória, em colunas, com o JSON já serializado.
+
+    Cada linha guarda o seu trecho de JSON pronto (``rows``), na ordem dos ids;
+    qualquer subconjunto é servido só juntando bytes. A lista completa também
+    fica pronta em ``body`` e ``body_gzip``, com ``etag`` para respostas 304.
+    """
+
+    __slots__ = ('ids', 'nome_busca', 'rows', 'facets', 'body', 'body_gzip', 'etag', 'version')
+
+    def __init__(self, records, version=0):
+        self.version = version
+        df = pd.DataFrame(records, columns=ROSTER_FIELDS + ('nome_busca',))
+        self.ids = df['id'].to_numpy(dtype=np.int64)
+        self.nome_busca = df['nome_busca'].fillna('')
+        self.rows = [_serialize(record[:len(ROSTER_FIELDS)]) for record in records]
+        self.facets = FacetIndex.from_frame(categorize(df[['id', *FACET_FIELDS]].copy()), id_column='id')
+        self.body = self.json_array(range(len(self.rows)))
+        self.body_gzip = gzip.compress(self.body, compresslevel=6)
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def select(self, filters, term=None):
+        """Posições (na ordem dos ids) das linhas que atendem aos filtros.
+
+        ``term`` já deve estar normalizado (minúsculas, sem acentos), como ``nome_busca``.
+        """
+        positions = self.facets.positions(self.facets.mask(filters))
+        if term:
+            matches = self.nome_busca.iloc[positions].str.contains(term, regex=False).to_numpy()
+            positions = positions[matches]
+        return positions
+
+    def page(self, positions, after=None, limit=None):
+        """Recorte das posições para paginação por cursor (id); retorna (posições, próximo cursor)"""
+        if after is not None:
+            positions = positions[np.searchsorted(self.ids[positions], after, side='right'):]
+        if limit is None or len(positions) <= limit:
+            return positions, None
+        positions = positions[:limit]
+        return positions, int(self.ids[positions[-1]])
+
+    def json_array(self, positions):
+        """Array JSON com as linhas nas posições informadas"""
+        return b'[' + b','.join(self.rows[position] for position in positions) + b']'
+
+
+def roster_version():
+    """Versão atual dos parlamentares no banco"""
+    return db.session.query(DataVersion.version).filter_by(name=ROSTER_VERSION_NAME).scalar() or 0
+
+def bump_roster_version():
+    """Incrementa a versão na transação da importação (os outros processos recarregam a lista)"""
+    statement = insert(DataVersion).values(name=ROSTER_VERSION_NAME, version=1)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['name'], set_={'version': DataVersion.version + 1}
+    ))
+
+def refresh_roster(version=None):
+    """Recarrega a lista em memória a partir do banco (uma consulta, sem objetos do ORM)"""
+    global _roster, _checked_at
+    # A versão é lida antes dos dados: se mudar no meio, a próxima consulta recarrega de novo
+    if version is None:
+        version = roster_version()
+    with timed('roster_build'):
+        columns = [getattr(Parlamentar, field) for field in ROSTER_FIELDS] + [Parlamentar.nome_busca]
+        records = [tuple(row) for row in db.session.query(*columns).order_by(Parlamentar.id)]
+        roster = Roster(records, version)
+    with _roster_lock:
+        _roster = roster
+        _checked_at = time.monotonic()
+    return roster
+
+def get_roster():
+    """Lista atual (carregada na primeira consulta ou quando a versão no banco mudou)"""
+    global _checked_at
+    with _roster_lock:
+        roster = _roster
+        checked_at = _checked_at
+    now = time.monotonic()
+    if roster is not None and now - checked_at < ROSTER_CHECK_INTERVAL:
+        return roster
+
+    version = roster_version()
+    if roster is not None and roster.version == version:
+        with _roster_lock:
+            _checked_at = now
+        return roster
+    return refresh_roster(version)
@@ -0,0 +1,491 @@
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, update
+
+from src.models.parlamentar import db, SendJob, SendDelivery, EmailHistory
+from src.services.delivery import create_delivery_engine
+from src.services.history_stats import record_campaign, update_campaign
+from src.services.log import log_event, logger
+from src.services.metrics import SEND_JOBS_ACTIVE, SEND_QUEUE_DEPTH, timed
+from src.services.metrics_store import publish_metrics
+from src.services.retry import create_retry_policy
+from src.services.smtp_errors import is_temporary_error, smtp_error_code
+
+# Intervalo mínimo (em segundos) entre gravações do progresso no banco
+PROGRESS_FLUSH_INTERVAL = 1.0
+
+# Resultados acumulados antes de gravar o log de entregas, mesmo dentro do intervalo
+DELIVERY_LOG_BATCH_SIZE = 200
+
+# Situações de entrega que ainda precisam ser enviadas
+UNDELIVERED_STATUSES = ('pending', 'failed', 'deferred')
+FAILED_STATUSES = ('failed', 'deferred')
+DEFERRED_STATUSES = ('deferred',)
+
+# Jobs que podem ser retomados (os demais estão na fila ou em andamento)
+RESUMABLE_STATUSES = ('completed', 'failed', 'interrupted')
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Com vários processos, cada job pertence ao processo que o enfileirou, que renova
+# heartbeat_at a cada HEARTBEAT_INTERVAL segundos. Jobs sem sinal há mais de
+# JOB_STALE_AFTER segundos são de um processo que morreu e ficam 'interrupted'.
+HEARTBEAT_INTERVAL = 10.0
+JOB_STALE_AFTER = 30.0
+
+# Tempo máximo (s) que o desligamento espera os envios terminarem a transação atual
+SHUTDOWN_TIMEOUT = 30.0
+
+INTERRUPTED_BY_RESTART = 'Envio interrompido pela reinicialização do servidor'
+INTERRUPTED_BY_SHUTDOWN = 'Envio interrompido pelo desligamento do servidor'
+
+
+def worker_id():
+    """Identifica o processo atual (host:pid); calculado na hora porque o pid muda após o fork"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def owner_alive(owner):
+    """Se o processo dono do job ainda existe (só é possível saber no mesmo host)"""
+    host, _, pid = (owner or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SendQueue:
+    """Fila de envios processada por threads em segundo plano.
+
+    Cada processo (ex.: worker do gunicorn) tem a sua fila e as suas threads;
+    o estado dos jobs fica no banco, então qualquer processo responde sobre eles.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = queue.Queue()
+        self._workers = []
+        self._running = {}  # job_id -> Event que cancela o envio
+        self._stopping = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+        SEND_QUEUE_DEPTH.set_function(self._queue.qsize)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('SEND_WORKERS', 2)
+        app.config.setdefault('SEND_SHUTDOWN_TIMEOUT', SHUTDOWN_TIMEOUT)
+        app.extensions['send_queue'] = self
+        # As threads começam na primeira requisição, já no processo que vai atendê-las
+        app.before_request(self.start)
+
+    def start(self):
+        """Inicia as threads de envio e de sinal de vida neste processo"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Threads do processo pai não existem no processo filho criado por fork
+            self._pid = os.getpid()
+            self._workers = []
+            self._running = {}
+            self._stopping.clear()
+            for i in range(self.app.config['SEND_WORKERS']):
+                worker = threading.Thread(target=self._worker_loop, name=f'send-worker-{i}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            threading.Thread(target=self._heartbeat_loop, name='send-heartbeat', daemon=True).start()
+
+    def submit(self, job_id, sender_password, delivery_mode=None, statuses=('pending',)):
+        """Enfileira um job já persistido; a senha fica apenas em memória.
+
+        ``statuses`` define quais entregas do job serão (re)enviadas.
+        """
+        self.start()
+        self._queue.put((job_id, sender_password, delivery_mode, statuses))
+
+    def _worker_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            job_id, sender_password, delivery_mode, statuses = item
+            cancelled = threading.Event()
+            with self._lock:
+                if self._stopping.is_set():
+                    # Desligando: o job continua 'queued' no banco e o shutdown() o marca como interrompido
+                    self._queue.task_done()
+                    continue
+                self._running[job_id] = cancelled
+            SEND_JOBS_ACTIVE.inc()
+            try:
+                with self.app.app_context():
+                    try:
+                        run_send_job(job_id, sender_password, delivery_mode, statuses, cancel_event=cancelled)
+                    except Exception as e:
+                        logger.exception('send_job_error', extra={'fields': {'job_id': job_id}})
+                        release_failed_job(job_id, e)
+            except Exception:
+                logger.exception('send_job_release_error', extra={'fields': {'job_id': job_id}})
+            finally:
+                with self._lock:
+                    self._running.pop(job_id, None)
+                SEND_JOBS_ACTIVE.dec()
+                self._queue.task_done()
+
+    def _heartbeat_loop(self):
+        while not self._stopping.wait(HEARTBEAT_INTERVAL):
+            try:
+                with self.app.app_context():
+                    self.heartbeat()
+            except Exception:
+                logger.exception('send_heartbeat_error')
+
+    def heartbeat(self):
+        """Renova o sinal de vida dos jobs deste processo, recupera os de processos mortos e publica as métricas"""
+        owned = heartbeat_jobs()
+        with self._lock:
+            running = dict(self._running)
+        for job_id, cancelled in running.items():
+            if job_id not in owned and not cancelled.is_set():
+                # Outro processo considerou este morto e o job pode ter sido retomado:
+                # parar aqui evita mandar a mesma mensagem duas vezes
+                log_event('send_job_taken_over', logging.WARNING, job_id=job_id)
+                cancelled.set()
+        recover_interrupted_jobs()
+        publish_metrics(worker_id())
+
+    def shutdown(self, timeout=None):
+        """Desliga a fila deste processo sem perder nem repetir envios.
+
+        Nenhum job novo começa; os em andamento terminam a transação SMTP atual
+        e param, deixando as entregas restantes pendentes. Os jobs do processo
+        ficam 'interrupted' e podem ser retomados por qualquer outro.
+        """
+        with self._lock:
+            if self._pid != os.getpid() or self._stopping.is_set():
+                return
+            self._stopping.set()
+            running = list(self._running.values())
+            workers = list(self._workers)
+        if timeout is None:
+            timeout = self.app.config['SEND_SHUTDOWN_TIMEOUT']
+
+        for cancelled in running:
+            cancelled.set()
+        for _ in workers:
+            self._queue.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+
+        with self.app.app_context():
+            owned = SendJob.query.filter(SendJob.worker_id == worker_id(), SendJob.status.in_(ACTIVE_STATUSES))
+            interrupted = interrupt_jobs(owned.all(), INTERRUPTED_BY_SHUTDOWN)
+            # Os totais deste processo continuam somados no /metrics dos outros
+            publish_metrics(worker_id())
+        log_event(
+            'send_queue_shutdown', jobs_running=len(running), jobs_interrupted=interrupted,
+            workers_alive=sum(worker.is_alive() for worker in workers)
+        )
+
+
+def create_send_job(subject, message, sender_name, sender_email, recipients, batch_size=1):
+    """Persiste um novo job de envio com status 'queued' e uma entrega por destinatário"""
+    job = SendJob(
+        id=uuid.uuid4().hex,
+        subject=subject,
+        message=message,
+        sender_name=sender_name,
+        sender_email=sender_email,
+        batch_size=batch_size,
+        total=len(recipients),
+        worker_id=worker_id(),
+        heartbeat_at=datetime.utcnow()
+    )
+    db.session.add(job)
+    db.session.flush()
+    if recipients:
+        now = datetime.utcnow()
+        db.session.execute(SendDelivery.__table__.insert(), [
+            {
+                'job_id': job.id,
+                'position': position,
+                'email': recipient.get('email'),
+                'recipient': json.dumps(recipient, ensure_ascii=False),
+                'status': 'pending',
+                'attempts': 0,
+                'created_at': now,
+                'updated_at': now
+            }
+            for position, recipient in enumerate(recipients)
+        ])
+    db.session.commit()
+    return job
+
+def resume_send_job(job, sender_password, delivery_mode=None, statuses=UNDELIVERED_STATUSES):
+    """Reenfileira o job para os destinatários ainda não entregues.
+
+    Entregas já concluídas nunca são repetidas; ``statuses`` restringe quais
+    entregas voltam a ser enviadas (ex.: FAILED_STATUSES, DEFERRED_STATUSES).
+
+    A troca de situação é atômica: se duas requisições (talvez em processos
+    diferentes) tentarem retomar o mesmo job, só uma consegue; a outra recebe None.
+    """
+    claimed = db.session.execute(
+        update(SendJob)
+        .where(SendJob.id == job.id, SendJob.status.in_(RESUMABLE_STATUSES))
+        .values(status='queued', error=None, finished_at=None, worker_id=worker_id(), heartbeat_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return None
+    send_queue.submit(job.id, sender_password, delivery_mode, statuses)
+    return job
+
+def interrupt_jobs(jobs, error):
+    """Marca os jobs como interrompidos, com os contadores do log de entregas"""
+    for job in jobs:
+        job.status = 'interrupted'
+        job.error = error
+        refresh_job_counts(job)
+    db.session.commit()
+    return len(jobs)
+
+def release_failed_job(job_id, error):
+    """Libera um job que parou por erro inesperado (ex.: banco travado), deixando-o 'interrupted'.
+
+    Sem isso o job ficaria 'running', com o sinal de vida renovado por este
+    processo, e não poderia ser retomado.
+    """
+    db.session.rollback()
+    job = db.session.get(SendJob, job_id)
+    if job is None or job.status not in ACTIVE_STATUSES or job.worker_id != worker_id():
+        return False
+    job.status = 'interrupted'
+    job.error = f'Erro inesperado no envio: {error}'
+    job.finished_at = datetime.utcnow()
+    refresh_job_counts(job)
+    db.session.commit()
+    return True
+
+def heartbeat_jobs():
+    """Renova heartbeat_at dos jobs deste processo e retorna os ids deles"""
+    owned = (SendJob.worker_id == worker_id(), SendJob.status.in_(ACTIVE_STATUSES))
+    db.session.execute(update(SendJob).where(*owned).values(heartbeat_at=datetime.utcnow()))
+    db.session.commit()
+    return {job_id for (job_id,) in db.session.query(SendJob.id).filter(*owned)}
+
+def recover_interrupted_jobs(stale_after=JOB_STALE_AFTER):
+    """Marca como interrompidos os jobs na fila ou em andamento cujo processo parou.
+
+    A senha só existe em memória, então esses jobs não continuam sozinhos
+    depois que o processo que os enviava reinicia ou morre; podem ser
+    retomados pela API. O processo parou se não há sinal de vida recente ou
+    se, no mesmo host, o pid dono do job não existe mais.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    jobs = [
+        job for job in SendJob.query.filter(SendJob.status.in_(ACTIVE_STATUSES))
+        if job.heartbeat_at is None or job.heartbeat_at < cutoff or not owner_alive(job.worker_id)
+    ]
+    return interrupt_jobs(jobs, INTERRUPTED_BY_RESTART)
+
+def delivery_counts(job_id):
+    """Quantidade de entregas do job em cada situação"""
+    rows = db.session.query(SendDelivery.status, func.count()).filter(
+        SendDelivery.job_id == job_id
+    ).group_by(SendDelivery.status)
+    return dict(rows.all())
+
+def refresh_job_counts(job):
+    """Recalcula os contadores do job a partir do log de entregas"""
+    counts = delivery_counts(job.id)
+    job.sent = counts.get('sent', 0)
+    job.failed = counts.get('failed', 0) + counts.get('deferred', 0)
+    job.deferred = counts.get('deferred', 0)
+    return counts
+
+def run_send_job(job_id, sender_password, delivery_mode=None, statuses=('pending',), cancel_event=None):
+    """Envia as entregas do job nas situações pedidas, gravando cada resultado.
+
+    Se ``cancel_event`` for acionado, o envio para depois das transações em
+    andamento e o job fica 'interrupted' com as entregas restantes pendentes.
+    """
+    # Só o processo dono do job, e uma única vez, passa o job de 'queued' para 'running'
+    owner = worker_id()
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        update(SendJob)
+        .where(SendJob.id == job_id, SendJob.status == 'queued', SendJob.worker_id == owner)
+        .values(status='running', started_at=now, heartbeat_at=now)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return
+    job = db.session.get(SendJob, job_id)
+
+    deliveries = SendDelivery.query.filter(
+        SendDelivery.job_id == job.id, SendDelivery.status.in_(statuses)
+    ).order_by(SendDelivery.position).all()
+
+    # As entregas que serão reenviadas deixam de contar como falha
+    refresh_job_counts(job)
+    for delivery in deliveries:
+        if delivery.status in FAILED_STATUSES:
+            job.failed -= 1
+            if delivery.status == 'deferred':
+                job.deferred -= 1
+    db.session.commit()
+
+    config = current_app.config
+    engine = create_delivery_engine(
+        job.sender_email,
+        sender_password,
+        mode=delivery_mode or config.get('SEND_DELIVERY_MODE'),
+        pool_size=config.get('SMTP_POOL_SIZE'),
+        provider_limits=config.get('SMTP_PROVIDER_MAX_CONNECTIONS'),
+        rate_limits=config.get('SMTP_RATE_LIMITS'),
+        retry_policy=create_retry_policy(config),
+        cancel_event=cancel_event
+    )
+
+    try:
+        engine.warm_up()
+    except Exception as e:
+        engine.close()
+        job.status = 'failed'
+        job.failed = job.total - job.sent
+        job.error = f'Erro na autenticação do e-mail: {str(e)}'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        log_event('send_job_auth_failed', logging.ERROR, job_id=job.id, error=str(e))
+        return
+
+    # O motor devolve os mesmos dicts recebidos; a identidade liga o resultado à entrega
+    recipients = []
+    delivery_by_recipient = {}
+    for delivery in deliveries:
+        recipient = json.loads(delivery.recipient)
+        recipients.append(recipient)
+        delivery_by_recipient[id(recipient)] = delivery
+
+    results = []
+    retries = {}
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal last_flush
+        with timed('send_log_commit'):
+            if results:
+                db.session.execute(update(SendDelivery), results)
+                results.clear()
+            db.session.commit()
+        last_flush = time.monotonic()
+
+    def on_retry(recipient, error, attempt, delay):
+        log_event(
+            'send_retry_scheduled', logging.WARNING, job_id=job.id, email=recipient.get('email'),
+            attempt=attempt, delay_s=round(delay, 2), error=str(error)
+        )
+        retries[id(recipient)] = attempt
+
+    def on_result(recipient, error):
+        delivery = delivery_by_recipient[id(recipient)]
+        now = datetime.utcnow()
+        attempts = delivery.attempts + retries.get(id(recipient), 0) + 1
+        result = {'id': delivery.id, 'attempts': attempts, 'updated_at': now}
+        if error is None:
+            job.sent += 1
+            result.update(status='sent', smtp_code=None, smtp_response=None, delivered_at=now)
+        else:
+            log_event(
+                'send_failed', logging.WARNING, job_id=job.id, email=recipient.get('email'),
+                smtp_code=smtp_error_code(error), error=str(error)
+            )
+            job.failed += 1
+            temporary = is_temporary_error(error)
+            if temporary:
+                # Guardar para reenvio posterior
+                job.deferred += 1
+            result.update(
+                status='deferred' if temporary else 'failed',
+                smtp_code=smtp_error_code(error),
+                smtp_response=str(error)
+            )
+        results.append(result)
+
+        if len(results) >= DELIVERY_LOG_BATCH_SIZE or time.monotonic() - last_flush >= PROGRESS_FLUSH_INTERVAL:
+            flush()
+
+    try:
+        sent_count, failed_count = engine.send(
+            recipients, job.subject, job.message, job.sender_name, job.sender_email,
+            on_result=on_result, on_retry=on_retry, batch_size=job.batch_size or 1
+        )
+    finally:
+        engine.close()
+        flush()
+
+    if sent_count + failed_count < len(recipients):
+        # Cancelado no meio: quem não recebeu continua 'pending' e o histórico fica para quando terminar.
+        # Se outro processo já assumiu o job, a situação dele não é alterada.
+        if job.worker_id == owner and job.status in ('running', 'interrupted'):
+            job.status = 'interrupted'
+            job.error = INTERRUPTED_BY_SHUTDOWN
+            refresh_job_counts(job)
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+        log_event(
+            'send_job_interrupted', logging.WARNING, job_id=job.id, sent=sent_count, failed=failed_count,
+            pending=len(recipients) - sent_count - failed_count
+        )
+        return
+
+    # Salvar no histórico: um registro por job, com os totais do job inteiro
+    refresh_job_counts(job)
+    history = db.session.get(EmailHistory, job.history_id) if job.history_id else None
+    if history is None:
+        history = EmailHistory(
+            subject=job.subject,
+            message=job.message,
+            sender_name=job.sender_name,
+            sender_email=job.sender_email,
+            recipients_count=job.total,
+            sent=job.sent,
+            failed=job.failed
+        )
+        db.session.add(history)
+        record_campaign(history)
+        db.session.flush()
+        job.history_id = history.id
+    else:
+        # Retomada ou reenvio dos adiados: o envio já foi contado, só muda o resultado
+        update_campaign(history, job.sent, job.failed)
+    job.status = 'completed'
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+    log_event(
+        'send_job_finished', job_id=job.id, recipients=len(recipients), sent=sent_count, failed=failed_count,
+        deferred=job.deferred, elapsed_s=round((job.finished_at - job.started_at).total_seconds(), 3)
+    )
+
+
+send_queue = SendQueue()
@@ -0,0 +1,48 @@
+import smtplib
+
+
+class SendCancelled(Exception):
+    """O envio foi cancelado (ex.: desligamento do servidor) antes desta mensagem sair"""
+
+
+def smtp_error_code(error):
+    """Código SMTP do erro (smtplib ou cliente assíncrono), se houver"""
+    code = getattr(error, 'smtp_code', None)
+    if code is None and isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        code = next(iter(error.recipients.values()))[0]
+    return code
+
+def is_connection_error(error):
+    """Indica se o erro deixou a sessão SMTP inutilizável"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if smtp_error_code(error) == 421:
+        # 421: o servidor está encerrando a conexão
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+def is_temporary_error(error):
+    """Erros 4xx, quedas de conexão e limites do provedor podem ser reenviados depois"""
+    if getattr(error, 'temporary', False):
+        return True
+    code = smtp_error_code(error)
+    if code is not None:
+        return 400 <= code < 500
+    return is_connection_error(error)
+
+def is_dropped_connection(error):
+    """Conexão perdida sem resposta do servidor (ex.: sessão ociosa encerrada)"""
+    return is_connection_error(error) and smtp_error_code(error) is None
+
+def split_recipient_errors(addresses, refused=None, error=None):
+    """Erro de cada endereço de uma transação: o recusado no RCPT ou o erro da transação inteira"""
+    if error is not None:
+        if isinstance(error, smtplib.SMTPRecipientsRefused) and len(addresses) > 1:
+            refused = error.recipients
+        else:
+            return {address: error for address in addresses}
+    refused = refused or {}
+    return {
+        address: smtplib.SMTPRecipientsRefused({address: refused[address]}) if address in refused else None
+        for address in addresses
+    }
@@ -0,0 +1,211 @@
+import hashlib
+import os
+import stat
+import threading
+
+import pandas as pd
+
+from src.services.log import log_event
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Sem pyarrow o cache fica desligado (as planilhas são sempre lidas de novo)
+    pa = pq = None
+
+CACHE_DIR_ENV = 'MANDAEMAIL_CACHE_DIR'
+CACHE_MAX_MB_ENV = 'MANDAEMAIL_CACHE_MAX_MB'
+# Diretório do próprio aplicativo (ao lado do app.db), e não um nome previsível no /tmp compartilhado
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'cache')
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+CACHE_DIR_MODE = 0o700
+
+# Mudou o mapeamento das planilhas? Incremente para descartar o que já está no cache
+CACHE_VERSION = 1
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def content_hash(source):
+    """SHA-256 do conteúdo enviado (bytes, caminho ou arquivo binário aberto)"""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    elif hasattr(source, 'read'):
+        position = source.tell()
+        for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+        source.seek(position)
+    else:
+        with open(source, 'rb') as stream:
+            for block in iter(lambda: stream.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def private_directory(directory):
+    """Cria o diretório só para o usuário atual (0700) e recusa um que outro usuário controle"""
+    os.makedirs(directory, mode=CACHE_DIR_MODE, exist_ok=True)
+    info = os.stat(directory)
+    if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+        raise PermissionError(f'Diretório do cache pertence a outro usuário: {directory}')
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(directory, CACHE_DIR_MODE)
+
+
+class CacheEntryWriter:
+    """Grava uma entrada bloco a bloco num arquivo parcial; só vira entrada no ``commit()``"""
+
+    def __init__(self, cache, path):
+        self.cache = cache
+        self.path = path
+        self.partial = f'{path}.{os.getpid()}.{threading.get_ident()}.partial'
+        self.failed = not cache.enabled
+        self._writer = None
+
+    def write(self, df):
+        """Acrescenta um bloco (sem manter os anteriores em memória)"""
+        if self.failed or df is None or df.empty:
+            return
+        try:
+            schema = self._writer.schema if self._writer is not None else None
+            table = pa.Table.from_pandas(df.reset_index(drop=True), schema=schema, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.partial, table.schema)
+            self._writer.write_table(table)
+        except Exception as e:
+            # O cache é só um atalho: uma falha aqui não pode interromper a importação
+            log_event('spreadsheet_cache_write_failed', path=self.path, error=str(e))
+            self.discard()
+
+    def commit(self):
+        """Publica a entrada gravada e remove as antigas se o cache passar do limite"""
+        if self.failed or self._writer is None:
+            self.discard()
+            return False
+        try:
+            self._writer.close()
+            self._writer = None
+            os.replace(self.partial, self.path)
+        except Exception as e:
+            log_event('spreadsheet_cache_write_failed', path=self.path, error=str(e))
+            self.discard()
+            return False
+        self.cache.evict()
+        return True
+
+    def discard(self):
+        self.failed = True
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+            self._writer = None
+        self.cache._remove(self.partial)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # Sem commit (ex.: exceção ou planilha não reconhecida) nada fica no cache
+        if self._writer is not None:
+            self.discard()
+
+
+class SpreadsheetCache:
+    """Planilhas já lidas e mapeadas, guardadas em disco pelo hash do arquivo.
+
+    Cada entrada é um DataFrame em Parquet, gravado bloco a bloco. ``variant``
+    separa os resultados de cada consumidor (a API e o Streamlit mapeiam
+    colunas diferentes) sob o mesmo hash. Acima de ``max_bytes`` as entradas
+    usadas há mais tempo são removidas. Sem pyarrow, ou se o diretório não
+    puder ser usado com segurança, o cache fica desligado.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.enabled = pq is not None
+        if self.enabled:
+            try:
+                private_directory(directory)
+            except OSError as e:
+                log_event('spreadsheet_cache_disabled', path=directory, error=str(e))
+                self.enabled = False
+
+    def path(self, key, variant):
+        return os.path.join(self.directory, f'{key}-{variant}-v{CACHE_VERSION}.parquet')
+
+    def get(self, key, variant):
+        """DataFrame guardado para o hash, ou None"""
+        if not self.enabled:
+            return None
+        path = self.path(key, variant)
+        try:
+            df = pd.read_parquet(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Entrada corrompida (ex.: gravação interrompida): descarta e lê a planilha de novo
+            log_event('spreadsheet_cache_invalid', path=path, error=str(e))
+            self._remove(path)
+            return None
+        # O horário de modificação marca o último uso (LRU)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return df
+
+    def writer(self, key, variant):
+        """Gravação de uma entrada em blocos (use com ``with`` e chame ``commit()`` ao final)"""
+        return CacheEntryWriter(self, self.path(key, variant))
+
+    def put(self, key, variant, df):
+        """Guarda o DataFrame inteiro de uma vez"""
+        with self.writer(key, variant) as entry:
+            entry.write(df)
+            return entry.commit()
+
+    def evict(self):
+        """Remove as entradas usadas há mais tempo até caber em ``max_bytes``"""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.parquet'):
+                    try:
+                        info = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((info.st_mtime, info.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def get_spreadsheet_cache(directory=None, max_bytes=None):
+    """Cache compartilhado pela API e pelo Streamlit (mesmo diretório por padrão)"""
+    directory = directory or os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR
+    if max_bytes is None:
+        max_mb = os.environ.get(CACHE_MAX_MB_ENV)
+        max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_CACHE_MAX_BYTES
+    with _caches_lock:
+        if directory not in _caches:
+            _caches[directory] = SpreadsheetCache(directory, max_bytes)
+        _caches[directory].max_bytes = max_bytes
+        return _caches[directory]
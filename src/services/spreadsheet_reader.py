@@ -0,0 +1,78 @@
+import openpyxl
+import pandas as pd
+import xlrd
+
+# Linhas por bloco; a memória usada fica limitada a um bloco de cada vez
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def spreadsheet_extension(filename):
+    return filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+
+def _cell_text(value):
+    """Converte a célula em texto sem o '.0' de números inteiros"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _header(values):
+    columns = []
+    for position, value in enumerate(values):
+        name = _cell_text(value)
+        columns.append(name.strip() if name else f'Unnamed: {position}')
+    return columns
+
+def _frames_from_rows(columns, rows, chunksize):
+    batch = []
+    for row in rows:
+        batch.append([_cell_text(value) for value in row[:len(columns)]])
+        if len(batch) >= chunksize:
+            yield pd.DataFrame(batch, columns=columns, dtype=object)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=columns, dtype=object)
+
+def _iter_csv(source, chunksize):
+    yield from pd.read_csv(source, encoding='utf-8', dtype=str, chunksize=chunksize)
+
+def _iter_xlsx(source, chunksize):
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        yield from _frames_from_rows(_header(header), rows, chunksize)
+    finally:
+        workbook.close()
+
+def _iter_xls(source, chunksize):
+    # O formato .xls não permite ler uma aba parcialmente; on_demand evita
+    # carregar as outras abas do arquivo
+    if hasattr(source, 'read'):
+        book = xlrd.open_workbook(file_contents=source.read(), on_demand=True)
+    else:
+        book = xlrd.open_workbook(source, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        if sheet.nrows == 0:
+            return
+        rows = (sheet.row_values(index) for index in range(1, sheet.nrows))
+        yield from _frames_from_rows(_header(sheet.row_values(0)), rows, chunksize)
+    finally:
+        book.release_resources()
+
+def iter_spreadsheet_chunks(source, extension, chunksize=DEFAULT_CHUNK_SIZE):
+    """Lê a planilha em blocos de DataFrames com todas as células como texto.
+
+    ``source`` pode ser um caminho ou um arquivo aberto em modo binário.
+    """
+    if extension == 'csv':
+        return _iter_csv(source, chunksize)
+    if extension == 'xls':
+        return _iter_xls(source, chunksize)
+    if extension == 'xlsx':
+        return _iter_xlsx(source, chunksize)
+    raise ValueError(f'Formato de arquivo não suportado: {extension}')
@@ -0,0 +1,166 @@
+import base64
+import re
+from email.header import Header
+from email.utils import formataddr
+
+from src.services.metrics import timed
+
+# Campos sempre substituídos (vazios se o destinatário não tiver o dado)
+STANDARD_FIELDS = ('nome', 'partido', 'uf', 'cargo')
+
+# Saudação individual e a coletiva, usada quando vários destinatários dividem a mensagem
+GREETING = 'Prezado(a) {nome},'
+BATCH_GREETING = 'Prezados(as),'
+
+# Cabeçalho To das mensagens em lote: os destinatários vão só no envelope (Bcc)
+BATCH_TO_HEADER = b'To: undisclosed-recipients:;\r\n'
+
+PLACEHOLDER_PATTERN = re.compile(r'\{(\w+)\}')
+
+
+def _field_value(recipient, field):
+    value = recipient.get(field)
+    if value is None or value != value:  # None ou NaN
+        return ''
+    return str(value)
+
+
+class CompiledTemplate:
+    """Texto dividido uma única vez em trechos fixos e placeholders"""
+
+    def __init__(self, text=''):
+        self.segments = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            self.append_literal(text[position:match.start()])
+            self.segments.append((match.group(0), match.group(1)))
+            position = match.end()
+        self.append_literal(text[position:])
+
+    def append_literal(self, text):
+        """Acrescenta texto fixo, sem interpretar placeholders"""
+        if text:
+            self.segments.append((text, None))
+        return self
+
+    @property
+    def fields(self):
+        return {field for _, field in self.segments if field}
+
+    @property
+    def is_static(self):
+        return not self.fields
+
+    def _parts(self, recipient):
+        for literal, field in self.segments:
+            if field is not None and (field in STANDARD_FIELDS or field in recipient):
+                yield _field_value(recipient, field)
+            else:
+                # Trecho fixo ou placeholder sem coluna correspondente
+                yield literal
+
+    def render(self, recipient):
+        return ''.join(self._parts(recipient))
+
+    def render_bytes(self, recipient):
+        return self.render(recipient).encode('utf-8')
+
+
+def _encode_body(body):
+    return base64.encodebytes(body).replace(b'\n', b'\r\n')
+
+def _encode_subject(subject):
+    return b'Subject: ' + Header(subject, 'utf-8').encode(linesep='\r\n').encode('ascii') + b'\r\n'
+
+
+class EmailTemplate:
+    """E-mail pré-montado: cabeçalhos fixos são codificados uma única vez.
+
+    Por destinatário só são gerados o cabeçalho To, o assunto (quando tem
+    placeholders) e o corpo com os campos substituídos, em uma única passada
+    de base64. Com ``batch`` a saudação é coletiva, para que destinatários
+    com o mesmo texto possam dividir uma única mensagem.
+    """
+
+    def __init__(self, subject, message, sender_name, sender_email, batch=False):
+        self.sender_email = sender_email
+        self.batch = batch
+        greeting = BATCH_GREETING if batch else GREETING
+        self.subject = CompiledTemplate(subject)
+        self.body = CompiledTemplate(f'{greeting}\n\n{message}\n\nAtenciosamente,\n')
+        self.body.append_literal(f'{sender_name}\n{sender_email}\n')
+
+        self._headers = (
+            b'From: ' + formataddr((sender_name, sender_email), charset='utf-8').encode('ascii') + b'\r\n'
+        )
+        self._mime_headers = (
+            b'MIME-Version: 1.0\r\n'
+            b'Content-Type: text/plain; charset="utf-8"\r\n'
+            b'Content-Transfer-Encoding: base64\r\n'
+            b'\r\n'
+        )
+        self._static_subject = _encode_subject(subject) if self.subject.is_static else None
+
+    @property
+    def fields(self):
+        return self.subject.fields | self.body.fields
+
+    def render_text(self, recipient):
+        """Corpo em texto puro, usado nas prévias"""
+        return self.body.render(recipient)
+
+    def batch_key(self, recipient):
+        """Assunto e corpo renderizados: destinatários com a mesma chave recebem o mesmo texto"""
+        return self.subject.render(recipient), self.body.render(recipient)
+
+    def render(self, recipient, to_header=None):
+        """Mensagem completa em bytes (CRLF), pronta para sendmail/DATA"""
+        subject = self._static_subject or _encode_subject(self.subject.render(recipient))
+        body = _encode_body(self.body.render_bytes(recipient))
+        return b''.join((
+            self._headers,
+            to_header or b'To: ' + recipient['email'].encode('ascii') + b'\r\n',
+            subject,
+            self._mime_headers,
+            body,
+        ))
+
+
+def email_domain(address):
+    return address.rsplit('@', 1)[-1]
+
+def iter_messages(template, recipients, batch_size=1):
+    """Gera (destinatários, mensagem) para o envio; mensagem None se faltar e-mail.
+
+    Com ``batch_size`` > 1, destinatários do mesmo domínio e com o mesmo texto
+    renderizado são agrupados em mensagens de até ``batch_size`` endereços.
+    """
+    if batch_size <= 1:
+        for recipient in recipients:
+            if not recipient.get('email'):
+                yield [recipient], None
+                continue
+            with timed('message_render'):
+                data = template.render(recipient)
+            yield [recipient], data
+        return
+
+    groups = {}
+    for recipient in recipients:
+        if not recipient.get('email'):
+            yield [recipient], None
+            continue
+        with timed('message_render'):
+            key = (email_domain(recipient['email']),) + template.batch_key(recipient)
+        group = groups.setdefault(key, [])
+        group.append(recipient)
+        if len(group) == batch_size:
+            with timed('message_render'):
+                data = template.render(group[0], BATCH_TO_HEADER)
+            yield group, data
+            del groups[key]
+
+    for group in groups.values():
+        with timed('message_render'):
+            data = template.render(group[0], BATCH_TO_HEADER)
+        yield group, data
@@ -1,13 +1,20 @@
 import streamlit as st
 import pandas as pd
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import io
-import sqlite3
 from datetime import datetime
 import os
-import re
+import sys
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.database import get_engine
+from src.services.delivery import DeliveryEngine
+from src.services.facets import FACET_FIELDS, FacetIndex, categorize, facet_options
+from src.services.recipients import prepare_recipients
+from src.services.spreadsheet_cache import content_hash, get_spreadsheet_cache
+from src.services.spreadsheet_reader import iter_spreadsheet_chunks, spreadsheet_extension
+from src.services.templates import CompiledTemplate
 
 # Configuração da página
 st.set_page_config(
@@ -55,200 +62,237 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Funções auxiliares
-def get_smtp_config(email):
-    """Retorna configuração SMTP baseada no provedor de e-mail"""
-    domain = email.split("@")[1].lower()
+def normalize_spreadsheet_chunk(df):
+    """Normaliza e mapeia as colunas de um bloco da planilha"""
+    # Normalizar nomes das colunas
+    df.columns = df.columns.str.lower().str.strip()
     
-    smtp_configs = {
-        "gmail.com": {"server": "smtp.gmail.com", "port": 587},
-        "outlook.com": {"server": "smtp-mail.outlook.com", "port": 587},
-        "hotmail.com": {"server": "smtp-mail.outlook.com", "port": 587},
-        "live.com": {"server": "smtp-mail.outlook.com", "port": 587},
-        "yahoo.com": {"server": "smtp.mail.yahoo.com", "port": 587},
-        "yahoo.com.br": {"server": "smtp.mail.yahoo.com", "port": 587},
-        "uol.com.br": {"server": "smtps.uol.com.br", "port": 587},
-        "terra.com.br": {"server": "smtp.terra.com.br", "port": 587},
-        "ig.com.br": {"server": "smtp.ig.com.br", "port": 587},
+    # Mapear colunas comuns
+    column_mapping = {
+        "nome": ["nome", "nome_parlamentar", "nome completo", "nome parlamentar"],
+        "partido": ["partido", "sigla_partido", "siglapartido"],
+        "uf": ["uf", "estado", "sigla_uf"],
+        "email": ["email", "e-mail", "email_gabinete", "email_parlamentar", "email do parlamentar", "correio eletronico", "correio eletrônico"],
+        "cargo": ["cargo", "tipo", "titular/suplente/efetivado"]
     }
     
-    return smtp_configs.get(domain, {"server": "smtp.gmail.com", "port": 587})
-
-def process_spreadsheet(file):
-    """Processa planilha e retorna DataFrame"""
+    # Aplicar mapeamento
+    for target_col, possible_cols in column_mapping.items():
+        found = False
+        for col in possible_cols:
+            if col in df.columns:
+                df[target_col] = df[col]
+                found = True
+                break
+        if not found and target_col == "email": # Se email não for encontrado, adicione uma coluna vazia
+            df["email"] = None
+        elif not found and target_col == "cargo": # Se cargo não for encontrado, defina um padrão
+            df["cargo"] = "Parlamentar"
+    
+    # Remover colunas desnecessárias
+    unnecessary_cols = [
+        "endereço", "anexo", "endereço (continuação)", "gabinete", 
+        "endereço (complemento)", "fax", "mês aniversário", "dia aniversário", 
+        "tratamento", "nome civil"
+    ]
+    return df.drop(columns=[col for col in unnecessary_cols if col in df.columns])
+
+def process_spreadsheet(file, cache_key=None):
+    """Processa planilha em blocos e retorna DataFrame"""
     try:
-        if file.name.endswith(".csv"):
-            df = pd.read_csv(file)
-        elif file.name.endswith((".xls", ".xlsx")):
-            df = pd.read_excel(file)
-        else:
+        extension = spreadsheet_extension(file.name)
+        if extension not in ("csv", "xls", "xlsx"):
             st.error("Formato de arquivo não suportado. Use .csv, .xls ou .xlsx")
             return None
         
-        # Normalizar nomes das colunas
-        df.columns = df.columns.str.lower().str.strip()
+        # Planilha idêntica a uma já processada: carrega direto do cache, sem ler o arquivo
+        cache = get_spreadsheet_cache()
+        cache_key = cache_key or content_hash(file.getvalue())
+        cached = cache.get(cache_key, "streamlit")
+        if cached is not None:
+            return cached
         
-        # Mapear colunas comuns
-        column_mapping = {
-            "nome": ["nome", "nome_parlamentar", "nome completo", "nome parlamentar"],
-            "partido": ["partido", "sigla_partido", "siglapartido"],
-            "uf": ["uf", "estado", "sigla_uf"],
-            "email": ["email", "e-mail", "email_gabinete", "email_parlamentar", "email do parlamentar", "correio eletronico", "correio eletrônico"],
-            "cargo": ["cargo", "tipo", "titular/suplente/efetivado"]
-        }
-        
-        # Aplicar mapeamento
-        for target_col, possible_cols in column_mapping.items():
-            found = False
-            for col in possible_cols:
-                if col in df.columns:
-                    df[target_col] = df[col]
-                    found = True
-                    break
-            if not found and target_col == "email": # Se email não for encontrado, adicione uma coluna vazia
-                df["email"] = None
-            elif not found and target_col == "cargo": # Se cargo não for encontrado, defina um padrão
-                df["cargo"] = "Parlamentar"
-        
-        # Remover colunas desnecessárias
-        unnecessary_cols = [
-            "endereço", "anexo", "endereço (continuação)", "gabinete", 
-            "endereço (complemento)", "fax", "mês aniversário", "dia aniversário", 
-            "tratamento", "nome civil"
-        ]
-        df = df.drop(columns=[col for col in unnecessary_cols if col in df.columns])
-
-        # Verificar se tem as colunas essenciais
-        required_cols = ["nome", "partido", "uf"]
-        missing_cols = [col for col in required_cols if col not in df.columns]
+        # Cada bloco já chega reduzido às colunas usadas, limitando o pico de memória
+        chunks = []
+        for chunk in iter_spreadsheet_chunks(file, extension):
+            chunk = normalize_spreadsheet_chunk(chunk)
+            
+            # Verificar se tem as colunas essenciais
+            required_cols = ["nome", "partido", "uf"]
+            missing_cols = [col for col in required_cols if col not in chunk.columns]
+            
+            if missing_cols:
+                st.error(f"Colunas obrigatórias não encontradas: {missing_cols}")
+                return None
+            
+            # Limpar dados
+            chunk = chunk.dropna(subset=["nome"])
+            chunk["nome"] = chunk["nome"].str.strip()
+            chunk["partido"] = chunk["partido"].str.strip()
+            chunk["uf"] = chunk["uf"].str.strip()
+            chunks.append(chunk)
         
-        if missing_cols:
-            st.error(f"Colunas obrigatórias não encontradas: {missing_cols}")
+        if not chunks:
+            st.error("A planilha está vazia.")
             return None
         
-        # Limpar dados
-        df = df.dropna(subset=["nome"])
-        df["nome"] = df["nome"].str.strip()
-        df["partido"] = df["partido"].str.strip()
-        df["uf"] = df["uf"].str.strip()
-        
+        df = pd.concat(chunks, ignore_index=True)
+        cache.put(cache_key, "streamlit", df)
         return df
         
     except Exception as e:
         st.error(f"Erro ao processar arquivo: {str(e)}")
         return None
 
+EMAIL_PATTERN = r"[^@]+@[^@]+\.[^@]+"
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_spreadsheet(file_hash, _file):
+    """Planilha processada e com as colunas de e-mail, uma vez por conteúdo (hash)"""
+    df = process_spreadsheet(_file, file_hash)
+    if df is None:
+        return None
+    
+    # Validação de e-mail vetorizada, feita uma única vez por planilha
+    email = df["email"].fillna("").astype(str).str.strip()
+    df["email_valido"] = email.str.match(EMAIL_PATTERN)
+    # Exibe o e-mail se válido, caso contrário '❌'
+    df["email_exibicao"] = df["email"].where(df["email_valido"], "❌")
+    # Partido, UF e cargo como categorias: cada valor repetido é guardado uma vez
+    return categorize(df)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def facet_index(file_hash, _df):
+    """Bitmaps das linhas de cada partido, UF e cargo da planilha"""
+    return FacetIndex.from_frame(_df)
+
+@st.cache_data(show_spinner=False)
+def filter_options(file_hash, _df):
+    """Valores distintos de partido, UF e cargo para os filtros"""
+    index = facet_index(file_hash, _df)
+    return {field: facet_options(index, field, "Todos") for field in FACET_FIELDS}
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def filter_parlamentares(file_hash, _df, nome_filter, partido_filter, estado_filter, cargo_filter):
+    """Aplica os filtros; o resultado fica guardado por planilha e combinação de filtros"""
+    filters = {"partido": partido_filter, "uf": estado_filter, "cargo": cargo_filter}
+    filters = {field: value for field, value in filters.items() if value != "Todos"}
+    
+    # Partido, UF e cargo: interseção dos bitmaps; o nome só é buscado nas linhas restantes
+    filtered_df = _df.loc[facet_index(file_hash, _df).select_ids(filters)] if filters else _df
+    if nome_filter:
+        filtered_df = filtered_df[filtered_df["nome"].str.contains(nome_filter, case=False, na=False, regex=False)]
+    
+    return filtered_df
+
 # Define o caminho do banco de dados para ser gravável no Streamlit Cloud
 DB_PATH = os.path.join(os.getcwd(), "email_history.db")
 
 def init_database():
     """Inicializa banco de dados SQLite"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS email_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            subject TEXT NOT NULL,
-            message TEXT NOT NULL,
-            sender_name TEXT NOT NULL,
-            sender_email TEXT NOT NULL,
-            recipients_count INTEGER NOT NULL,
-            sent INTEGER NOT NULL,
-            failed INTEGER NOT NULL
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
+    with get_engine(DB_PATH).begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS email_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                subject TEXT NOT NULL,
+                message TEXT NOT NULL,
+                sender_name TEXT NOT NULL,
+                sender_email TEXT NOT NULL,
+                recipients_count INTEGER NOT NULL,
+                sent INTEGER NOT NULL,
+                failed INTEGER NOT NULL
+            )
+        """))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_email_history_date ON email_history (date)"))
 
 def save_email_history(subject, message, sender_name, sender_email, recipients_count, sent, failed):
     """Salva histórico de envio no banco"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        INSERT INTO email_history (subject, message, sender_name, sender_email, recipients_count, sent, failed)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (subject, message, sender_name, sender_email, recipients_count, sent, failed))
-    
-    conn.commit()
-    conn.close()
-
-def get_email_history():
-    """Recupera histórico de envios"""
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM email_history ORDER BY date DESC", conn)
-    conn.close()
-    return df
+    # Conexão do pool compartilhado; em WAL a gravação não bloqueia quem está lendo o histórico
+    with get_engine(DB_PATH).begin() as conn:
+        conn.execute(text("""
+            INSERT INTO email_history (subject, message, sender_name, sender_email, recipients_count, sent, failed)
+            VALUES (:subject, :message, :sender_name, :sender_email, :recipients_count, :sent, :failed)
+        """), {
+            "subject": subject,
+            "message": message,
+            "sender_name": sender_name,
+            "sender_email": sender_email,
+            "recipients_count": recipients_count,
+            "sent": sent,
+            "failed": failed,
+        })
+
+HISTORY_PAGE_SIZE = 100
+
+def get_email_history(limit=HISTORY_PAGE_SIZE, before=None):
+    """Recupera uma página do histórico (sem o texto das mensagens), do mais recente ao mais antigo.
+
+    ``before`` é o (date, id) do último envio da página anterior.
+    """
+    query = """
+        SELECT id, date, subject, sender_name, sender_email, recipients_count, sent, failed
+        FROM email_history
+    """
+    params = {"limit": limit}
+    if before is not None:
+        query += " WHERE date < :date OR (date = :date AND id < :id)"
+        params.update(date=before[0], id=before[1])
+    query += " ORDER BY date DESC, id DESC LIMIT :limit"
+    with get_engine(DB_PATH).connect() as conn:
+        return pd.read_sql_query(text(query), conn, params=params)
+
+def get_email_history_totals():
+    """Totais de todos os envios"""
+    with get_engine(DB_PATH).connect() as conn:
+        row = conn.execute(text(
+            "SELECT COUNT(*), COALESCE(SUM(sent), 0), COALESCE(SUM(failed), 0) FROM email_history"
+        )).one()
+    return {"campaigns": row[0], "sent": row[1], "failed": row[2]}
 
 def send_emails(recipients, subject, message, sender_name, sender_email, sender_password):
     """Envia e-mails para os destinatários selecionados"""
-    sent_count = 0
-    failed_count = 0
-    
-    # Configurar SMTP
-    smtp_config = get_smtp_config(sender_email)
+    # Normalizar e remover e-mails vazios, inválidos e repetidos antes de conectar
+    recipients, report = prepare_recipients(recipients)
+    if report["duplicates"] or report["invalid"]:
+        st.info(f"ℹ️ Removidos {report['duplicates']} e-mail(s) repetido(s) e {report['invalid']} inválido(s).")
+    if not recipients:
+        st.error("Nenhum destinatário com e-mail válido.")
+        return 0, 0
     
     try:
-        server = smtplib.SMTP(smtp_config["server"], smtp_config["port"])
-        server.starttls()
-        server.login(sender_email, sender_password)
-        
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        for i, recipient in enumerate(recipients):
-            try:
-                if pd.isna(recipient.get("email")) or not recipient.get("email"):
-                    failed_count += 1
-                    continue
-                
-                # Personalizar mensagem
-                personalized_message = message.replace("{nome}", recipient.get("nome", ""))
-                
-                # Criar e-mail
-                msg = MIMEMultipart()
-                msg["From"] = f"{sender_name} <{sender_email}>"
-                msg["To"] = recipient["email"]
-                msg["Subject"] = subject
-                
-                # Corpo do e-mail
-                body = f"""Prezado(a) {recipient.get("nome", "")},
-
-        {personalized_message}
-
-        Atenciosamente,
-        {sender_name}
-        {sender_email}
-        """
-                        
-                msg.attach(MIMEText(body, "plain", "utf-8"))
-                
-                # Enviar
-                server.send_message(msg)
-                sent_count += 1
-                
-                # Atualizar progresso
-                progress = (i + 1) / len(recipients)
-                progress_bar.progress(progress)
-                status_text.text(f"Enviando... {i + 1}/{len(recipients)}")
-                
-            except Exception as e:
-                failed_count += 1
-                st.warning(f"Erro ao enviar para {recipient.get("email", "")}: {str(e)}")
-        
-        server.quit()
-        
-        # Salvar no histórico
-        save_email_history(subject, message, sender_name, sender_email, 
-                          len(recipients), sent_count, failed_count)
-        
-        return sent_count, failed_count
-        
+        engine = DeliveryEngine(sender_email, sender_password)
+        engine.warm_up()
     except Exception as e:
         st.error(f"Erro na configuração do e-mail: {str(e)}")
         return 0, len(recipients)
+    
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    done = 0
+    
+    def on_result(recipient, error):
+        nonlocal done
+        done += 1
+        if error is not None:
+            st.warning(f"Erro ao enviar para {recipient.get('email', '')}: {str(error)}")
+        
+        # Atualizar progresso
+        progress_bar.progress(done / len(recipients))
+        status_text.text(f"Enviando... {done}/{len(recipients)}")
+    
+    try:
+        sent_count, failed_count = engine.send(
+            recipients, subject, message, sender_name, sender_email, on_result=on_result
+        )
+    finally:
+        engine.close()
+    
+    # Salvar no histórico
+    save_email_history(subject, message, sender_name, sender_email, 
+                      len(recipients), sent_count, failed_count)
+    
+    return sent_count, failed_count
 
 # Inicializar banco de dados
 init_database()
@@ -294,8 +338,10 @@ def enviar_emails_page():
     )
     
     if uploaded_file is not None:
+        # O hash do conteúdo identifica a planilha nos caches, evitando reprocessá-la a cada clique
+        file_hash = content_hash(uploaded_file.getvalue())
         with st.spinner("Processando planilha..."):
-            df = process_spreadsheet(uploaded_file)
+            df = load_spreadsheet(file_hash, uploaded_file)
         
         if df is not None:
             st.success(f"✅ Planilha processada com sucesso! {len(df)} parlamentares carregados.")
@@ -304,36 +350,22 @@ def enviar_emails_page():
             st.subheader("2. 🔍 Filtrar Parlamentares")
             
             col1, col2, col3, col4 = st.columns(4)
+            options = filter_options(file_hash, df)
             
             with col1:
                 nome_filter = st.text_input("Nome:", placeholder="Digite parte do nome")
             
             with col2:
-                partidos = ["Todos"] + sorted(df["partido"].dropna().unique().tolist())
-                partido_filter = st.selectbox("Partido:", partidos)
+                partido_filter = st.selectbox("Partido:", options["partido"])
             
             with col3:
-                estados = ["Todos"] + sorted(df["uf"].dropna().unique().tolist())
-                estado_filter = st.selectbox("Estado:", estados)
+                estado_filter = st.selectbox("Estado:", options["uf"])
             
             with col4:
-                cargos = ["Todos"] + sorted(df["cargo"].dropna().unique().tolist())
-                cargo_filter = st.selectbox("Cargo:", cargos)
+                cargo_filter = st.selectbox("Cargo:", options["cargo"])
             
             # Aplicar filtros
-            filtered_df = df.copy()
-            
-            if nome_filter:
-                filtered_df = filtered_df[filtered_df["nome"].str.contains(nome_filter, case=False, na=False)]
-            
-            if partido_filter != "Todos":
-                filtered_df = filtered_df[filtered_df["partido"] == partido_filter]
-            
-            if estado_filter != "Todos":
-                filtered_df = filtered_df[filtered_df["uf"] == estado_filter]
-            
-            if cargo_filter != "Todos":
-                filtered_df = filtered_df[filtered_df["cargo"] == cargo_filter]
+            filtered_df = filter_parlamentares(file_hash, df, nome_filter, partido_filter, estado_filter, cargo_filter)
             
             st.info(f"📋 {len(filtered_df)} parlamentares encontrados com os filtros aplicados")
             
@@ -341,14 +373,7 @@ def enviar_emails_page():
             st.subheader("3. ✅ Selecionar Destinatários")
             
             if len(filtered_df) > 0:
-                # Adiciona a coluna de disponibilidade de email para exibição
-                # Validação de e-mail mais robusta
-                # Verifica se a coluna 'email' existe e não está vazia antes de aplicar a regex
-                filtered_df["email_valido"] = filtered_df["email"].apply(lambda x: bool(re.match(r"[^@]+@[^@]+\.[^@]+", str(x))) if pd.notna(x) and str(x).strip() != "" else False)
-                
-                # Modificação aqui: exibir o email se válido, caso contrário '❌'
-                filtered_df["email_exibicao"] = filtered_df.apply(lambda row: row["email"] if row["email_valido"] else "❌", axis=1)
-
+                # As colunas email_valido e email_exibicao já vêm de load_spreadsheet
                 # Colunas a serem exibidas na tabela de seleção
                 display_cols = ["nome", "partido", "uf", "cargo", "email_exibicao"]
                 
@@ -440,7 +465,7 @@ def enviar_emails_page():
                         "Mensagem:",
                         height=200,
                         placeholder="Digite sua mensagem aqui. Use {nome} para incluir o nome do parlamentar automaticamente.",
-                        help="Use {nome} para personalizar a mensagem com o nome do parlamentar"
+                        help="Use {nome}, {partido}, {uf}, {cargo} ou o nome de qualquer coluna da planilha para personalizar a mensagem"
                     )
                     
                     # Prévia
@@ -448,7 +473,7 @@ def enviar_emails_page():
                         st.subheader("5. 👁️ Prévia do E-mail")
                         
                         sample_recipient = selected_df.iloc[0]
-                        preview_message = message.replace("{nome}", sample_recipient["nome"])
+                        preview_message = CompiledTemplate(message).render(sample_recipient.to_dict())
                         
                         st.markdown(f"""
                             <div class="feature-box">
@@ -498,11 +523,36 @@ def historico_page():
     st.header("📊 Histórico de Envios")
     st.write("Aqui você pode visualizar o histórico de todos os e-mails enviados.")
     
-    history_df = get_email_history()
-    if not history_df.empty:
-        st.dataframe(history_df)
-    else:
+    totals = get_email_history_totals()
+    if totals["campaigns"] == 0:
         st.info("Nenhum e-mail foi enviado ainda.")
+        return
+    
+    attempted = totals["sent"] + totals["failed"]
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Envios", totals["campaigns"])
+    col2.metric("E-mails enviados", totals["sent"])
+    col3.metric("Taxa de sucesso", f"{totals['sent'] / attempted:.1%}" if attempted else "-")
+    
+    # Páginas carregadas até agora; cada nova página começa após o último envio exibido
+    if "history_pages" not in st.session_state:
+        st.session_state.history_pages = 1
+    
+    pages = []
+    before = None
+    for _ in range(st.session_state.history_pages):
+        page = get_email_history(before=before)
+        pages.append(page)
+        if len(page) < HISTORY_PAGE_SIZE:
+            break
+        before = (page["date"].iloc[-1], int(page["id"].iloc[-1]))
+    
+    history_df = pd.concat(pages, ignore_index=True)
+    st.dataframe(history_df, hide_index=True)
+    
+    if len(history_df) < totals["campaigns"] and st.button("Carregar mais"):
+        st.session_state.history_pages += 1
+        st.rerun()
 
 def como_usar_page():
     st.header("📖 Como Usar")
@@ -514,7 +564,7 @@ def como_usar_page():
     1.  **Importar Dados:** Faça o upload de uma planilha (.csv, .xls, .xlsx) contendo os dados dos parlamentares. O aplicativo tentará identificar automaticamente as colunas de nome, partido, UF, cargo e e-mail.
     2.  **Filtrar:** Use os filtros de nome, partido, estado e cargo para encontrar os parlamentares desejados.
     3.  **Selecionar Destinatários:** Selecione os parlamentares para os quais deseja enviar o e-mail. Você pode usar a opção **"Selecionar Todos"** para selecionar todos os parlamentares filtrados ou selecionar individualmente.
-    4.  **Compor Mensagem:** Escreva o assunto e o corpo da mensagem. Use `{nome}` no corpo da mensagem para que o nome do parlamentar seja inserido automaticamente.
+    4.  **Compor Mensagem:** Escreva o assunto e o corpo da mensagem. Use `{nome}` no corpo da mensagem para que o nome do parlamentar seja inserido automaticamente. Também funcionam `{partido}`, `{uf}`, `{cargo}` e o nome de qualquer coluna da planilha.
     5.  **Prévia e Envio:** Visualize a prévia do e-mail e, quando estiver pronto, clique em **"Enviar E-mails"**.
 
     **Observações:**
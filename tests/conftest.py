@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from fake_smtp import FakeSMTPOptions, FakeSMTPServer  # noqa: E402
+
+
+class ScriptedSMTPServer(FakeSMTPServer):
+    """Servidor SMTP falso com respostas roteirizadas por endereço.
+
+    ``replies`` mapeia endereço -> códigos devolvidos no RCPT, um por tentativa
+    (depois deles, 250); ``drop_after`` lista as mensagens (1, 2, ...) depois
+    de cujo DATA a conexão cai sem resposta.
+    """
+
+    def __init__(self, pipelining=True, replies=None, drop_after=(), latency_ms=0.0):
+        super().__init__(FakeSMTPOptions(latency_ms=latency_ms, pipelining=pipelining))
+        self.replies = {address: list(codes) for address, codes in (replies or {}).items()}
+        self.drop_after = set(drop_after)
+        self.delivered = []
+        self.active = 0
+        self.max_active = 0
+        self._data_count = 0
+
+    def _rcpt_reply(self, address):
+        codes = self.replies.get(address)
+        if codes:
+            return f'{codes.pop(0)} resposta roteirizada\r\n'.encode('ascii')
+        return b'250 2.1.5 OK\r\n'
+
+    def _drop_connection(self):
+        self._data_count += 1
+        return self._data_count in self.drop_after
+
+    def _on_message(self, recipients):
+        self.delivered.extend(recipients)
+
+    async def handle(self, reader, writer):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await super().handle(reader, writer)
+        finally:
+            self.active -= 1
+
+
+class SMTPServerThread:
+    """Roda o servidor em um loop próprio, numa porta livre"""
+
+    def __init__(self, server):
+        self.server = server
+        self.loop = asyncio.new_event_loop()
+        self.port = None
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.server.handle, '127.0.0.1', 0), self.loop
+        )
+        self._listener = future.result(timeout=5)
+        self.port = self._listener.sockets[0].getsockname()[1]
+        return self
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self._listener.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    """Fábrica de servidores roteirizados; o aplicativo passa a usá-los como servidor SMTP"""
+    threads = []
+
+    def start(**options):
+        thread = SMTPServerThread(ScriptedSMTPServer(**options)).start()
+        threads.append(thread)
+        monkeypatch.setenv('MANDAEMAIL_SMTP_SERVER', f'127.0.0.1:{thread.port}')
+        monkeypatch.setenv('MANDAEMAIL_SMTP_STARTTLS', '0')
+        return thread
+
+    yield start
+    for thread in threads:
+        thread.stop()
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """Aplicativo Flask com banco temporário (a configuração é lida na importação de src.main)"""
+    directory = tmp_path_factory.mktemp('app')
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory / "app.db"}'
+    os.environ['MANDAEMAIL_CACHE_DIR'] = str(directory / 'cache')
+    from src.main import app
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """Contexto do aplicativo com as tabelas esvaziadas ao final de cada teste"""
+    from src.models.parlamentar import db
+
+    with app.app_context():
+        yield db
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.services.async_delivery import AsyncDeliveryEngine, AsyncSMTPConnection, AsyncSMTPError, to_smtp_data
+from src.services.retry import RetryPolicy
+
+SENDER = 'remetente@example.com'
+# Sem limite de taxa: os testes não esperam pelo token bucket
+NO_RATE_LIMIT = {'example.com': {}}
+
+
+def recipients(count):
+    return [{'nome': f'Parlamentar {i}', 'email': f'p{i}@camara.leg.br'} for i in range(count)]
+
+def make_engine(connections=1, max_attempts=3, cancel_event=None, provider_slots=None):
+    return AsyncDeliveryEngine(
+        SENDER, 'senha', connections=connections, rate_limits=NO_RATE_LIMIT,
+        retry_policy=RetryPolicy(max_attempts=max_attempts, base_delay=0.01, max_delay=0.01),
+        cancel_event=cancel_event, provider_slots=provider_slots
+    )
+
+def send(engine, to, **kwargs):
+    results = []
+    sent, failed = engine.send(
+        to, 'Assunto', 'Olá {nome}', 'Remetente', SENDER,
+        on_result=lambda recipient, error: results.append((recipient['email'], error)), **kwargs
+    )
+    return sent, failed, results
+
+async def transaction(port, addresses):
+    """Uma transação com o cliente assíncrono; retorna (recursados, escritas no socket, features)"""
+    connection = AsyncSMTPConnection('127.0.0.1', port)
+    await connection.connect('usuario', 'senha', use_tls=False)
+    writes = []
+    write = connection._writer.write
+    connection._writer.write = lambda data: (writes.append(data), write(data))[1]
+    try:
+        refused = await connection.send(SENDER, addresses, to_smtp_data(b'Subject: teste\r\n\r\ncorpo'))
+        return refused, list(writes), connection.features
+    finally:
+        await connection.quit()
+
+
+def test_to_smtp_data_dot_stuffing():
+    assert to_smtp_data(b'.inicio\r\nmeio\r\n.linha') == b'..inicio\r\nmeio\r\n..linha\r\n.\r\n'
+    assert to_smtp_data(b'texto\r\n') == b'texto\r\n.\r\n'
+
+
+@pytest.mark.parametrize('pipelining', [True, False])
+def test_send_with_and_without_pipelining(smtp_server, pipelining):
+    thread = smtp_server(pipelining=pipelining)
+    addresses = ['a@camara.leg.br', 'b@camara.leg.br']
+
+    refused, writes, features = asyncio.run(transaction(thread.port, addresses))
+
+    assert refused == {}
+    assert ('PIPELINING' in features) is pipelining
+    # Com PIPELINING, MAIL/RCPT/DATA vão numa única escrita; sem, uma por comando (mais o corpo)
+    assert len(writes) == (2 if pipelining else len(addresses) + 3)
+    assert thread.server.delivered == addresses
+
+
+def test_partial_rcpt_refusal_returns_refused(smtp_server):
+    thread = smtp_server(replies={'b@camara.leg.br': [550]})
+
+    refused, _, _ = asyncio.run(transaction(thread.port, ['a@camara.leg.br', 'b@camara.leg.br']))
+
+    assert list(refused) == ['b@camara.leg.br']
+    assert refused['b@camara.leg.br'][0] == 550
+    assert thread.server.delivered == ['a@camara.leg.br']
+
+
+def test_all_rcpt_refused_raises_and_keeps_session_usable(smtp_server):
+    thread = smtp_server(replies={'a@camara.leg.br': [550], 'b@camara.leg.br': [550]})
+
+    async def scenario():
+        connection = AsyncSMTPConnection('127.0.0.1', thread.port)
+        await connection.connect('usuario', 'senha', use_tls=False)
+        with pytest.raises(AsyncSMTPError) as error:
+            await connection.send(SENDER, ['a@camara.leg.br', 'b@camara.leg.br'], to_smtp_data(b'x'))
+        # Depois do RSET a mesma sessão envia a próxima transação
+        refused = await connection.send(SENDER, ['a@camara.leg.br'], to_smtp_data(b'x'))
+        await connection.quit()
+        return error.value, refused
+
+    error, refused = asyncio.run(scenario())
+    assert error.smtp_code == 550
+    assert refused == {}
+    assert thread.server.delivered == ['a@camara.leg.br']
+
+
+def test_engine_reports_permanent_failures(smtp_server):
+    smtp_server(replies={'p1@camara.leg.br': [550]})
+
+    sent, failed, results = send(make_engine(), recipients(3))
+
+    assert (sent, failed) == (2, 1)
+    errors = dict(results)
+    assert errors['p0@camara.leg.br'] is None
+    assert errors['p1@camara.leg.br'].smtp_code == 550
+
+
+def test_engine_retries_temporary_failure(smtp_server):
+    thread = smtp_server(replies={'p1@camara.leg.br': [451]})
+    retries = []
+
+    sent, failed, results = send(
+        make_engine(), recipients(3), on_retry=lambda recipient, error, attempt, delay: retries.append(
+            (recipient['email'], error.smtp_code, attempt)
+        )
+    )
+
+    assert (sent, failed) == (3, 0)
+    assert retries == [('p1@camara.leg.br', 451, 1)]
+    assert sorted(thread.server.delivered) == [f'p{i}@camara.leg.br' for i in range(3)]
+
+
+def test_engine_gives_up_after_max_attempts(smtp_server):
+    smtp_server(replies={'p0@camara.leg.br': [451, 451]})
+
+    sent, failed, results = send(make_engine(max_attempts=2), recipients(1))
+
+    assert (sent, failed) == (0, 1)
+    assert results[0][1].smtp_code == 451
+
+
+def test_engine_reconnects_after_dropped_connection(smtp_server):
+    thread = smtp_server(drop_after={2})
+
+    sent, failed, _ = send(make_engine(), recipients(5))
+
+    assert (sent, failed) == (5, 0)
+    assert thread.server.stats.disconnects == 1
+    assert thread.server.stats.connections == 2
+    assert sorted(thread.server.delivered) == sorted(recipient['email'] for recipient in recipients(5))
+
+
+def test_engine_cancel_stops_new_transactions(smtp_server):
+    thread = smtp_server(latency_ms=10)
+    cancelled = threading.Event()
+    engine = make_engine(cancel_event=cancelled)
+    results = []
+
+    def on_result(recipient, error):
+        results.append(recipient['email'])
+        engine.cancel()
+
+    sent, failed = engine.send(recipients(50), 'Assunto', 'Olá {nome}', 'Remetente', SENDER, on_result=on_result)
+
+    assert cancelled.is_set()
+    assert 1 <= sent < 50 and failed == 0
+    # Só recebeu quem foi informado ao chamador: nada é enviado sem resultado
+    assert sorted(thread.server.delivered) == sorted(results)
+
+
+def test_engine_respects_provider_connection_cap(smtp_server):
+    thread = smtp_server()
+    slots = threading.BoundedSemaphore(1)
+
+    sent, failed, _ = send(make_engine(connections=4, provider_slots=slots), recipients(10))
+
+    assert (sent, failed) == (10, 0)
+    assert thread.server.max_active == 1
+    # A vaga volta para o semáforo do provedor ao final
+    assert slots.acquire(blocking=False)
+    slots.release()
@@ -0,0 +1,82 @@
+import smtplib
+import socket
+import threading
+
+from src.services import delivery, mailer
+from src.services.delivery import DeliveryEngine
+from src.services.retry import RetryPolicy
+
+SENDER = 'remetente@example.com'
+# Sem limite de taxa: os testes não esperam pelo token bucket
+NO_RATE_LIMIT = {'example.com': {}}
+
+
+def recipients(count):
+    return [{'nome': f'Parlamentar {i}', 'email': f'p{i}@camara.leg.br'} for i in range(count)]
+
+def make_engine(pool_size=1):
+    return DeliveryEngine(
+        SENDER, 'senha', pool_size=pool_size, rate_limits=NO_RATE_LIMIT,
+        retry_policy=RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.01)
+    )
+
+
+def test_threads_engine_sends_everyone(smtp_server):
+    thread = smtp_server(replies={'p3@camara.leg.br': [451]})
+    engine = make_engine(pool_size=2)
+    try:
+        sent, failed = engine.send(recipients(20), 'Assunto', 'Olá {nome}', 'Remetente', SENDER)
+    finally:
+        engine.close()
+    assert (sent, failed) == (20, 0)
+    assert sorted(thread.server.delivered) == sorted(recipient['email'] for recipient in recipients(20))
+
+
+def test_threads_engine_renders_only_up_to_max_in_flight(smtp_server, monkeypatch):
+    smtp_server()
+    pulled = 0
+    iter_messages = delivery.iter_messages
+
+    def counting(*args):
+        nonlocal pulled
+        for message in iter_messages(*args):
+            pulled += 1
+            yield message
+
+    monkeypatch.setattr(delivery, 'iter_messages', counting)
+    engine = make_engine(pool_size=1)
+    done = 0
+    ahead = []
+
+    def on_result(recipient, error):
+        nonlocal done
+        ahead.append(pulled - done)
+        done += 1
+
+    try:
+        sent, _ = engine.send(recipients(100), 'Assunto', 'Olá {nome}', 'Remetente', SENDER, on_result=on_result)
+    finally:
+        engine.close()
+    assert sent == 100
+    assert max(ahead) <= engine.max_in_flight == delivery.IN_FLIGHT_PER_CONNECTION
+
+
+def test_smtp_login_gives_up_on_silent_server(monkeypatch):
+    # Aceita a conexão e nunca manda a saudação
+    listener = socket.create_server(('127.0.0.1', 0))
+    monkeypatch.setenv(mailer.SMTP_SERVER_ENV, f'127.0.0.1:{listener.getsockname()[1]}')
+    monkeypatch.setattr(mailer, 'SMTP_TIMEOUT', 0.2)
+    errors = []
+
+    def login():
+        try:
+            mailer.smtp_login(SENDER, 'senha')
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=login, daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    listener.close()
+    assert not thread.is_alive()
+    assert [type(error) for error in errors] == [smtplib.SMTPServerDisconnected]
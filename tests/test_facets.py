@@ -0,0 +1,68 @@
+import pandas as pd
+
+from src.services.facets import FacetIndex, categorize, facet_options
+
+
+def index():
+    df = pd.DataFrame({
+        'id': [3, 5, 8, 13, 21],
+        'partido': ['ABC', 'XYZ', 'ABC', 'ABC', ''],
+        'uf': ['SP', 'SP', 'RJ', 'SP', 'MG'],
+        'cargo': ['Deputado', 'Senador', 'Deputado', 'Deputado', 'Deputado'],
+    })
+    return FacetIndex.from_frame(categorize(df), id_column='id')
+
+def counts(result, field):
+    return {item['value']: item['count'] for item in result[field]}
+
+
+def test_blank_values_are_not_facets():
+    assert sorted(index().bitmaps['partido']) == ['ABC', 'XYZ']
+
+
+def test_filters_combine_with_and():
+    facets = index()
+    assert facets.select_ids({'partido': 'ABC', 'uf': 'SP'}) == [3, 13]
+    assert facets.count({'partido': 'ABC', 'uf': 'SP'}) == 2
+    assert facets.select_ids({'partido': 'ABC', 'uf': 'MG'}) == []
+
+
+def test_empty_and_unknown_filters():
+    facets = index()
+    assert facets.select_ids({'partido': '', 'desconhecido': 'x'}) == [3, 5, 8, 13, 21]
+    assert facets.count({'partido': 'NAO EXISTE'}) == 0
+
+
+def test_select_ids_pages_by_cursor():
+    facets = index()
+    assert facets.select_ids({'cargo': 'Deputado'}, limit=2) == [3, 8]
+    assert facets.select_ids({'cargo': 'Deputado'}, after=8, limit=2) == [13, 21]
+    assert facets.select_ids({'cargo': 'Deputado'}, after=21) == []
+
+
+def test_ids_bitmap_restricts_to_known_ids():
+    facets = index()
+    base = facets.ids_bitmap([5, 13, 99, 1])
+    assert facets.select_ids({}, base=base) == [5, 13]
+    assert facets.count({'uf': 'SP'}, base=base) == 2
+    assert facets.ids_bitmap([]) == 0
+
+
+def test_counts_ignore_own_filter():
+    result = index().counts({'partido': 'ABC', 'uf': 'SP'})
+    assert counts(result, 'partido') == {'ABC': 2, 'XYZ': 1}
+    assert counts(result, 'uf') == {'MG': 0, 'RJ': 1, 'SP': 2}
+    assert counts(result, 'cargo') == {'Deputado': 2, 'Senador': 0}
+
+
+def test_positions_beyond_one_word():
+    ids = list(range(1, 201))
+    df = pd.DataFrame({'id': ids, 'partido': ['ABC' if i % 67 == 0 else 'XYZ' for i in ids], 'uf': 'SP', 'cargo': 'X'})
+    facets = FacetIndex.from_frame(df, id_column='id')
+    assert facets.select_ids({'partido': 'ABC'}) == [67, 134]
+    assert facets.positions(0).tolist() == []
+
+
+def test_facet_options_lists_all_label_first():
+    assert facet_options(index(), 'uf', 'Todos') == ['Todos', 'MG', 'RJ', 'SP']
+    assert facet_options(index(), 'outro', 'Todos') == ['Todos']
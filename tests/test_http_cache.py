@@ -0,0 +1,75 @@
+import gzip
+
+import pandas as pd
+
+from src.models.parlamentar import EmailHistory
+from src.services.importer import PARLAMENTAR_COLUMNS, import_parlamentares
+
+
+def roster(count):
+    return pd.DataFrame([
+        {**{column: '' for column in PARLAMENTAR_COLUMNS}, 'nome': f'Deputado {i}', 'email': f'd{i}@x.br', 'uf': 'SP'}
+        for i in range(count)
+    ])
+
+
+def test_roster_is_gzipped_only_when_accepted(app, db):
+    import_parlamentares(roster(50))
+    client = app.test_client()
+
+    plain = client.get('/api/parlamentares')
+    assert 'Content-Encoding' not in plain.headers
+    assert len(plain.get_json()) == 50
+
+    compressed = client.get('/api/parlamentares', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+
+    # Só brotli não é atendido: a resposta vai sem compressão
+    assert 'Content-Encoding' not in client.get('/api/parlamentares', headers={'Accept-Encoding': 'br'}).headers
+
+
+def test_after_request_compresses_large_responses_only(app, db):
+    import_parlamentares(roster(50))
+    client = app.test_client()
+    headers = {'Accept-Encoding': 'gzip'}
+
+    page = client.get('/api/parlamentares?limit=20', headers=headers)
+    assert page.headers['Content-Encoding'] == 'gzip'
+    assert page.headers['ETag'].startswith('W/')
+    assert len(gzip.decompress(page.get_data())) > len(page.get_data())
+
+    # Abaixo de MIN_COMPRESS_SIZE o gzip não compensa
+    small = client.get('/api/parlamentares/ids?nome=deputado 1', headers=headers)
+    assert 'Content-Encoding' not in small.headers
+
+
+def test_if_none_match_returns_304_until_data_changes(app, db):
+    import_parlamentares(roster(3))
+    client = app.test_client()
+
+    for url in ('/api/parlamentares', '/api/parlamentares?limit=2', '/api/email-history?limit=10', '/api/email-history/stats'):
+        first = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert first.status_code == 200
+        # O ETag vale com e sem gzip
+        repeat = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+        assert repeat.status_code == 304, url
+        assert repeat.get_data() == b''
+
+    etag = client.get('/api/email-history?limit=10').headers['ETag']
+    db.session.add(EmailHistory(subject='A', message='B', sender_name='C', sender_email='c@x.br', recipients_count=1, sent=1, failed=0))
+    db.session.commit()
+    assert client.get('/api/email-history?limit=10', headers={'If-None-Match': etag}).status_code == 200
+
+    etag = client.get('/api/parlamentares').headers['ETag']
+    import_parlamentares(roster(4))
+    assert client.get('/api/parlamentares', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_index_is_revalidated(app):
+    client = app.test_client()
+    first = client.get('/')
+    assert first.status_code == 200
+    assert 'no-cache' in first.headers['Cache-Control']
+    assert client.get('/', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
@@ -0,0 +1,86 @@
+import pandas as pd
+
+from src.models.parlamentar import Parlamentar
+from src.services.importer import PARLAMENTAR_COLUMNS, import_chunks, import_parlamentares, with_identity
+
+
+def frame(*rows):
+    """Parlamentares mapeados; cada linha informa só as colunas que importam ao teste"""
+    return pd.DataFrame([{column: row.get(column, '') for column in PARLAMENTAR_COLUMNS} for row in rows])
+
+def deputado(nome, email='', uf='SP', telefone='1111'):
+    return {'nome': nome, 'email': email, 'uf': uf, 'telefone': telefone, 'partido': 'ABC', 'cargo': 'Deputado'}
+
+def stored():
+    return {p.nome: p for p in Parlamentar.query.order_by(Parlamentar.id)}
+
+
+def test_identity_prefers_email_and_falls_back_to_name_and_uf():
+    df = with_identity(frame(
+        deputado('Ana', email='Ana@Camara.leg.br'),
+        deputado('José Antônio', uf='mg'),
+    ))
+    assert df['identity_key'].tolist() == ['ana@camara.leg.br', 'jose antonio|MG']
+
+
+def test_repeated_identity_keeps_first_row():
+    df = with_identity(frame(deputado('Ana', email='ana@x.br', telefone='1'), deputado('Ana B', email='ANA@x.br')))
+    assert df['nome'].tolist() == ['Ana']
+
+
+def test_reimport_without_changes_touches_nothing(db):
+    sheet = frame(deputado('Ana', email='ana@x.br'), deputado('Bruno', email='bruno@x.br'))
+    assert import_parlamentares(sheet) == {'inserted': 2, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    ids = {nome: p.id for nome, p in stored().items()}
+
+    assert import_parlamentares(sheet) == {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 2}
+    assert {nome: p.id for nome, p in stored().items()} == ids
+
+
+def test_incremental_import_diffs_by_identity(db):
+    import_parlamentares(frame(
+        deputado('Ana', email='ana@x.br'), deputado('Bruno', email='bruno@x.br'), deputado('Carla', uf='RJ')
+    ))
+    ids = {nome: p.id for nome, p in stored().items()}
+
+    diff = import_parlamentares(frame(
+        deputado('Ana', email='ANA@x.br', telefone='2222'),  # mesma identidade, telefone novo
+        deputado('Carla', uf='RJ'),                          # sem e-mail: identidade por nome + UF
+        deputado('Daniel', email='daniel@x.br'),
+    ))
+
+    assert diff == {'inserted': 1, 'updated': 1, 'deleted': 1, 'unchanged': 1}
+    rows = stored()
+    assert set(rows) == {'Ana', 'Carla', 'Daniel'}
+    # Atualizações preservam o id, então seleções e links continuam válidos
+    assert rows['Ana'].id == ids['Ana'] and rows['Ana'].telefone == '2222'
+    assert rows['Carla'].id == ids['Carla']
+
+
+def test_replace_mode_reloads_everything(db):
+    import_parlamentares(frame(deputado('Ana', email='ana@x.br')))
+
+    diff = import_parlamentares(frame(deputado('Bruno', email='bruno@x.br')), mode='replace')
+
+    assert diff['inserted'] == 1
+    assert set(stored()) == {'Bruno'}
+
+
+def test_import_chunks_spans_blocks_in_one_transaction(db):
+    raw = pd.DataFrame({
+        'Nome Parlamentar': ['Ana', 'Bruno', 'Ana'],
+        'Correio Eletrônico': ['ana@x.br', 'bruno@x.br', 'ana@x.br'],
+        'UF': ['SP', 'RJ', 'SP'],
+    })
+    chunks = [raw.iloc[:2], raw.iloc[2:]]
+
+    diff = import_chunks(iter(chunks))
+
+    # A repetição no segundo bloco não é inserida de novo
+    assert diff['inserted'] == 2
+    assert Parlamentar.query.count() == 2
+
+
+def test_import_chunks_unknown_format_returns_none(db):
+    assert import_chunks(iter([pd.DataFrame({'coluna': ['x']})])) is None
+    assert Parlamentar.query.count() == 0
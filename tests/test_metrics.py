@@ -0,0 +1,57 @@
+import json
+from datetime import datetime, timedelta
+
+from src.models.parlamentar import MetricSnapshot
+from src.services.metrics import SEND_JOBS_ACTIVE, Counter, Gauge, Histogram, Registry
+from src.services.metrics_store import publish_metrics, render_metrics
+
+
+def registry():
+    metrics = Registry()
+    counter = Counter('teste_total', 'Contador', ['result'], registry=metrics)
+    gauge = Gauge('teste_ativos', 'Gauge', registry=metrics)
+    histogram = Histogram('teste_seconds', 'Histograma', registry=metrics, buckets=(1.0, 2.0))
+    return metrics, counter, gauge, histogram
+
+def sample(text, name):
+    return next(line for line in text.splitlines() if line.startswith(name + ' '))
+
+
+def test_render_sums_other_processes():
+    metrics, counter, gauge, histogram = registry()
+    counter.inc(2, result='sent')
+    gauge.set(1)
+    histogram.observe(0.5)
+    # A publicação passa por JSON, como no banco
+    other = json.loads(json.dumps(metrics.snapshot()))
+
+    text = metrics.render([(other, True), (other, False)])
+    assert sample(text, 'teste_total{result="sent"}') == 'teste_total{result="sent"} 6'
+    assert sample(text, 'teste_seconds_bucket{le="1.0"}') == 'teste_seconds_bucket{le="1.0"} 3'
+    assert sample(text, 'teste_seconds_sum') == 'teste_seconds_sum 1.5'
+    # Gauge de processo morto não conta
+    assert sample(text, 'teste_ativos') == 'teste_ativos 2'
+
+
+def test_metrics_endpoint_includes_other_workers(app, db):
+    publish_metrics('este-host:1')
+    assert set(json.loads(db.session.get(MetricSnapshot, 'este-host:1').data)) >= {
+        'mandaemail_messages_total', 'mandaemail_send_jobs_active'
+    }
+
+    data = {
+        'mandaemail_messages_total': [[['smtp.teste', 'sent'], 5]],
+        'mandaemail_send_jobs_active': [[[], 2]],
+    }
+    now = datetime.utcnow()
+    db.session.add(MetricSnapshot(worker_id='outro-host:2', data=json.dumps(data), updated_at=now))
+    db.session.add(MetricSnapshot(worker_id='outro-host:3', data=json.dumps(data), updated_at=now - timedelta(minutes=5)))
+    db.session.commit()
+
+    text = render_metrics('este-host:1')
+    assert sample(text, 'mandaemail_messages_total{provider="smtp.teste",result="sent"}').endswith(' 10')
+    assert float(sample(text, 'mandaemail_send_jobs_active').split()[1]) == SEND_JOBS_ACTIVE.value() + 2
+
+    response = app.test_client().get('/metrics')
+    assert response.status_code == 200
+    assert 'provider="smtp.teste"' in response.get_data(as_text=True)
@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from src.services.importer import PARLAMENTAR_COLUMNS, import_parlamentares
+
+
+def frame(*rows):
+    return pd.DataFrame([{column: row.get(column, '') for column in PARLAMENTAR_COLUMNS} for row in rows])
+
+def deputado(nome, email, uf='SP', partido='ABC', **fields):
+    return {'nome': nome, 'email': email, 'uf': uf, 'partido': partido, 'cargo': 'Deputado', **fields}
+
+def ids_by_name(db):
+    from src.models.parlamentar import Parlamentar
+    return {p.nome: p.id for p in Parlamentar.query}
+
+
+def search(client, q):
+    response = client.get('/api/parlamentares/search', query_string={'q': q})
+    assert response.status_code == 200
+    return [p['nome'] for p in response.get_json()]
+
+@pytest.fixture
+def client(app):
+    if not app.config.get('SEARCH_INDEX_ENABLED'):
+        pytest.skip('SQLite sem FTS5')
+    return app.test_client()
+
+
+def test_search_ignores_accents_and_matches_prefixes(client, db):
+    import_parlamentares(frame(
+        deputado('Acácio Favacho', 'acacio@x.br', uf='AP'),
+        deputado('Ana Paula', 'ana@x.br', gabinete='Anexo IV'),
+        deputado('Caçador', 'cacador@x.br'),
+    ))
+    assert search(client, 'acacio') == ['Acácio Favacho']
+    assert search(client, 'ACÁC') == ['Acácio Favacho']
+    assert search(client, 'ana anexo') == ['Ana Paula']
+    # O nome pesa mais que os outros campos
+    assert search(client, 'ca')[0] == 'Caçador'
+    assert client.get('/api/parlamentares/search?q=').status_code == 400
+
+
+def test_incremental_reimport_keeps_search_index_in_sync(client, db):
+    import_parlamentares(frame(
+        deputado('Acácio Favacho', 'acacio@x.br'), deputado('Bruno', 'bruno@x.br'), deputado('Carla', 'carla@x.br')
+    ))
+    import_parlamentares(frame(
+        deputado('Acácio Favacho', 'acacio@x.br', partido='XYZ'),   # atualizado
+        deputado('Carla Zambelli', 'carla@x.br'),                   # nome novo, mesmo e-mail
+        deputado('Daniel', 'daniel@x.br'),                          # inserido; Bruno sai
+    ))
+    assert search(client, 'xyz') == ['Acácio Favacho']
+    assert sorted(search(client, 'abc')) == ['Carla Zambelli', 'Daniel']
+    assert search(client, 'bruno') == []
+    assert search(client, 'zambelli') == ['Carla Zambelli']
+    assert db.session.execute(text('SELECT count(*) FROM parlamentares_fts')).scalar() == 3
+    # Confere o índice contra a tabela de conteúdo (levanta erro se divergirem)
+    db.session.execute(text("INSERT INTO parlamentares_fts(parlamentares_fts) VALUES ('integrity-check')"))
+
+
+def test_ids_lists_every_match_without_paging(app, db):
+    import_parlamentares(frame(*[deputado(f'Deputado {i:03}', f'd{i}@x.br', uf='SP' if i % 2 else 'RJ') for i in range(250)]))
+    ids = ids_by_name(db)
+    client = app.test_client()
+
+    response = client.get('/api/parlamentares/ids?uf=SP')
+    assert response.status_code == 200
+    assert response.get_json()['ids'] == sorted(ids[f'Deputado {i:03}'] for i in range(1, 250, 2))
+
+    # Mesmos filtros da listagem, inclusive o trecho do nome
+    url = '/api/parlamentares/ids?uf=RJ&nome=deputado 01'
+    response = client.get(url)
+    assert response.get_json()['ids'] == sorted(ids[f'Deputado {i:03}'] for i in range(10, 20, 2))
+    assert client.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
@@ -0,0 +1,103 @@
+import pytest
+
+from src.services import rate_limit
+from src.services.database import get_engine
+from src.services.rate_limit import (
+    DAY_SECONDS, DailyLimitExceeded, ProviderRateLimiter, SharedRateLimiter, get_rate_limiter, use_shared_state
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = get_engine(tmp_path / 'limits.db')
+    rate_limit.metadata.create_all(engine)
+    return engine
+
+
+def test_token_bucket_allows_burst_then_spaces_sends(clock):
+    limiter = ProviderRateLimiter(per_minute=60, clock=clock)
+    assert [limiter.reserve() for _ in range(10)] == [0.0] * 10
+    assert limiter.reserve() == pytest.approx(1.0)
+    clock.now += 5
+    assert limiter.reserve() == 0.0
+
+
+def test_aimd_halves_rate_and_recovers(clock):
+    limiter = ProviderRateLimiter(per_minute=60, clock=clock)
+    limiter.on_temporary_error('451 tente mais tarde')
+    assert limiter.rate == pytest.approx(0.5)
+    assert (limiter.temporary_errors, limiter.last_error) == (1, '451 tente mais tarde')
+    for _ in range(10):
+        limiter.on_temporary_error()
+    assert limiter.rate == pytest.approx(1.0 * rate_limit.MIN_RATE_FRACTION)
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.rate == pytest.approx(1.0)
+
+
+def test_daily_limit_uses_rolling_window(clock):
+    limiter = ProviderRateLimiter(per_day=3, clock=clock)
+    limiter.reserve(2)
+    limiter.reserve()
+    with pytest.raises(DailyLimitExceeded):
+        limiter.reserve()
+    clock.now += DAY_SECONDS
+    assert limiter.reserve(3) == 0.0
+    assert limiter.sent_today == 3
+
+
+def test_shared_limiters_count_sends_of_every_process(engine, clock):
+    # Duas instâncias no mesmo banco fazem o papel de dois workers do gunicorn
+    first = SharedRateLimiter(engine, 'a@gmail.com', per_day=3, clock=clock)
+    second = SharedRateLimiter(engine, 'a@gmail.com', per_day=3, clock=clock)
+    other_sender = SharedRateLimiter(engine, 'b@gmail.com', per_day=3, clock=clock)
+    first.reserve(2)
+    second.reserve()
+    with pytest.raises(DailyLimitExceeded):
+        first.reserve()
+    assert other_sender.reserve(3) == 0.0
+    assert second.sent_today == 3
+    clock.now += DAY_SECONDS
+    assert first.reserve() == 0.0
+
+
+def test_shared_token_bucket_and_aimd(engine, clock):
+    first = SharedRateLimiter(engine, 'a@gmail.com', per_minute=60, clock=clock)
+    second = SharedRateLimiter(engine, 'a@gmail.com', per_minute=60, clock=clock)
+    for _ in range(5):
+        assert first.reserve() == 0.0
+        assert second.reserve() == 0.0
+    # A rajada de 10 foi gasta pelos dois juntos
+    assert first.reserve() == pytest.approx(1.0)
+
+    clock.now += 11
+    second.on_temporary_error('421 muitas conexões')
+    assert first.reserve() == 0.0
+    with engine.connect() as conn:
+        rate = conn.execute(rate_limit.rate_limit_buckets.select()).one().rate
+    assert rate == pytest.approx(0.5)
+
+
+def test_get_rate_limiter_uses_shared_state_only_with_limits(engine):
+    previous = rate_limit._shared_engine
+    use_shared_state(engine)
+    try:
+        limited = get_rate_limiter('x@gmail.com')
+        unlimited = get_rate_limiter('x@example.com', {'example.com': {}})
+        assert isinstance(limited, SharedRateLimiter)
+        assert type(unlimited) is ProviderRateLimiter
+        assert get_rate_limiter('X@gmail.com') is limited
+    finally:
+        use_shared_state(previous)
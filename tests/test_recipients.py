@@ -0,0 +1,57 @@
+import pandas as pd
+
+from src.services.recipients import MAX_REPORTED_INVALID, clean_email_column, prepare_recipients
+
+
+def test_cells_split_on_semicolon_comma_and_space():
+    recipients, report = prepare_recipients([
+        {'nome': 'Ana', 'email': 'ana@x.br; ana2@x.br,ana3@x.br  <ana4@x.br>'},
+        {'nome': 'Bruno', 'email': 'Bruno@X.BR'},
+    ])
+    assert [(r['nome'], r['email']) for r in recipients] == [
+        ('Ana', 'ana@x.br'), ('Ana', 'ana2@x.br'), ('Ana', 'ana3@x.br'), ('Ana', 'ana4@x.br'), ('Bruno', 'bruno@x.br')
+    ]
+    assert report['valid'] == 5
+
+
+def test_non_ascii_domains_become_idna():
+    recipients, report = prepare_recipients([{'nome': 'Ana', 'email': 'ana@câmara.leg.br'}])
+    assert recipients[0]['email'] == 'ana@xn--cmara-3qa.leg.br'
+    assert report['invalid'] == 0
+
+
+def test_report_counts_missing_invalid_and_duplicates():
+    recipients, report = prepare_recipients([
+        {'nome': 'Ana', 'email': 'ana@x.br'},
+        {'nome': 'Ana de novo', 'email': 'ANA@x.br'},
+        {'nome': 'Sem e-mail', 'email': 'nan'},
+        {'nome': 'Vazio', 'email': None},
+        {'nome': 'Inválido', 'email': 'nao-e-email; b@x'},
+        {'nome': 'Carla', 'email': 'carla@x.br', 'partido': float('nan')},
+    ])
+    assert [r['nome'] for r in recipients] == ['Ana', 'Carla']
+    # Células vazias do pandas viram None, não NaN
+    assert recipients[1]['partido'] is None
+    assert report == {
+        'received': 6, 'valid': 2, 'duplicates': 1, 'invalid': 2, 'missing': 2,
+        'invalid_emails': ['nao-e-email', 'b@x']
+    }
+
+
+def test_reported_invalid_emails_are_capped():
+    _, report = prepare_recipients([{'email': f'invalido{i}'} for i in range(MAX_REPORTED_INVALID + 10)])
+    assert report['invalid'] == MAX_REPORTED_INVALID + 10
+    assert len(report['invalid_emails']) == MAX_REPORTED_INVALID
+
+
+def test_recipients_without_email_column():
+    recipients, report = prepare_recipients([{'nome': 'Ana'}])
+    assert recipients == []
+    assert (report['received'], report['missing']) == (1, 1)
+
+
+def test_clean_email_column_keeps_rows_aligned():
+    series = pd.Series(['A@x.br; a@x.br, b@x.br', float('nan'), 'nan', 'invalido', 'c@ação.br'], index=[10, 11, 12, 13, 14])
+    assert clean_email_column(series).to_dict() == {
+        10: 'a@x.br; b@x.br', 11: '', 12: '', 13: '', 14: 'c@xn--ao-siap.br'
+    }
@@ -0,0 +1,46 @@
+import smtplib
+
+import pytest
+
+from src.services.rate_limit import DailyLimitExceeded
+from src.services.retry import RetryPolicy, create_retry_policy
+
+
+def temporary():
+    return smtplib.SMTPResponseException(451, b'Try again later')
+
+def permanent():
+    return smtplib.SMTPResponseException(550, b'Mailbox unavailable')
+
+
+def test_retries_temporary_errors_until_max_attempts():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry(temporary(), 1)
+    assert policy.should_retry(temporary(), 2)
+    assert not policy.should_retry(temporary(), 3)
+
+
+@pytest.mark.parametrize('error', [permanent(), ValueError('Destinatário sem e-mail')])
+def test_does_not_retry_permanent_errors(error):
+    assert not RetryPolicy().should_retry(error, 1)
+
+
+def test_retries_dropped_connections_but_not_daily_limit():
+    policy = RetryPolicy()
+    assert policy.should_retry(smtplib.SMTPServerDisconnected('Conexão encerrada'), 1)
+    assert not policy.should_retry(DailyLimitExceeded('Limite diário atingido'), 1)
+
+
+def test_delay_doubles_with_jitter_and_is_capped():
+    low = RetryPolicy(base_delay=2.0, max_delay=10.0, rng=lambda: 0.0)
+    high = RetryPolicy(base_delay=2.0, max_delay=10.0, rng=lambda: 1.0)
+    # Metade fixa e metade aleatória do teto de cada tentativa
+    assert [low.delay(attempt) for attempt in (1, 2, 3, 4)] == [1.0, 2.0, 4.0, 5.0]
+    assert [high.delay(attempt) for attempt in (1, 2, 3, 4)] == [2.0, 4.0, 8.0, 10.0]
+
+
+def test_create_retry_policy_reads_config():
+    policy = create_retry_policy({'SEND_MAX_ATTEMPTS': 0, 'SEND_RETRY_BASE_DELAY': 0.5, 'SEND_RETRY_MAX_DELAY': 3})
+    # Pelo menos a primeira tentativa sempre acontece
+    assert policy.max_attempts == 1
+    assert (policy.base_delay, policy.max_delay) == (0.5, 3)
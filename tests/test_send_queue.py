@@ -0,0 +1,188 @@
+import socket
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import inspect, text
+
+from src.models.parlamentar import EmailHistory, EmailStat, SendJob, upgrade_schema
+from src.services.send_queue import delivery_counts, resume_send_job
+
+SENDER = 'remetente@example.com'
+FINAL_STATUSES = ('completed', 'failed', 'interrupted')
+
+
+@pytest.fixture
+def client(app, db, monkeypatch):
+    # Uma tentativa só: falhas 4xx viram 'deferred' na hora; sem limite de taxa para o remetente de teste
+    monkeypatch.setitem(app.config, 'SEND_MAX_ATTEMPTS', 1)
+    monkeypatch.setitem(app.config, 'SMTP_RATE_LIMITS', {'example.com': {}})
+    return app.test_client()
+
+def recipients(count):
+    return [{'nome': f'Parlamentar {i}', 'email': f'p{i}@camara.leg.br'} for i in range(count)]
+
+def send(client, to):
+    response = client.post('/api/send-emails', json={
+        'subject': 'Assunto', 'message': 'Olá {nome}', 'sender_name': 'Remetente',
+        'sender_email': SENDER, 'sender_password': 'senha', 'recipients': to,
+    })
+    assert response.status_code == 202, response.get_json()
+    return response.get_json()['job_id']
+
+def wait(client, job_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/send-jobs/{job_id}').get_json()
+        if job['status'] in FINAL_STATUSES:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'Job {job_id} não terminou')
+
+
+def test_retry_sends_deferred_recipients_once(client, smtp_server):
+    thread = smtp_server(replies={'p1@camara.leg.br': [451], 'p2@camara.leg.br': [451]})
+    job_id = send(client, recipients(4))
+    job = wait(client, job_id)
+    assert (job['sent'], job['deferred']) == (2, 2)
+
+    first = client.post(f'/api/send-jobs/{job_id}/retry', json={'sender_password': 'senha'})
+    second = client.post(f'/api/send-jobs/{job_id}/retry', json={'sender_password': 'senha'})
+    assert first.status_code == 202
+    assert second.status_code == 409
+    # O reenvio acontece no próprio job
+    assert first.get_json()['job_id'] == job_id
+
+    job = wait(client, job_id)
+    assert (job['status'], job['sent'], job['deferred']) == ('completed', 4, 0)
+    assert client.post(f'/api/send-jobs/{job_id}/retry', json={'sender_password': 'senha'}).status_code == 400
+    assert client.post(
+        f'/api/send-jobs/{job_id}/resume', json={'sender_password': 'senha', 'only_failed': True}
+    ).status_code == 400
+
+    # Cada destinatário recebeu exatamente uma vez
+    assert Counter(thread.server.delivered) == {recipient['email']: 1 for recipient in recipients(4)}
+
+
+def test_rerun_updates_history_and_stats_once(client, db, smtp_server):
+    smtp_server(replies={'p1@camara.leg.br': [451], 'p2@camara.leg.br': [550]})
+    job_id = send(client, recipients(3))
+    wait(client, job_id)
+    assert client.post(f'/api/send-jobs/{job_id}/retry', json={'sender_password': 'senha'}).status_code == 202
+    wait(client, job_id)
+
+    db.session.expire_all()
+    history = EmailHistory.query.all()
+    assert [(h.recipients_count, h.sent, h.failed) for h in history] == [(3, 2, 1)]
+    assert db.session.get(SendJob, job_id).history_id == history[0].id
+    stats = EmailStat.query.all()
+    assert [(s.campaigns, s.recipients, s.sent, s.failed) for s in stats] == [(1, 3, 2, 1)]
+
+
+def test_resume_only_failed_skips_delivered(client, smtp_server):
+    thread = smtp_server(replies={'p0@camara.leg.br': [550]})
+    job_id = send(client, recipients(3))
+    assert wait(client, job_id)['failed'] == 1
+
+    response = client.post(f'/api/send-jobs/{job_id}/resume', json={'sender_password': 'senha', 'only_failed': True})
+    assert response.status_code == 202
+
+    job = wait(client, job_id)
+    assert (job['sent'], job['failed']) == (3, 0)
+    assert delivery_counts(job_id) == {'sent': 3}
+    assert Counter(thread.server.delivered) == {recipient['email']: 1 for recipient in recipients(3)}
+
+
+def test_resume_claim_is_atomic(client, db, monkeypatch):
+    from src.services import send_queue
+
+    job_id = send_queue.create_send_job('Assunto', 'Mensagem', 'Remetente', SENDER, recipients(2)).id
+    job = db.session.get(SendJob, job_id)
+    job.status = 'interrupted'
+    db.session.commit()
+    submitted = []
+    monkeypatch.setattr(send_queue.send_queue, 'submit', lambda *args, **kwargs: submitted.append(args))
+
+    # O segundo pedido usa o mesmo objeto, ainda 'interrupted' em memória, e perde a disputa
+    assert resume_send_job(job, 'senha') is job
+    assert resume_send_job(job, 'senha') is None
+    assert len(submitted) == 1
+
+
+@pytest.mark.parametrize('action', ['retry', 'resume'])
+def test_invalid_delivery_mode_is_rejected(client, db, action):
+    from src.services import send_queue
+
+    job = send_queue.create_send_job('Assunto', 'Mensagem', 'Remetente', SENDER, recipients(1))
+    job.status = 'interrupted'
+    db.session.commit()
+
+    response = client.post(
+        f'/api/send-jobs/{job.id}/{action}', json={'sender_password': 'senha', 'delivery_mode': 'pombo'}
+    )
+    assert response.status_code == 400
+    assert 'Modo de envio inválido' in response.get_json()['error']
+
+
+def test_recover_interrupted_jobs_from_dead_workers(client, db):
+    from src.services import send_queue
+
+    def job(owner, heartbeat_age):
+        job = send_queue.create_send_job('Assunto', 'Mensagem', 'Remetente', SENDER, recipients(1))
+        job.status = 'running'
+        job.worker_id = owner
+        job.heartbeat_at = datetime.utcnow() - timedelta(seconds=heartbeat_age)
+        return job
+
+    alive = job(send_queue.worker_id(), 0)
+    silent = job(send_queue.worker_id(), send_queue.JOB_STALE_AFTER + 1)
+    # Mesmo host, pid que não existe mais (maior que qualquer pid_max do Linux)
+    dead_pid = job(f'{socket.gethostname()}:99999999', 0)
+    db.session.commit()
+
+    assert send_queue.recover_interrupted_jobs() == 2
+    statuses = {job.id: db.session.get(SendJob, job.id).status for job in (alive, silent, dead_pid)}
+    assert statuses == {alive.id: 'running', silent.id: 'interrupted', dead_pid.id: 'interrupted'}
+    assert db.session.get(SendJob, silent.id).error == send_queue.INTERRUPTED_BY_RESTART
+
+
+def test_job_that_raises_is_left_resumable(client, db, smtp_server, monkeypatch):
+    from src.services import send_queue
+
+    class BrokenEngine:
+        def warm_up(self):
+            pass
+
+        def send(self, *args, **kwargs):
+            raise RuntimeError('database is locked')
+
+        def close(self):
+            pass
+
+    thread = smtp_server()
+    create_engine = send_queue.create_delivery_engine
+    monkeypatch.setattr(send_queue, 'create_delivery_engine', lambda *args, **kwargs: BrokenEngine())
+    job_id = send(client, recipients(2))
+    job = wait(client, job_id)
+    assert (job['status'], job['pending']) == ('interrupted', 2)
+    assert 'database is locked' in client.get(f'/api/send-jobs/{job_id}').get_json()['error']
+
+    monkeypatch.setattr(send_queue, 'create_delivery_engine', create_engine)
+    response = client.post(f'/api/send-jobs/{job_id}/resume', json={'sender_password': 'senha'})
+    assert response.status_code == 202
+    assert wait(client, job_id)['sent'] == 2
+    assert sorted(thread.server.delivered) == [recipient['email'] for recipient in recipients(2)]
+
+
+def test_upgrade_drops_obsolete_recipient_columns(client, db, smtp_server):
+    # Bancos antigos tinham a lista de destinatários no próprio job, NOT NULL
+    db.session.execute(text("ALTER TABLE send_jobs ADD COLUMN recipients TEXT NOT NULL DEFAULT ''"))
+    db.session.execute(text('ALTER TABLE send_jobs ADD COLUMN deferred_recipients TEXT'))
+    db.session.commit()
+    upgrade_schema()
+    columns = {column['name'] for column in inspect(db.engine).get_columns('send_jobs')}
+    assert not columns & {'recipients', 'deferred_recipients'}
+
+    smtp_server()
+    assert wait(client, send(client, recipients(1)))['sent'] == 1
@@ -0,0 +1,83 @@
+import io
+import os
+import stat
+
+import pandas as pd
+import pytest
+
+from src.services import spreadsheet_cache
+from src.services.spreadsheet_cache import SpreadsheetCache
+
+
+def frame(*names):
+    return pd.DataFrame({'nome': list(names), 'uf': ['SP'] * len(names)})
+
+def entries(directory):
+    return sorted(os.listdir(directory))
+
+
+def test_cache_directory_is_private(tmp_path):
+    directory = tmp_path / 'cache'
+    directory.mkdir(mode=0o777)
+    os.chmod(directory, 0o777)
+    cache = SpreadsheetCache(str(directory))
+    assert cache.enabled
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+
+
+def test_writer_appends_chunks_and_publishes_on_commit(tmp_path):
+    cache = SpreadsheetCache(str(tmp_path))
+    with cache.writer('abc', 'api') as entry:
+        entry.write(frame('Ana', 'Bia'))
+        entry.write(frame())
+        entry.write(frame('Caio'))
+        assert cache.get('abc', 'api') is None
+        assert entry.commit()
+    assert cache.get('abc', 'api')['nome'].tolist() == ['Ana', 'Bia', 'Caio']
+    assert entries(tmp_path) == [os.path.basename(cache.path('abc', 'api'))]
+
+
+def test_writer_without_commit_leaves_nothing(tmp_path):
+    cache = SpreadsheetCache(str(tmp_path))
+    with pytest.raises(ValueError):
+        with cache.writer('abc', 'api') as entry:
+            entry.write(frame('Ana'))
+            raise ValueError('importação falhou')
+    assert entries(tmp_path) == []
+    assert cache.get('abc', 'api') is None
+
+
+def test_put_evicts_least_recently_used(tmp_path):
+    cache = SpreadsheetCache(str(tmp_path))
+    assert cache.put('velho', 'api', frame('Ana'))
+    os.utime(cache.path('velho', 'api'), (0, 0))
+    cache.max_bytes = os.path.getsize(cache.path('velho', 'api')) + 1
+    assert cache.put('novo', 'api', frame('Bia'))
+    assert cache.get('velho', 'api') is None
+    assert cache.get('novo', 'api')['nome'].tolist() == ['Bia']
+
+
+def test_corrupted_entry_is_discarded(tmp_path):
+    cache = SpreadsheetCache(str(tmp_path))
+    with open(cache.path('abc', 'api'), 'wb') as entry:
+        entry.write(b'nao e parquet')
+    assert cache.get('abc', 'api') is None
+    assert entries(tmp_path) == []
+
+
+def test_cache_is_disabled_without_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setattr(spreadsheet_cache, 'pq', None)
+    cache = SpreadsheetCache(str(tmp_path / 'cache'))
+    assert not cache.enabled
+    assert not cache.put('abc', 'api', frame('Ana'))
+    assert cache.get('abc', 'api') is None
+    assert not os.path.exists(tmp_path / 'cache')
+
+
+def test_upload_caches_mapped_spreadsheet(db, app):
+    client = app.test_client()
+    csv = 'Nome,Email,UF\nAna,ana@x.br,SP\nBia,bia@x.br,RJ\n'.encode('utf-8')
+    for cached in (False, True):
+        response = client.post('/api/upload-spreadsheet', data={'file': (io.BytesIO(csv), 'deputados.csv')})
+        assert response.status_code == 200
+        assert response.get_json()['cached'] is cached
@@ -0,0 +1,80 @@
+from email import message_from_bytes, policy
+
+from src.services.templates import BATCH_TO_HEADER, CompiledTemplate, EmailTemplate, iter_messages
+
+SENDER = 'remetente@example.com'
+
+
+def parse(data):
+    return message_from_bytes(data, policy=policy.default)
+
+def deputado(nome, email, **fields):
+    return {'nome': nome, 'email': email, **fields}
+
+
+def test_non_ascii_subject_is_encoded_and_decodes_back():
+    template = EmailTemplate('Reunião com {nome} — pauta', 'Texto', 'José', SENDER)
+    data = template.render(deputado('Acácio', 'acacio@camara.leg.br'))
+    assert data.isascii()
+    message = parse(data)
+    assert message['Subject'] == 'Reunião com Acácio — pauta'
+    assert message['From'] == f'José <{SENDER}>'
+
+
+def test_body_is_base64_and_round_trips():
+    template = EmailTemplate('Assunto', 'Olá {nome}, do {partido}-{uf}.\nAté logo', 'Remetente', SENDER)
+    data = template.render(deputado('Ana', 'ana@camara.leg.br', partido='ABC', uf='SP'))
+    message = parse(data)
+    assert message['Content-Transfer-Encoding'] == 'base64'
+    assert b'\r\n' in data and b'\n' not in data.replace(b'\r\n', b'')
+    assert message.get_content() == (
+        'Prezado(a) Ana,\n\nOlá Ana, do ABC-SP.\nAté logo\n\nAtenciosamente,\nRemetente\n' + SENDER + '\n'
+    )
+
+
+def test_to_header_is_recipient_or_given_header():
+    template = EmailTemplate('Assunto', 'Texto', 'Remetente', SENDER)
+    recipient = deputado('Ana', 'ana@camara.leg.br')
+    assert parse(template.render(recipient))['To'] == 'ana@camara.leg.br'
+    assert template.render(recipient, BATCH_TO_HEADER).startswith(b'From: ')
+    assert b'\r\nTo: undisclosed-recipients:;\r\n' in template.render(recipient, BATCH_TO_HEADER)
+
+
+def test_missing_placeholder_is_left_as_typed():
+    template = CompiledTemplate('{nome} / {cargo} / {gabinete} / {coluna_inexistente}')
+    # Campos padrão viram vazio; colunas que o destinatário não tem ficam como digitadas
+    assert template.render({'nome': 'Ana', 'gabinete': float('nan')}) == 'Ana /  /  / {coluna_inexistente}'
+    assert template.render({'nome': 'Ana', 'gabinete': 301}) == 'Ana /  / 301 / {coluna_inexistente}'
+
+
+def test_literal_braces_in_sender_are_not_placeholders():
+    template = EmailTemplate('Assunto', 'Texto', 'Equipe {nome}', SENDER)
+    assert template.render_text(deputado('Ana', 'ana@x.br')).endswith('Equipe {nome}\n' + SENDER + '\n')
+
+
+def test_individual_messages_and_missing_email():
+    template = EmailTemplate('Assunto', 'Texto', 'Remetente', SENDER)
+    messages = list(iter_messages(template, [deputado('Ana', 'ana@x.br'), deputado('Sem', '')]))
+    assert [(len(batch), data is None) for batch, data in messages] == [(1, False), (1, True)]
+
+
+def test_batches_group_by_domain_and_rendered_text():
+    template = EmailTemplate('Assunto {uf}', 'Texto', 'Remetente', SENDER, batch=True)
+    recipients = [
+        deputado('A', 'a@camara.leg.br', uf='SP'),
+        deputado('B', 'b@senado.leg.br', uf='SP'),
+        deputado('C', 'c@camara.leg.br', uf='SP'),
+        deputado('D', 'd@camara.leg.br', uf='RJ'),
+        deputado('E', 'e@camara.leg.br', uf='SP'),
+        deputado('F', '', uf='SP'),
+    ]
+    messages = list(iter_messages(template, recipients, batch_size=2))
+    groups = [[recipient['nome'] for recipient in batch] for batch, _ in messages]
+    assert groups == [['A', 'C'], ['F'], ['B'], ['D'], ['E']]
+
+    batch_message = parse(messages[0][1])
+    assert batch_message['To'] == 'undisclosed-recipients:;'
+    assert batch_message['Subject'] == 'Assunto SP'
+    # Saudação coletiva: o texto não depende do nome
+    assert batch_message.get_content().startswith('Prezados(as),\n')
+    assert messages[1][1] is None